@@ -8,3 +8,16 @@ from pathlib import Path
 
 # Add parent directory to path to share fixtures with main driver
 sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest  # noqa: E402
+from utils import kube_client  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def lightkube_client():
+    """Initialise Lightkube Client."""
+    from lightkube.generic_resource import load_in_cluster_generic_resources
+
+    lightkube_client = kube_client()
+    load_in_cluster_generic_resources(lightkube_client)
+    return lightkube_client
@@ -2,23 +2,21 @@
 # See LICENSE file for licensing details.
 import logging
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import pytest
-from lightkube import ApiError, Client, codecs
-from lightkube.generic_resource import load_in_cluster_generic_resources
-from lightkube.models.core_v1 import Container, PodSpec
-from lightkube.models.meta_v1 import ObjectMeta
-from lightkube.resources.core_v1 import Pod
-from lightkube.types import CascadeType
 from utils import (
-    PROFILE_RESOURCE,
     assert_namespace_active,
     assert_pod_running,
     assert_profile_deleted,
     assert_service_account_exists,
     exec_in_pod,
+    profile_resource,
 )
 
+if TYPE_CHECKING:
+    from lightkube import Client
+
 log = logging.getLogger(__name__)
 
 # Assets directory is relative to the repository root
@@ -30,16 +28,11 @@ NAMESPACE_2 = "profile2"
 CURL_POD_NAME = "ambient-test-curl"
 
 
-@pytest.fixture(scope="module")
-def lightkube_client():
-    """Initialise Lightkube Client."""
-    lightkube_client = Client(trust_env=False)
-    load_in_cluster_generic_resources(lightkube_client)
-    return lightkube_client
-
-
-def _create_and_cleanup_profile(client: Client, namespace: str):
+def _create_and_cleanup_profile(client: "Client", namespace: str):
     """Helper to create a profile and handle cleanup. Use in fixtures with yield."""
+    from lightkube import ApiError, codecs
+    from lightkube.types import CascadeType
+
     log.info(f"Creating Profile {namespace}...")
     profile = list(
         codecs.load_all_yaml(
@@ -61,7 +54,7 @@ def _create_and_cleanup_profile(client: Client, namespace: str):
     # Delete the Profile at the end
     log.info(f"Deleting Profile {namespace}...")
     try:
-        client.delete(PROFILE_RESOURCE, name=namespace, cascade=CascadeType.FOREGROUND)
+        client.delete(profile_resource(), name=namespace, cascade=CascadeType.FOREGROUND)
         assert_profile_deleted(client, namespace, log)
     except ApiError as e:
         if e.status.code != 404:
@@ -84,6 +77,11 @@ def create_profile_2(lightkube_client):
 @pytest.fixture(scope="module")
 def create_curl_pod(lightkube_client, create_profile_2):
     """Create a curl pod in profile 2."""
+    from lightkube import ApiError
+    from lightkube.models.core_v1 import Container, PodSpec
+    from lightkube.models.meta_v1 import ObjectMeta
+    from lightkube.resources.core_v1 import Pod
+
     log.info(f"Creating curl pod {NAMESPACE_2}/{CURL_POD_NAME}...")
 
     # Create pod directly using lightkube API
@@ -149,7 +147,7 @@ def test_ambient_rbac_isolation(
         f"ml-pipeline.{juju.model}.svc:8888/apis/v2beta1/experiments?namespace={NAMESPACE_1}",
     ]
 
-    stdout, stderr, returncode = exec_in_pod(pod_name, NAMESPACE_2, curl_command)
+    stdout, stderr, returncode = exec_in_pod(lightkube_client, pod_name, NAMESPACE_2, curl_command)
 
     log.info(f"Command output:\n{stdout}")
     if stderr:
@@ -0,0 +1,224 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Cross-profile isolation matrix under ambient mesh.
+
+Generalises `test_ambient_rbac_isolation` from a single direction to every ordered pair of
+N Profiles: a probe pod in each Profile calls the KFP API for every other Profile while
+impersonating its owner, and each of these N * (N - 1) requests must be denied with 403.
+
+The requests are sent concurrently by a bounded pool of workers, over shell sessions
+opened once per probe pod, so that the run time grows with N * (N - 1) / workers rather
+than with N * (N - 1). The matrix is sized with `--isolation-matrix-profiles` and
+`--isolation-matrix-workers`.
+"""
+
+import contextlib
+import logging
+import math
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from results import format_table, summarize, write_results
+from utils import (
+    PodShell,
+    assert_namespace_active,
+    assert_pod_running,
+    assert_profile_deleted,
+    assert_service_account_exists,
+    create_probe_pod,
+    curl_in_pod,
+    delete_pod,
+    profile_resource,
+)
+
+if TYPE_CHECKING:
+    from lightkube import Client
+
+log = logging.getLogger(__name__)
+
+# Assets directory is relative to the repository root
+ASSETS_DIR = Path(__file__).parent.parent.parent / "assets"
+PROFILE_TEMPLATE_FILE = ASSETS_DIR / "test-profile.yaml.j2"
+
+PROFILE_PREFIX = "isolation"
+PROBE_POD_NAME = "isolation-probe"
+
+
+def _create_profile(client: "Client", namespace: str) -> None:
+    """Create a Profile and wait for its namespace and `default-editor` ServiceAccount."""
+    from lightkube import codecs
+
+    log.info(f"Creating Profile {namespace}...")
+    profile = list(
+        codecs.load_all_yaml(
+            PROFILE_TEMPLATE_FILE.read_text(),
+            context={"namespace": namespace},
+        )
+    )[0]
+    client.create(profile)
+    assert_namespace_active(client, namespace)
+    assert_service_account_exists(client, "default-editor", namespace)
+
+
+def _delete_profile(client: "Client", namespace: str) -> None:
+    """Delete a Profile and wait for it to be gone."""
+    from lightkube import ApiError
+    from lightkube.types import CascadeType
+
+    log.info(f"Deleting Profile {namespace}...")
+    try:
+        client.delete(profile_resource(), name=namespace, cascade=CascadeType.FOREGROUND)
+        assert_profile_deleted(client, namespace, log)
+    except ApiError as e:
+        if e.status.code != 404:
+            raise
+        log.info(f"Profile {namespace} already deleted")
+
+
+def _start_probe_pod(client: "Client", namespace: str) -> None:
+    """Create the probe pod of a Profile and wait for it to be running."""
+    create_probe_pod(client, PROBE_POD_NAME, namespace)
+    assert_pod_running(client, PROBE_POD_NAME, namespace)
+
+
+def _run_for_each(pool: ThreadPoolExecutor, function, namespaces: list) -> None:
+    """Run a function for each namespace in the pool, and raise the first error once all ran."""
+    futures = [pool.submit(function, namespace) for namespace in namespaces]
+    wait(futures)
+    for future in futures:
+        future.result()
+
+
+@pytest.fixture(scope="module")
+def workers(request) -> int:
+    """Maximum number of concurrent requests, i.e. the `--isolation-matrix-workers` option."""
+    return request.config.getoption("--isolation-matrix-workers")
+
+
+@pytest.fixture(scope="module")
+def isolation_profiles(lightkube_client, request, workers):
+    """Create the Profiles of the matrix concurrently and delete them at the end."""
+    count = request.config.getoption("--isolation-matrix-profiles")
+    assert count >= 2, f"The isolation matrix needs at least 2 Profiles, got {count}"
+    namespaces = [f"{PROFILE_PREFIX}-{index}" for index in range(count)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            _run_for_each(pool, lambda ns: _create_profile(lightkube_client, ns), namespaces)
+            yield namespaces
+        finally:
+            _run_for_each(pool, lambda ns: _delete_profile(lightkube_client, ns), namespaces)
+
+
+@pytest.fixture(scope="module")
+def probe_shells(lightkube_client, isolation_profiles, workers):
+    """Start a probe pod per Profile and open a pool of shell sessions in each of them.
+
+    A worker takes a session from the queue of its source Profile for the duration of a
+    request. Since the pairs are probed round-robin by source (see `interleaved_pairs`), the
+    requests in flight at once are spread evenly over the sources, and each pod gets its
+    share of the workers as sessions, with a minimum of one, for all of them to call at once.
+    """
+    sessions_per_pod = math.ceil(workers / len(isolation_profiles))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda ns: _start_probe_pod(lightkube_client, ns), isolation_profiles))
+
+        with contextlib.ExitStack() as stack:
+            shells = {}
+            for namespace in isolation_profiles:
+                shells[namespace] = queue.Queue()
+                for _ in range(sessions_per_pod):
+                    shell = PodShell(lightkube_client, PROBE_POD_NAME, namespace)
+                    shells[namespace].put(stack.enter_context(shell))
+            yield shells
+    finally:
+        for namespace in isolation_profiles:
+            delete_pod(lightkube_client, PROBE_POD_NAME, namespace)
+
+
+def interleaved_pairs(profiles: list[str]) -> list[tuple[str, str]]:
+    """Return all the ordered pairs of distinct Profiles, round-robin by source.
+
+    Any window of consecutive pairs has about as many pairs from each source, unlike the
+    pairs of `itertools.permutations`, grouped by source.
+    """
+    return [
+        (source, profiles[(index + offset) % len(profiles)])
+        for offset in range(1, len(profiles))
+        for index, source in enumerate(profiles)
+    ]
+
+
+def _probe(shells: dict, kubeflow_namespace: str, source: str, target: str) -> dict:
+    """Call the KFP API of `target` from the probe pod of `source`, as the `target` owner."""
+    url = f"ml-pipeline.{kubeflow_namespace}.svc:8888/apis/v2beta1/experiments?namespace={target}"
+    shell = shells[source].get()
+    try:
+        http_code, body, latency = curl_in_pod(
+            shell, url, headers={"kubeflow-userid": f"{target}@email.com"}
+        )
+    finally:
+        shells[source].put(shell)
+    return {
+        "source": source,
+        "target": target,
+        "http_code": http_code,
+        "latency_ms": latency,
+        "body": body,
+    }
+
+
+@pytest.mark.perf
+def test_ambient_isolation_matrix(probe_shells, isolation_profiles, workers, request, results_dir):
+    """Test that every Profile is denied access to the KFP API of every other Profile.
+
+    All ordered pairs are probed, even after a failure, so that the report lists every
+    pair that was not denied with 403 alongside the latency distribution of the denials.
+    """
+    kubeflow_namespace = request.config.getoption("--model")
+    pairs = interleaved_pairs(isolation_profiles)
+    log.info(f"Probing {len(pairs)} cross-profile pairs with {workers} workers...")
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        probes = list(
+            pool.map(lambda pair: _probe(probe_shells, kubeflow_namespace, *pair), pairs)
+        )
+    wall_time = time.monotonic() - start
+
+    failures = [
+        {key: probe[key] for key in ("source", "target", "http_code", "body")}
+        for probe in probes
+        if probe["http_code"] != 403
+    ]
+    denied = [probe["latency_ms"] for probe in probes if probe["http_code"] == 403]
+    report = {
+        "profiles": len(isolation_profiles),
+        "workers": workers,
+        "pairs": len(pairs),
+        "wall_time_s": wall_time,
+        "pairs_per_second": len(pairs) / wall_time,
+        "denied_ms": summarize(denied),
+        "failures": failures,
+    }
+
+    stats = report["denied_ms"]
+    log.info(
+        f"Probed {len(pairs)} pairs in {wall_time:.2f}s, denial latency (ms):\n"
+        + format_table(
+            ["denied", "p50", "p90", "p99", "max"],
+            [[stats["count"], *(stats.get(key) for key in ("p50", "p90", "p99", "max"))]],
+        )
+    )
+    write_results(results_dir, "ambient-isolation-matrix", report)
+
+    assert not failures, "Cross-profile requests were not denied with HTTP 403:\n" + "\n".join(
+        f"{failure['source']} -> {failure['target']}: {failure['http_code']}"
+        for failure in failures
+    )
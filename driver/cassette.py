@@ -0,0 +1,428 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Record the Kubernetes API and Juju calls of a session to a cassette, and replay them.
+
+A local stand-in API server is started for the session, and the driver is pointed at it:
+
+* the Lightkube clients, through a kubeconfig selecting it in `KUBECONFIG` (see
+  `utils.kube_client`)
+* jubilant, through a `juju` executable put first in `PATH`, which forwards its arguments
+  to the stand-in server instead of running the Juju CLI
+
+When recording, the stand-in forwards every request to the cluster of the current
+kubeconfig and every Juju command to the Juju CLI, and appends each exchange, with the time
+it happened and, for watches and followed logs, the time of each line, to a JSON-lines
+cassette. When replaying, it answers from the cassette instead, with no cluster nor Juju.
+
+The answers to the same request are replayed in order, e.g. the successive states of a
+resource a waiter polls, against a virtual clock running `speed` times faster than the
+recording: an answer is never served before the previous ones, but the answers recorded
+before the virtual time are skipped. With a speed above 1, the cluster seems to converge
+faster and the waiters need fewer polls. Latencies and stream lines are compressed alike.
+
+Requests that were not recorded are answered with a 404 and a warning. Commands run in pods
+(`exec`) need a websocket, which the stand-in does not support.
+
+A cassette is a credential file. The values of the Secrets, and of the fields named like
+`password`, `token` or `client-secret` in the responses and Juju outputs, e.g. the Hydra
+client secrets, are redacted when recording. Other credentials may still be recorded, e.g.
+in the logs of a pod. The cassette is written with mode 0600, and should not be shared
+nor committed.
+"""
+
+import bisect
+import json
+import logging
+import os
+import re
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+from lightkube import KubeConfig
+from lightkube.config import client_adapter
+from utils import environment, write_local_kubeconfig
+
+log = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+# URL of the stand-in server, used by the `juju` executable it puts in `PATH`.
+SERVER_ENV = "UATS_CASSETTE_SERVER"
+JUJU_PATH = "/__juju__"
+# Query parameters that change between sessions without changing what is requested.
+VOLATILE_PARAMS = {"resourceVersion", "timeoutSeconds", "allowWatchBookmarks"}
+# Value of the redacted fields, base64-encoded in the `data` of the Secrets.
+REDACTED = "redacted"
+REDACTED_B64 = "cmVkYWN0ZWQ="
+# Annotation of the objects applied with kubectl, which holds their whole manifest.
+LAST_APPLIED_ANNOTATION = "kubectl.kubernetes.io/last-applied-configuration"
+# Keys of the secret fields, e.g. `password`, `access_token` or `client-secret`.
+SECRET_KEY = re.compile(r"(?:[\w-]*[-_])?(?:secret|password|token)")
+# `<key>: <value>` or `<key>=<value>` pair of a secret field, in a text output, e.g. YAML.
+SECRET_FIELD = re.compile(
+    rf"""(?P<key>(?<![\w-])["']?{SECRET_KEY.pattern}["']?[ \t]*[:=][ \t]*)"""
+    r"""(?P<value>"(?:[^"\\]|\\.)*"|'[^']*'|(?!(?:null|true|false)\b)[^\s,{}\[\]"']+)"""
+)
+JUJU_SHIM = """#!{python}
+import sys
+
+sys.path.insert(0, {driver!r})
+from cassette import juju_main
+
+sys.exit(juju_main(sys.argv[1:]))
+"""
+
+
+def _request_key(method: str, url: str) -> str:
+    """Return the key of a request, with its volatile query parameters removed."""
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in VOLATILE_PARAMS)
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{method} {parts.path}" + (f"?{query}" if query else "")
+
+
+def _is_stream(url: str) -> bool:
+    params = dict(parse_qsl(urlsplit(url).query))
+    return params.get("watch") in ("true", "1") or params.get("follow") == "true"
+
+
+def _not_recorded(key: str) -> dict:
+    """Return the Kubernetes Status answering a request missing from the cassette."""
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "status": "Failure",
+        "message": f"{key} is not in the cassette",
+        "reason": "NotFound",
+        "code": 404,
+    }
+
+
+def _redact_secret(secret: dict) -> None:
+    """Redact, in place, the data of a Secret, and the manifest kubectl annotates it with."""
+    for field, redacted in (("data", REDACTED_B64), ("stringData", REDACTED)):
+        if secret.get(field):
+            secret[field] = {key: redacted for key in secret[field]}
+    annotations = (secret.get("metadata") or {}).get("annotations") or {}
+    if LAST_APPLIED_ANNOTATION in annotations:
+        annotations[LAST_APPLIED_ANNOTATION] = REDACTED
+
+
+def _redact_json(value) -> bool:
+    """Redact, in place, the secrets of a decoded JSON response, and return whether it had any.
+
+    The secrets are the data of the Secrets, on their own, in a list or in a watch event, and
+    the string fields with a secret key.
+    """
+    redacted = False
+    if isinstance(value, list):
+        for item in value:
+            redacted |= _redact_json(item)
+    elif isinstance(value, dict):
+        if value.get("kind") in ("Secret", "SecretList"):
+            for secret in value.get("items") or [] if value["kind"] == "SecretList" else [value]:
+                _redact_secret(secret)
+            return True
+        for key, item in value.items():
+            if isinstance(item, str) and SECRET_KEY.fullmatch(key):
+                value[key], redacted = REDACTED, True
+            else:
+                redacted |= _redact_json(item)
+    return redacted
+
+
+def _redact(text: str) -> str:
+    """Return a recorded response or output, with its secrets redacted."""
+    try:
+        decoded = json.loads(text)
+    except ValueError:
+        decoded = None
+    if isinstance(decoded, (dict, list)):
+        return json.dumps(decoded) if _redact_json(decoded) else text
+
+    def _replace(match: re.Match) -> str:
+        quote = match["value"][0] if match["value"][0] in "\"'" else ""
+        return f"{match['key']}{quote}{REDACTED}{quote}"
+
+    return SECRET_FIELD.sub(_replace, text)
+
+
+class Cassette:
+    """Exchanges of a session, appended to a JSON-lines file as they happen.
+
+    Each exchange has the `key` of its request and the time `t` it started, in seconds since
+    the start of the recording.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.start = time.time()
+        self._lock = threading.Lock()
+        self._exchanges = {}
+        self._cursors = {}
+
+    def truncate(self) -> None:
+        """Start a new recording, only readable by the current user."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+        # An existing cassette keeps its mode when it is truncated
+        self.path.chmod(0o600)
+
+    def append(self, exchange: dict) -> None:
+        """Append an exchange to the recording."""
+        with self._lock:
+            with self.path.open("a") as file:
+                file.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+
+    def load(self) -> None:
+        """Load the exchanges of a recording to replay them."""
+        for line in self.path.read_text().splitlines():
+            if line:
+                exchange = json.loads(line)
+                self._exchanges.setdefault(exchange["key"], []).append(exchange)
+        for exchanges in self._exchanges.values():
+            exchanges.sort(key=lambda exchange: exchange["t"])
+        log.info(f"Loaded {len(self._exchanges)} distinct requests from {self.path}")
+
+    def next(self, key: str, virtual_time: float) -> Optional[dict]:
+        """Return the exchange answering a request at the given virtual time, if recorded.
+
+        Return `None` once the exchanges of a stream are exhausted.
+        """
+        if not (exchanges := self._exchanges.get(key)):
+            return None
+        with self._lock:
+            cursor = self._cursors.get(key, 0)
+            elapsed = bisect.bisect_right([exchange["t"] for exchange in exchanges], virtual_time)
+            index = max(cursor, elapsed - 1)
+            if index >= len(exchanges):
+                if "lines" in exchanges[-1]:
+                    return None
+                index = len(exchanges) - 1
+            self._cursors[key] = index + 1
+        return exchanges[index]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def handle_one_request(self):
+        """Handle a request of any method, by serving every `do_<method>` with `_handle`."""
+        for method in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            setattr(self, f"do_{method}", self._handle)
+        super().handle_one_request()
+
+    def _handle(self):
+        if self.headers.get("Upgrade"):
+            self._send_json(501, {"message": "exec is not supported by the cassette stand-in"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == JUJU_PATH:
+            self._send_json(200, self.server.juju(json.loads(body)))
+        elif self.server.mode == RECORD:
+            self._forward(body)
+        else:
+            self._replay()
+
+    def _send_head(self, status: int, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+
+    def _send_json(self, status: int, data: dict):
+        self._send_head(status, "application/json")
+        self.wfile.write(json.dumps(data).encode())
+
+    def _forward(self, body: bytes):
+        """Forward the request to the cluster, and record and return its response."""
+        cassette, start = self.server.cassette, time.time()
+        key = _request_key(self.command, self.path)
+        request = self.server.upstream.build_request(
+            self.command,
+            self.path,
+            content=body,
+            headers={k: v for k, v in self.headers.items() if k.lower() in ("content-type",)},
+        )
+        try:
+            response = self.server.upstream.send(request, stream=True)
+        except httpx.HTTPError as error:
+            self._send_json(502, {"message": f"Unable to reach the cluster: {error}"})
+            return
+        exchange = {
+            "key": key,
+            "t": start - cassette.start,
+            "latency": time.time() - start,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+        }
+        try:
+            self._send_head(response.status_code, exchange["content_type"])
+            if _is_stream(self.path):
+                exchange["lines"] = []
+                for line in response.iter_lines():
+                    exchange["lines"].append([time.time() - start, _redact(line)])
+                    self.wfile.write(f"{line}\n".encode())
+                    self.wfile.flush()
+            else:
+                body = response.read()
+                exchange["body"] = _redact(body.decode(errors="replace"))
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError, httpx.HTTPError):
+            # The client stopped following the stream, e.g. a watch at the end of the session
+            pass
+        finally:
+            response.close()
+            cassette.append(exchange)
+
+    def _replay(self):
+        """Answer the request from the cassette, as it was recorded."""
+        key = _request_key(self.command, self.path)
+        exchange = self.server.cassette.next(key, self.server.virtual_time())
+        if exchange is None and _is_stream(self.path):
+            # Hold exhausted streams open, rather than have the client watch them again
+            self.server.stopped.wait()
+            return
+        if exchange is None:
+            log.warning(f"Request not in the cassette: {key}")
+            self._send_json(404, _not_recorded(key))
+            return
+
+        time.sleep(exchange["latency"] / self.server.speed)
+        self._send_head(exchange["status"], exchange["content_type"])
+        if "body" in exchange:
+            self.wfile.write(exchange["body"].encode())
+            return
+        elapsed = 0.0
+        for offset, line in exchange["lines"]:
+            time.sleep(max(offset - elapsed, 0) / self.server.speed)
+            elapsed = offset
+            self.wfile.write(f"{line}\n".encode())
+            self.wfile.flush()
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local stand-in of the Kubernetes API server and Juju CLI, recording or replaying.
+
+    Use it as a context manager to serve it, and point the driver at it, for the session.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, mode: str, path: Path, speed: float = 1.0, workdir: Path = Path(".")):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.mode = mode
+        self.speed = speed
+        self.cassette = Cassette(path)
+        self.stopped = threading.Event()
+        self.upstream = None
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self._workdir = workdir
+        self._environment = None
+        self._juju = None
+
+    def virtual_time(self) -> float:
+        """Return the time, in seconds since its start, on the clock of the recording."""
+        return (time.time() - self.cassette.start) * self.speed
+
+    def juju(self, call: dict) -> dict:
+        """Run, or replay, a Juju command and return its exit code and outputs."""
+        key = "juju " + " ".join(call["args"])
+        if self.mode == RECORD:
+            if not self._juju:
+                return {"returncode": 127, "stdout": "", "stderr": "juju: command not found\n"}
+            start = time.time()
+            process = subprocess.run(
+                [self._juju, *call["args"]], input=call["stdin"], capture_output=True, text=True
+            )
+            result = {
+                "returncode": process.returncode,
+                "stdout": process.stdout,
+                "stderr": process.stderr,
+            }
+            exchange = {
+                "key": key,
+                "t": start - self.cassette.start,
+                "latency": time.time() - start,
+                "returncode": process.returncode,
+                "stdout": _redact(process.stdout),
+                "stderr": _redact(process.stderr),
+            }
+            self.cassette.append(exchange)
+            return result
+
+        if (exchange := self.cassette.next(key, self.virtual_time())) is None:
+            log.warning(f"Command not in the cassette: {key}")
+            return {"returncode": 1, "stdout": "", "stderr": f"{key} is not in the cassette\n"}
+        time.sleep(exchange["latency"] / self.speed)
+        return {name: exchange[name] for name in ("returncode", "stdout", "stderr")}
+
+    def _write_juju_shim(self) -> Path:
+        path = self._workdir / "bin" / "juju"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(JUJU_SHIM.format(python=sys.executable, driver=str(Path(__file__).parent)))
+        path.chmod(0o755)
+        return path.parent
+
+    def __enter__(self):
+        self._workdir.mkdir(parents=True, exist_ok=True)
+        if self.mode == RECORD:
+            self.cassette.truncate()
+            self.upstream = client_adapter.Client(
+                KubeConfig.from_env().get(),
+                client_adapter.ConnectionParams(
+                    trust_env=False, timeout=httpx.Timeout(10, read=None)
+                ),
+            )
+            self._juju = shutil.which("juju")
+        else:
+            self.cassette.load()
+        self.cassette.start = time.time()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+        self._environment = environment(
+            KUBECONFIG=str(write_local_kubeconfig(self.url, self._workdir / "kubeconfig")),
+            PATH=f"{self._write_juju_shim()}{os.pathsep}{os.environ['PATH']}",
+            **{SERVER_ENV: self.url},
+        )
+        self._environment.__enter__()
+        log.info(f"{self.mode.capitalize()}ing {self.cassette.path} through {self.url}")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._environment.__exit__(*exc_info)
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+        if self.upstream:
+            self.upstream.close()
+
+
+def juju_main(args: list[str]) -> int:
+    """Entry point of the `juju` executable of the stand-in: run the command through it."""
+    # Only read the input jubilant passed, if any, without waiting for an inherited stdin
+    readable, _, _ = select.select([sys.stdin], [], [], 0)
+    stdin = sys.stdin.read() if readable and not sys.stdin.isatty() else None
+    request = urllib.request.Request(
+        os.environ[SERVER_ENV] + JUJU_PATH,
+        data=json.dumps({"args": args, "stdin": stdin}).encode(),
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        result = json.loads(response.read())
+    sys.stdout.write(result["stdout"])
+    sys.stderr.write(result["stderr"])
+    return result["returncode"]
@@ -1,12 +1,44 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import logging
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
 import pytest
+import retries
+import tracing
 from _pytest.config.argparsing import Parser
+from results import format_table, write_results
+from soak import SOAK_PARAM
+
+# The optional subsystems are imported by the hooks using them, only when they are enabled,
+# so that collecting the tests does not import lightkube, httpx, yaml or sqlite3.
+if TYPE_CHECKING:
+    from fake_cluster import FakeCluster
+    from history import ResultsStore
+    from soak import SoakReport
+
+log = logging.getLogger(__name__)
+
+RESULTS_STORE_KEY = pytest.StashKey["ResultsStore"]()
+TEST_REPORTS_KEY = pytest.StashKey[dict]()
+SOAK_REPORT_KEY = pytest.StashKey["SoakReport"]()
+CASSETTE_KEY = pytest.StashKey["StandInServer"]()
+FAKE_CLUSTER_KEY = pytest.StashKey["FakeCluster"]()
+TEST_WINDOWS_KEY = pytest.StashKey[dict]()
 
 BUNDLE_URL_SIDECAR = "file:assets/versions-sidecar.yaml"
 BUNDLE_URL_AMBIENT = "file:assets/versions-ambient.yaml"
 TESTS_IMAGE = "ghcr.io/kubeflow/kubeflow/notebook-servers/jupyter-scipy:v1.10.0"
+# Namespace of the notebook tests Job, recorded in the event timeline by default.
+TIMELINE_NAMESPACE = "test-kubeflow"
+# Maximum number of iterations of a soak run bounded by `--soak-duration` only.
+MAX_SOAK_ITERATIONS = 100
 
 
 def pytest_addoption(parser: Parser):
@@ -29,6 +61,33 @@ def pytest_addoption(parser: Parser):
     * Add a `--test-image` option to specify the test image to be used by the driver notebook pod.
     * Add an `--include-ambient-tests` flag to include the ambient integration tests in the
       executed tests.
+    * Add an `--include-perf-tests` flag to include the performance tests (marked with `perf`)
+      in the executed tests.
+    * Add a `--results-dir` option to specify where machine-readable results are written.
+    * Add a `--kfp-stress-ramp` option to set the concurrency levels of the KFP stress test.
+    * Add `--isolation-matrix-profiles` and `--isolation-matrix-workers` options to size the
+      ambient cross-profile isolation matrix and the pool of workers probing it.
+    * Add a `--resource-sample-interval` option to set how often the resource usage of the
+      test namespace is sampled while the notebook tests run.
+    * Add an `--event-timeline` option to record the Kubernetes Events and pod transitions
+      of the test and Kubeflow namespaces during the session, and attribute its time.
+    * Add a `--trace-file` option to export an OpenTelemetry trace of the session.
+    * Add a `--results-db` option to specify the SQLite database keeping the durations of the
+      tests and notebooks across runs.
+    * Add a `--perf-baseline` flag to fail the session when a duration regressed compared to
+      previous runs, with `--perf-baseline-runs`, `--perf-regression-sigma` and
+      `--perf-regression-ratio` options to tune the comparison.
+    * Add `--repeat` and `--soak-duration` options to repeat the notebook tests Job and the
+      ambient and M2M checks, and report how they behave over the iterations.
+    * Add a `--clusters` option to run the session against several clusters concurrently,
+      and compare their results.
+    * Add `--record-cassette` and `--replay-cassette` options to record the Kubernetes API and
+      Juju calls of the session, and replay them without a cluster, with a `--replay-speed`
+      option to compress the time of the replay.
+    * Add a `--fake-cluster` flag to run the session against a simulated cluster, with a
+      `--fake-cluster-latency` option to set its latencies, and report the latency the
+      driver adds to each test.
+    * Add a `--session-deadline` option to bound the time the waiters of the session retry.
     """
     parser.addoption(
         "--proxy",
@@ -112,6 +171,176 @@ def pytest_addoption(parser: Parser):
         help="Defines whether to include the M2M identity integration tests."
         "By default, it is set to False.",
     )
+    parser.addoption(
+        "--include-perf-tests",
+        action="store_true",
+        help="Defines whether to include the performance tests, i.e. those marked with `perf`."
+        "By default, it is set to False.",
+    )
+    parser.addoption(
+        "--results-dir",
+        default="results",
+        help="Provide the directory where machine-readable results (e.g. benchmark measurements)"
+        " are written. It is created if it does not exist.",
+    )
+    parser.addoption(
+        "--kfp-stress-ramp",
+        nargs="+",
+        type=int,
+        default=[1, 5, 10, 25],
+        metavar="concurrency",
+        help="Provide the concurrency levels of the KFP stress test. At each level, that many"
+        " pipeline runs are submitted at the same time.",
+    )
+    parser.addoption(
+        "--isolation-matrix-profiles",
+        type=int,
+        default=4,
+        help="Provide the number of Profiles created for the ambient cross-profile isolation"
+        " matrix. Every ordered pair of them is probed, i.e. N * (N - 1) requests.",
+    )
+    parser.addoption(
+        "--isolation-matrix-workers",
+        type=int,
+        default=8,
+        help="Provide the maximum number of cross-profile requests of the ambient isolation"
+        " matrix that are in flight at the same time.",
+    )
+    parser.addoption(
+        "--resource-sample-interval",
+        type=float,
+        default=10,
+        help="Provide the interval, in seconds, at which the CPU and memory usage of the pods of"
+        " the test namespace is sampled while the notebook tests run. The samples and a summary"
+        " per notebook are written to `--results-dir`. Set it to 0 to disable the sampling.",
+    )
+    parser.addoption(
+        "--event-timeline",
+        nargs="*",
+        metavar="namespace",
+        help="Record every Kubernetes Event and pod phase transition of the given namespaces"
+        f" ({TIMELINE_NAMESPACE} if none is given), as well as of the Kubeflow namespace, to"
+        " `event-timeline.jsonl` in `--results-dir` for the whole session. At the end of the"
+        " session, the time spent scheduling pods, pulling images, in admission webhooks and in"
+        " controller reconciles is written to `event-timeline.json`."
+        " It is not used by default.",
+    )
+    parser.addoption(
+        "--trace-file",
+        default=None,
+        help="Provide the path of a file where an OpenTelemetry trace of the session is written,"
+        " in the OTLP/JSON encoding. The trace has a span for each test, fixture and helper,"
+        " and includes the notebooks run by the Job, which receives the trace context in the"
+        " `TRACEPARENT` environment variable. It is not used by default.",
+    )
+    parser.addoption(
+        "--results-db",
+        default=None,
+        help="Provide the path of the SQLite database where the durations of the tests and"
+        " notebooks of each run are kept, along with the commit, test image and charm channels"
+        " of the run. The durations are only kept when this option or `--perf-baseline` is"
+        " given, by default in `history.sqlite` in `--results-dir`.",
+    )
+    parser.addoption(
+        "--perf-baseline",
+        action="store_true",
+        help="Defines whether to fail the session when the duration of a passed test or notebook"
+        " regressed compared to the previous runs with the same test image in `--results-db`."
+        "By default, it is set to False.",
+    )
+    parser.addoption(
+        "--perf-baseline-runs",
+        type=int,
+        default=10,
+        help="Provide the number of previous runs the durations are compared to.",
+    )
+    parser.addoption(
+        "--perf-regression-sigma",
+        type=float,
+        default=3.0,
+        help="Provide how many robust standard deviations above the median of the previous"
+        " durations a duration must be to regress.",
+    )
+    parser.addoption(
+        "--perf-regression-ratio",
+        type=float,
+        default=0.2,
+        help="Provide the minimum increase, relative to the median of the previous durations,"
+        " for a duration to regress, e.g. 0.2 for 20%%.",
+    )
+    parser.addoption(
+        "--repeat",
+        type=int,
+        default=None,
+        help="Provide the number of times the notebook tests Job and the (non-performance)"
+        " ambient and M2M tests are run, reusing their Profile. The pass rate, duration"
+        " percentiles and resource growth over the iterations are written to `soak.json` in"
+        " `--results-dir`. It is not used by default.",
+    )
+    parser.addoption(
+        "--soak-duration",
+        type=float,
+        default=None,
+        help="Provide the duration in seconds after which no new iteration of the repeated tests"
+        f" is started. Without `--repeat`, up to {MAX_SOAK_ITERATIONS} iterations are run."
+        " It is not used by default.",
+    )
+    parser.addoption(
+        "--clusters",
+        nargs="+",
+        default=None,
+        metavar="CONTEXT=[CONTROLLER:]MODEL",
+        help="Provide the kubeconfig contexts, and optionally the Juju controllers and models, of"
+        " clusters to run the whole session against concurrently, each in a process of its own."
+        " The model defaults to `--model`. The results of each cluster are written to a"
+        " subdirectory of `--results-dir` named after its context, and compared in"
+        " `fanout.json`. It is not used by default.",
+    )
+    parser.addoption(
+        "--record-cassette",
+        default=None,
+        help="Provide the path of a cassette where the Kubernetes API requests and Juju commands"
+        " of the session are recorded, along with their responses and timing, to replay them"
+        " with `--replay-cassette`. It is not used by default.",
+    )
+    parser.addoption(
+        "--replay-cassette",
+        default=None,
+        help="Provide the path of a cassette recorded with `--record-cassette` to run the session"
+        " against, instead of a cluster and Juju. It is not used by default.",
+    )
+    parser.addoption(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Provide how many times faster than recorded the cluster and Juju evolve when"
+        " replaying a cassette, e.g. 60 for a minute of the recording per second.",
+    )
+    parser.addoption(
+        "--fake-cluster",
+        action="store_true",
+        help="Defines whether to run the session against an in-process simulation of the"
+        " Kubernetes API of a Kubeflow cluster instead of a cluster, and report how much of the"
+        " duration of each test is simulated latency and how much the driver adds, in"
+        " `driver-overhead.json` in `--results-dir`. By default, it is set to False.",
+    )
+    parser.addoption(
+        "--fake-cluster-latency",
+        nargs="+",
+        default=[],
+        metavar="STEP=SECONDS",
+        help="Provide the latencies of the steps of the simulated cluster, among the"
+        " `DEFAULT_LATENCIES` of driver/fake_cluster.py, e.g. --fake-cluster-latency job=60"
+        " namespace=5.",
+    )
+    parser.addoption(
+        "--session-deadline",
+        type=float,
+        default=None,
+        help="Provide the duration in seconds after which the waiters of the session, e.g. for"
+        " a Profile or the notebook tests Job, stop retrying and fail, whatever their own retry"
+        " policy. It is not used by default.",
+    )
     parser.addoption(
         "--model",
         default="kubeflow",
@@ -128,7 +357,11 @@ def pytest_addoption(parser: Parser):
 
 
 def pytest_configure(config):
-    """Set the default bundle based on whether ambient tests are enabled."""
+    """Register custom markers and set the default bundle based on the enabled tests."""
+    config.addinivalue_line(
+        "markers", "perf: performance test, only run when --include-perf-tests is passed"
+    )
+
     if config.getoption("--bundle") is not None:
         return
 
@@ -138,6 +371,62 @@ def pytest_configure(config):
         config.option.bundle = BUNDLE_URL_SIDECAR
 
 
+def pytest_cmdline_main(config):
+    """Run the session against each cluster of `--clusters` instead of the current one."""
+    if not config.getoption("--clusters"):
+        return None
+    from fanout import FANOUT_ENV, run_fanout
+
+    if os.environ.get(FANOUT_ENV):
+        return None
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    return run_fanout(config)
+
+
+def _soak_iterations(config) -> int:
+    """Return the number of iterations of the repeated tests, 1 outside of soak runs."""
+    if repeat := config.getoption("--repeat"):
+        return repeat
+    return MAX_SOAK_ITERATIONS if config.getoption("--soak-duration") else 1
+
+
+def pytest_generate_tests(metafunc):
+    """Repeat the notebook tests Job and the ambient and M2M checks in soak runs.
+
+    The tests are parametrized with their iteration, so that their module-scoped fixtures,
+    e.g. the Profile, are shared by all the iterations.
+    """
+    iterations = _soak_iterations(metafunc.config)
+    definition = metafunc.definition
+    repeated = definition.name == "test_kubeflow_workloads" or any(
+        part in ("ambient", "m2m") for part in definition.path.parts
+    )
+    if iterations < 2 or not repeated or definition.get_closest_marker("perf"):
+        return
+    metafunc.fixturenames.append(SOAK_PARAM)
+    metafunc.parametrize(
+        SOAK_PARAM, range(iterations), indirect=True, ids=lambda i: f"soak-{i}", scope="function"
+    )
+
+
+def _soak_order(items) -> list:
+    """Return the items so that each iteration runs the repeated tests of a module in turn.
+
+    The items of a module stay together, so that its fixtures are set up only once.
+    """
+    modules = {}
+    for item in items:
+        modules.setdefault(item.module, len(modules))
+
+    def _key(indexed):
+        index, item = indexed
+        callspec = getattr(item, "callspec", None)
+        iteration = callspec.params.get(SOAK_PARAM, 0) if callspec else 0
+        return modules[item.module], iteration, index
+
+    return [item for _, item in sorted(enumerate(items), key=_key)]
+
+
 def pytest_collection_modifyitems(config, items):
     """Ensure dependency roots are collected before tests that depend on them.
 
@@ -157,5 +446,346 @@ def pytest_collection_modifyitems(config, items):
             if "/m2m/" in item.nodeid:
                 item.add_marker(skip_m2m)
 
+    if not config.getoption("--include-perf-tests", default=False):
+        skip_perf = pytest.mark.skip(reason="need --include-perf-tests option to run")
+        for item in items:
+            if item.get_closest_marker("perf"):
+                item.add_marker(skip_perf)
+
+    items[:] = _soak_order(items)
+
     dependency_root = "driver/test_kubeflow_workloads.py::test_bundle_correctness"
     items.sort(key=lambda item: 0 if item.nodeid.endswith(dependency_root) else 1)
+
+
+def _git_commit() -> str | None:
+    """Return the commit checked out in the repository, if any."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start_cassette(config):
+    """Start the stand-in server recording or replaying a cassette, if enabled."""
+    record, replay = config.getoption("--record-cassette"), config.getoption("--replay-cassette")
+    if record and replay:
+        raise pytest.UsageError("--record-cassette and --replay-cassette are mutually exclusive")
+    if not (record or replay):
+        return
+    if (speed := config.getoption("--replay-speed")) <= 0:
+        raise pytest.UsageError("--replay-speed must be positive")
+    from cassette import RECORD, REPLAY, StandInServer
+
+    server = StandInServer(
+        RECORD if record else REPLAY,
+        Path(record or replay),
+        speed=speed,
+        workdir=Path(config.getoption("--results-dir")) / "cassette",
+    )
+    config.stash[CASSETTE_KEY] = server.__enter__()
+
+
+def _start_fake_cluster(config):
+    """Start the simulated cluster, if enabled."""
+    if not config.getoption("--fake-cluster"):
+        return
+    if config.getoption("--record-cassette") or config.getoption("--replay-cassette"):
+        raise pytest.UsageError("--fake-cluster cannot be used with a cassette")
+    from fake_cluster import DEFAULT_LATENCIES, FakeCluster
+
+    latencies = {}
+    for step in config.getoption("--fake-cluster-latency"):
+        name, _, seconds = step.partition("=")
+        if name not in DEFAULT_LATENCIES:
+            raise pytest.UsageError(
+                f"Unknown step {name} in --fake-cluster-latency,"
+                f" expected one of {', '.join(DEFAULT_LATENCIES)}"
+            )
+        latencies[name] = float(seconds)
+
+    workdir = Path(config.getoption("--results-dir")) / "fake-cluster"
+    config.stash[FAKE_CLUSTER_KEY] = FakeCluster(latencies, workdir).__enter__()
+    config.stash[TEST_WINDOWS_KEY] = {}
+
+
+def pytest_sessionstart(session):
+    """Start tracing the session and recording it in the results store, if enabled.
+
+    When recording or replaying a cassette, or simulating the cluster, the stand-in server
+    is started too.
+    """
+    config = session.config
+    if config.getoption("--trace-file"):
+        tracing.enable("pytest session", model=config.getoption("--model"))
+    if deadline := config.getoption("--session-deadline"):
+        retries.set_deadline(time.time() + deadline)
+
+    if config.option.collectonly:
+        return
+    _start_cassette(config)
+    _start_fake_cluster(config)
+    if config.getoption("--results-db") or config.getoption("--perf-baseline"):
+        from history import ResultsStore
+
+        path = config.getoption("--results-db") or Path(config.getoption("--results-dir")) / (
+            "history.sqlite"
+        )
+        config.stash[RESULTS_STORE_KEY] = ResultsStore(
+            Path(path), _git_commit(), config.getoption("--test-image")
+        )
+        config.stash[TEST_REPORTS_KEY] = {}
+    if _soak_iterations(config) > 1:
+        from soak import SoakReport
+
+        config.stash[SOAK_REPORT_KEY] = SoakReport(
+            [TIMELINE_NAMESPACE, config.getoption("--model")]
+        )
+
+
+def _record_test_report(item, report):
+    """Record the duration of a test, over all its phases, once its teardown is reported.
+
+    The iterations of a repeated test are recorded under the same name, without their
+    iteration, and also in the soak report.
+    """
+    if (store := item.config.stash.get(RESULTS_STORE_KEY, None)) is None:
+        return
+    reports = item.config.stash[TEST_REPORTS_KEY].setdefault(item.nodeid, [])
+    reports.append(report)
+    if report.when != "teardown":
+        return
+    del item.config.stash[TEST_REPORTS_KEY][item.nodeid]
+
+    if any(phase.failed for phase in reports):
+        outcome = "failed"
+    elif any(phase.skipped for phase in reports):
+        outcome = "skipped"
+    else:
+        outcome = "passed"
+    duration = sum(phase.duration for phase in reports)
+    name = re.sub(r"-?soak-\d+", "", item.nodeid).replace("[]", "")
+    store.record("test", name, duration, outcome)
+
+    callspec = getattr(item, "callspec", None)
+    if callspec and SOAK_PARAM in callspec.params:
+        soak = item.config.stash[SOAK_REPORT_KEY]
+        soak.record(name, callspec.params[SOAK_PARAM], outcome, duration)
+
+
+def _write_soak_report(session, soak: "SoakReport"):
+    """Log and write the aggregated iterations of the soak run."""
+    summary = soak.summary()
+    rows = []
+    for test, stats in summary["tests"].items():
+        memory = next(
+            (
+                growth["memory_mib"]["per_iteration"]
+                for growth in stats["resource_growth"].values()
+                if growth["memory_mib"]
+            ),
+            None,
+        )
+        duration = stats["duration_s"]
+        rows.append(
+            [
+                test,
+                stats["iterations"],
+                stats["pass_rate"],
+                duration.get("p50"),
+                duration.get("p90"),
+                memory,
+            ]
+        )
+    log.info(
+        f"Soak run of {summary['duration_s']:.0f}s:\n"
+        + format_table(
+            ["test", "iterations", "pass rate", "p50 s", "p90 s", "MiB/iteration"], rows
+        )
+    )
+    write_results(Path(session.config.getoption("--results-dir")), "soak", summary)
+
+
+def _check_baseline(session, store: "ResultsStore"):
+    """Fail the session if a duration regressed compared to the previous runs."""
+    from history import compare_to_baseline
+
+    config = session.config
+    comparisons = compare_to_baseline(
+        store,
+        config.getoption("--perf-baseline-runs"),
+        config.getoption("--perf-regression-sigma"),
+        config.getoption("--perf-regression-ratio"),
+    )
+    results_dir = Path(config.getoption("--results-dir"))
+    write_results(results_dir, "perf-baseline", {"comparisons": comparisons})
+    rows = [
+        [c["name"], c["duration_s"], c["baseline_median_s"], c["threshold_s"], c["regressed"]]
+        for c in comparisons
+    ]
+    log.info(
+        "Durations (s) compared to the previous runs:\n"
+        + format_table(["name", "duration", "median", "threshold", "regressed"], rows)
+    )
+    if regressions := [c["name"] for c in comparisons if c["regressed"]]:
+        log.error(f"Durations regressed compared to the previous runs: {', '.join(regressions)}")
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def _write_driver_overhead(session, fake: "FakeCluster"):
+    """Log and write how much of each test was simulated latency, and how much the driver's."""
+    report = fake.overhead(session.config.stash[TEST_WINDOWS_KEY])
+    rows = [
+        [test, t["duration_s"], t["simulated_s"], t["driver_s"], t["api_calls"]]
+        for test, t in report.items()
+    ]
+    log.info(
+        "Latency of the tests on the simulated cluster:\n"
+        + format_table(["test", "duration s", "simulated s", "driver s", "API calls"], rows)
+    )
+    write_results(
+        Path(session.config.getoption("--results-dir")),
+        "driver-overhead",
+        {"latencies": fake.latencies, "tests": report},
+    )
+
+
+def _write_retries(session):
+    """Log and write the attempts, sleeps and API calls of each waiter of the session."""
+    if not (waiters := retries.summary()):
+        return
+    rows = [
+        [name, w["profile"], w["calls"], w["attempts"], w["sleep_s"], w["api_calls"], w["gave_up"]]
+        for name, w in waiters.items()
+    ]
+    log.info(
+        "Retries of the waiters:\n"
+        + format_table(
+            ["waiter", "profile", "calls", "attempts", "sleep s", "API calls", "gave up"], rows
+        )
+    )
+    write_results(Path(session.config.getoption("--results-dir")), "retries", waiters)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Report the session: retries, duration regressions, soak run, driver overhead and trace.
+
+    The retries of the waiters are always reported, the rest only when enabled, as is stopping
+    the cassette stand-in server.
+    """
+    if store := session.config.stash.get(RESULTS_STORE_KEY, None):
+        if session.config.getoption("--perf-baseline"):
+            _check_baseline(session, store)
+        store.close()
+    if soak := session.config.stash.get(SOAK_REPORT_KEY, None):
+        _write_soak_report(session, soak)
+    _write_retries(session)
+
+    if server := session.config.stash.get(CASSETTE_KEY, None):
+        server.__exit__(None, None, None)
+    if fake := session.config.stash.get(FAKE_CLUSTER_KEY, None):
+        _write_driver_overhead(session, fake)
+        fake.__exit__(None, None, None)
+
+    if path := session.config.getoption("--trace-file"):
+        if current := tracing.current_span():
+            current.set_attribute("exit_status", int(exitstatus))
+        tracing.export(Path(path))
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """Run each test, with the setup and teardown of its fixtures, in a span.
+
+    On a simulated cluster, the time each test starts and ends is kept too.
+    """
+    start = time.time()
+    try:
+        with tracing.span(item.name, **{"test.nodeid": item.nodeid}):
+            return (yield)
+    finally:
+        if (windows := item.config.stash.get(TEST_WINDOWS_KEY, None)) is not None:
+            windows[item.nodeid] = (start, time.time())
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Record the outcome of each phase of a test on its span, and in the results store."""
+    report = yield
+    _record_test_report(item, report)
+    if current := tracing.current_span():
+        current.set_attribute(f"test.{report.when}.outcome", report.outcome)
+        if report.failed:
+            current.set_error(f"{report.when} failed")
+    return report
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    """Run the setup of each fixture in a span."""
+    with tracing.span(f"fixture {fixturedef.argname}", **{"fixture.scope": fixturedef.scope}):
+        return (yield)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    """Run the teardown of the fixtures of each test in a span."""
+    with tracing.span("teardown"):
+        return (yield)
+
+
+@pytest.fixture
+def soak_iteration(request) -> int:
+    """Iteration of a repeated test, skipped once the `--soak-duration` has elapsed."""
+    duration = request.config.getoption("--soak-duration")
+    soak = request.config.stash[SOAK_REPORT_KEY]
+    if request.param and duration and time.time() - soak.started > duration:
+        pytest.skip(f"Soak duration of {duration}s elapsed")
+    log.info(f"Soak iteration {request.param + 1}/{_soak_iterations(request.config)}")
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def results_store(request) -> Optional["ResultsStore"]:
+    """Store of the durations of the tests and notebooks of the session, if enabled."""
+    return request.config.stash.get(RESULTS_STORE_KEY, None)
+
+
+@pytest.fixture(scope="session")
+def results_dir(request) -> Path:
+    """Directory where machine-readable results are written."""
+    path = Path(request.config.getoption("--results-dir"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@pytest.fixture(scope="session", autouse=True)
+def event_timeline(request, results_dir):
+    """Record the event timeline of the session, if enabled, and render it at the end."""
+    namespaces = request.config.getoption("--event-timeline")
+    if namespaces is None:
+        yield
+        return
+    from timeline import CATEGORIES, TimelineRecorder, render_timeline
+    from utils import kube_client
+
+    namespaces = [*(namespaces or [TIMELINE_NAMESPACE]), request.config.getoption("--model")]
+    path = results_dir / "event-timeline.jsonl"
+    with TimelineRecorder(kube_client(), namespaces, path):
+        yield
+
+    report = render_timeline(path)
+    if report["failed_watches"]:
+        log.warning(
+            f"The event timeline is incomplete: the watches of {report['failed_watches']} failed"
+        )
+    rows = [
+        [category, report[category]["total_s"], report[category]["count"]]
+        + [", ".join(span["object"] for span in report[category]["slowest"][:3])]
+        for category in CATEGORIES
+    ]
+    log.info(
+        f"Time attributed over a {report['session_s']:.0f}s session:\n"
+        + format_table(["category", "total s", "count", "slowest"], rows)
+    )
+    write_results(results_dir, "event-timeline", report)
@@ -0,0 +1,444 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Simulate a Kubeflow cluster in-process, to measure the time the driver itself adds.
+
+`FakeCluster` serves a minimal Kubernetes API over HTTP from a background thread, keeping
+every object in memory, and the driver is pointed at it through `KUBECONFIG`. Its resources
+follow the lifecycles the driver waits on, each step taking a configurable latency:
+
+* a Profile gets its namespace, with its service accounts, after `namespace` seconds and
+  the KFP PodDefault in it after `poddefault` seconds, and is deleted with them after
+  `profile_deletion` seconds
+* a Job gets a running pod after `pod_scheduling` seconds, which succeeds after `job`
+  seconds, and so does the Job
+* an InferenceService becomes ready after `inference_service` seconds
+
+Watches get the existing objects as `ADDED` events, then the `ADDED`, `MODIFIED` and
+`DELETED` events of the objects as they change, until their `timeoutSeconds`.
+
+Each of these steps is recorded as a simulated interval, and `overhead` splits the duration
+of a test between the time covered by them, i.e. the latency of the simulated cluster, and
+the rest, i.e. the latency the driver adds by polling, sleeping and waiting on its calls.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from utils import environment, write_local_kubeconfig
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LATENCIES = {
+    "namespace": 2.0,
+    "poddefault": 5.0,
+    "profile_deletion": 3.0,
+    "pod_scheduling": 2.0,
+    "job": 30.0,
+    "inference_service": 10.0,
+}
+PROFILE = ("apis/kubeflow.org/v1", "profiles")
+NAMESPACE = ("api/v1", "namespaces")
+POD = ("api/v1", "pods")
+SERVICE_ACCOUNT = ("api/v1", "serviceaccounts")
+PODDEFAULT = ("apis/kubeflow.org/v1alpha1", "poddefaults")
+JOB = ("apis/batch/v1", "jobs")
+INFERENCE_SERVICE = ("apis/serving.kserve.io/v1beta1", "inferenceservices")
+# Custom resources of the simulated cluster, as (group, version, kind, plural, scope).
+CUSTOM_RESOURCES = [
+    ("kubeflow.org", "v1", "Profile", "profiles", "Cluster"),
+    ("kubeflow.org", "v1alpha1", "PodDefault", "poddefaults", "Namespaced"),
+    ("serving.kserve.io", "v1beta1", "InferenceService", "inferenceservices", "Namespaced"),
+]
+CRD = ("apis/apiextensions.k8s.io/v1", "customresourcedefinitions")
+KFP_PODDEFAULT = "access-ml-pipeline"
+PROFILE_SERVICE_ACCOUNTS = ("default-editor", "default-viewer")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_path(path: str) -> tuple[tuple[str, str], Optional[str], Optional[str], Optional[str]]:
+    """Return the resource, namespace, name and subresource of an API path."""
+    parts = urlsplit(path).path.strip("/").split("/")
+    api_length = 2 if parts[0] == "api" else 3
+    api, rest = "/".join(parts[:api_length]), parts[api_length:]
+    namespace = None
+    if len(rest) >= 3 and rest[0] == "namespaces":
+        namespace, rest = rest[1], rest[2:]
+    rest += [None] * (3 - len(rest))
+    return (api, rest[0]), namespace, rest[1], rest[2]
+
+
+def _labels(label_selector: Optional[str]) -> dict:
+    """Return the labels of an equality-based label selector, e.g. `app=a,tier=b`."""
+    return dict(term.split("=", 1) for term in (label_selector or "").split(",") if term)
+
+
+def _merge(target: dict, patch: dict) -> dict:
+    """Merge a patch into an object, recursively, as a JSON merge patch."""
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+    return target
+
+
+def _status(code: int, reason: str, message: str) -> dict:
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "status": "Failure" if code >= 400 else "Success",
+        "message": message,
+        "reason": reason,
+        "code": code,
+    }
+
+
+def _crd(group: str, version: str, kind: str, plural: str, scope: str) -> dict:
+    return {
+        "apiVersion": "apiextensions.k8s.io/v1",
+        "kind": "CustomResourceDefinition",
+        "metadata": {"name": f"{plural}.{group}"},
+        "spec": {
+            "group": group,
+            "names": {"kind": kind, "plural": plural},
+            "scope": scope,
+            "versions": [{"name": version, "served": True, "storage": True}],
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeCluster"
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def handle_one_request(self):
+        """Handle a request of any method, by serving every `do_<method>` with `_handle`."""
+        for method in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            setattr(self, f"do_{method}", self._handle)
+        super().handle_one_request()
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((time.time(), self.command, self.path))
+        resource, namespace, name, subresource = _parse_path(self.path)
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        if self.command == "GET" and subresource == "log":
+            self._send(200, f"Simulated logs of {namespace}/{name}\n", "text/plain")
+        elif self.command == "GET" and name is None and params.get("watch") == "true":
+            self._watch(resource, namespace, params)
+        else:
+            apply = "apply-patch" in self.headers.get("Content-Type", "")
+            code, data = self.server.call(
+                self.command,
+                (resource, namespace, name),
+                params,
+                json.loads(body or "null"),
+                apply,
+            )
+            self._send(code, json.dumps(data), "application/json")
+
+    def _send(self, code: int, body: str, content_type: str):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def _watch(self, resource, namespace, params):
+        """Send the events of the watched objects until the watch times out."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        timeout = params.get("timeoutSeconds")
+        deadline = time.monotonic() + int(timeout) if timeout else None
+        events = self.server.watch(resource, namespace, params.get("labelSelector"))
+        try:
+            while deadline is None or (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event = events.get(timeout=None if deadline is None else remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    break
+                self.wfile.write(event.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped watching
+            pass
+        finally:
+            self.server.unwatch(events)
+
+
+class FakeCluster(ThreadingHTTPServer):
+    """In-process stand-in of the API server of a Kubeflow cluster, simulating its lifecycles.
+
+    Use it as a context manager to serve it, and point the driver at it, for the session.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latencies: Optional[dict] = None, workdir: Path = Path(".")):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latencies = DEFAULT_LATENCIES | (latencies or {})
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.stopped = threading.Event()
+        self.requests = []
+        self.intervals = []
+        self._objects = {}
+        self._watches = []
+        self._lock = threading.RLock()
+        self._version = 0
+        self._workdir = workdir
+        self._environment = None
+        for crd in CUSTOM_RESOURCES:
+            self._put(CRD, None, _crd(*crd))
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        kubeconfig = write_local_kubeconfig(self.url, self._workdir / "kubeconfig")
+        self._environment = environment(KUBECONFIG=str(kubeconfig))
+        self._environment.__enter__()
+        log.info(f"Simulating a cluster at {self.url} with latencies {self.latencies}")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._environment.__exit__(*exc_info)
+        self.stopped.set()
+        with self._lock:
+            for _, _, _, events in self._watches:
+                events.put(None)
+        self.shutdown()
+        self.server_close()
+
+    def _put(self, resource, namespace, obj) -> dict:
+        with self._lock:
+            self._version += 1
+            metadata = obj.setdefault("metadata", {})
+            metadata["resourceVersion"] = str(self._version)
+            metadata.setdefault("uid", str(uuid.uuid4()))
+            metadata.setdefault("creationTimestamp", _now())
+            if namespace:
+                metadata["namespace"] = namespace
+            key = (resource, namespace, metadata["name"])
+            self._notify("MODIFIED" if key in self._objects else "ADDED", resource, obj)
+            self._objects[key] = obj
+        return obj
+
+    def _get(self, resource, namespace, name) -> Optional[dict]:
+        return self._objects.get((resource, namespace, name))
+
+    def _remove(self, resource, namespace, name) -> None:
+        with self._lock:
+            if (obj := self._objects.pop((resource, namespace, name), None)) is not None:
+                self._notify("DELETED", resource, obj)
+
+    def watch(self, resource, namespace, label_selector: Optional[str]) -> queue.Queue:
+        """Return the queue of the events of the objects of a resource matching the labels.
+
+        The existing objects are queued first, as added. Each event is a line of JSON, and
+        `None` ends the watch, when the cluster stops.
+        """
+        events = queue.Queue()
+        with self._lock:
+            for obj in self.select(resource, namespace, label_selector):
+                events.put(json.dumps({"type": "ADDED", "object": obj}) + "\n")
+            self._watches.append((resource, namespace, _labels(label_selector), events))
+        return events
+
+    def unwatch(self, events: queue.Queue) -> None:
+        """Stop queueing the events of a watch."""
+        with self._lock:
+            self._watches = [watch for watch in self._watches if watch[3] is not events]
+
+    def _notify(self, event_type: str, resource, obj: dict) -> None:
+        """Queue an event of an object to the watches matching it, as it is now."""
+        event = json.dumps({"type": event_type, "object": obj}) + "\n"
+        metadata = obj["metadata"]
+        for watched, namespace, labels, events in self._watches:
+            if (
+                watched == resource
+                and namespace in (None, metadata.get("namespace"))
+                and labels.items() <= metadata.get("labels", {}).items()
+            ):
+                events.put(event)
+
+    def _after(self, step: str, action: Callable[[], None]) -> None:
+        """Run a step of a lifecycle once its latency elapsed, and record it as simulated."""
+        start, delay = time.time(), self.latencies[step]
+        self.intervals.append((step, start, start + delay))
+        timer = threading.Timer(delay, action)
+        timer.daemon = True
+        timer.start()
+
+    def select(self, resource, namespace, label_selector: Optional[str]) -> list[dict]:
+        """Return the objects of a resource, in a namespace or all, matching the labels."""
+        labels = _labels(label_selector)
+        with self._lock:
+            return [
+                obj
+                for (res, ns, _), obj in self._objects.items()
+                if res == resource
+                and namespace in (None, ns)
+                and labels.items() <= obj["metadata"].get("labels", {}).items()
+            ]
+
+    def call(self, method, target, params, body, apply=False) -> tuple[int, dict]:
+        """Serve a request other than a watch or logs, and return its status and response.
+
+        The target is the resource, namespace and name of the request. Patches are merged,
+        and server-side applies create missing objects; JSON patches are not simulated.
+        """
+        resource, namespace, name = target
+        if method == "PATCH" and isinstance(body, list):
+            return 501, _status(501, "NotImplemented", "JSON patches are not simulated")
+        with self._lock:
+            if method == "GET" and name is None:
+                items = self.select(resource, namespace, params.get("labelSelector", ""))
+                return 200, {"metadata": {"resourceVersion": str(self._version)}, "items": items}
+            if method == "POST":
+                return self._create(resource, namespace, body)
+            if (obj := self._get(resource, namespace, name)) is None:
+                if apply:
+                    return self._create(resource, namespace, body)
+                return 404, _status(404, "NotFound", f"{resource[1]} {name} not found")
+            if method == "GET":
+                return 200, obj
+            if method == "DELETE":
+                self._delete(resource, namespace, obj)
+                return 200, _status(200, "Success", f"{resource[1]} {name} deleted")
+            replaced = body if method == "PUT" else _merge(obj, body)
+            return 200, self._put(resource, namespace, replaced)
+
+    def _create(self, resource, namespace, obj) -> tuple[int, dict]:
+        metadata = obj.setdefault("metadata", {})
+        if "name" not in metadata:
+            metadata["name"] = metadata.get("generateName", "") + uuid.uuid4().hex[:5]
+        if self._get(resource, namespace, metadata["name"]) is not None:
+            return 409, _status(409, "AlreadyExists", f"{resource[1]} {metadata['name']} exists")
+        if namespace:
+            metadata["namespace"] = namespace
+        # The controller sets the initial status, before the object is added
+        if controller := self.CONTROLLERS.get(resource):
+            controller(self, obj)
+        return 201, self._put(resource, namespace, obj)
+
+    def _delete(self, resource, namespace, obj) -> None:
+        name = obj["metadata"]["name"]
+        if resource == PROFILE:
+            obj["metadata"]["deletionTimestamp"] = _now()
+            self._put(resource, namespace, obj)
+            self._after("profile_deletion", lambda: self._delete_profile(name))
+            return
+        self._remove(resource, namespace, name)
+        if resource == JOB:
+            for pod in self.select(POD, namespace, f"job-name={name}"):
+                self._remove(POD, namespace, pod["metadata"]["name"])
+
+    def _delete_profile(self, name: str) -> None:
+        with self._lock:
+            for resource, namespace, obj_name in list(self._objects):
+                if namespace == name:
+                    self._remove(resource, namespace, obj_name)
+            self._remove(NAMESPACE, None, name)
+            self._remove(PROFILE, None, name)
+
+    def _reconcile_profile(self, profile: dict) -> None:
+        name = profile["metadata"]["name"]
+
+        def _create_namespace():
+            namespace = {"metadata": {"name": name}, "status": {"phase": "Active"}}
+            self._put(NAMESPACE, None, namespace)
+            for account in PROFILE_SERVICE_ACCOUNTS:
+                self._put(SERVICE_ACCOUNT, name, {"metadata": {"name": account}})
+
+        def _create_poddefault():
+            self._put(PODDEFAULT, name, {"metadata": {"name": KFP_PODDEFAULT}, "spec": {}})
+
+        self._after("namespace", _create_namespace)
+        self._after("poddefault", _create_poddefault)
+
+    def _reconcile_namespace(self, namespace: dict) -> None:
+        namespace["status"] = {"phase": "Active"}
+
+    def _reconcile_job(self, job: dict) -> None:
+        name, namespace = job["metadata"]["name"], job["metadata"]["namespace"]
+        job["status"] = {}
+        pod = {
+            "metadata": {"name": f"{name}-{uuid.uuid4().hex[:5]}", "labels": {"job-name": name}},
+            "status": {"phase": "Running"},
+        }
+
+        def _complete():
+            pod["status"]["phase"] = "Succeeded"
+            self._put(POD, namespace, pod)
+            job["status"] = {"succeeded": 1, "ready": 0}
+            self._put(JOB, namespace, job)
+
+        def _schedule():
+            self._put(POD, namespace, pod)
+            job["status"] = {"active": 1, "ready": 1}
+            self._put(JOB, namespace, job)
+            self._after("job", _complete)
+
+        self._after("pod_scheduling", _schedule)
+
+    def _reconcile_inference_service(self, isvc: dict) -> None:
+        name, namespace = isvc["metadata"]["name"], isvc["metadata"]["namespace"]
+        isvc["status"] = {"conditions": [{"type": "Ready", "status": "False"}]}
+
+        def _ready():
+            isvc["status"] = {
+                "conditions": [{"type": "Ready", "status": "True"}],
+                "url": f"http://{name}.{namespace}.example.com",
+            }
+            self._put(INFERENCE_SERVICE, namespace, isvc)
+
+        self._after("inference_service", _ready)
+
+    CONTROLLERS = {
+        PROFILE: _reconcile_profile,
+        NAMESPACE: _reconcile_namespace,
+        JOB: _reconcile_job,
+        INFERENCE_SERVICE: _reconcile_inference_service,
+    }
+
+    def overhead(self, windows: dict[str, tuple[float, float]]) -> dict:
+        """Split the duration of each test between simulated and driver-induced latency.
+
+        The simulated latency of a test is the time covered by the lifecycle steps that ran
+        during it, and the rest of its duration is attributed to the driver.
+        """
+        report = {}
+        for test, (start, end) in windows.items():
+            clipped = sorted(
+                (max(step_start, start), min(step_end, end))
+                for _, step_start, step_end in self.intervals
+                if step_start < end and step_end > start
+            )
+            simulated, covered = 0.0, start
+            for step_start, step_end in clipped:
+                simulated += max(step_end - max(step_start, covered), 0)
+                covered = max(covered, step_end)
+            report[test] = {
+                "duration_s": end - start,
+                "simulated_s": simulated,
+                "driver_s": end - start - simulated,
+                "api_calls": sum(start <= t < end for t, _, _ in self.requests),
+            }
+        return report
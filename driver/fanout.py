@@ -0,0 +1,196 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Run the driver session against several clusters concurrently, and compare them.
+
+Each cluster is given as a kubeconfig context and, optionally, the Juju controller and model
+of its Kubeflow deployment, as `CONTEXT=[CONTROLLER:]MODEL`. A full pytest session is run
+for each of them in a process of its own, so that their clients, fixtures and namespaces are
+isolated from each other:
+
+* its kubeconfig is a copy of the current one, with the context of the cluster selected
+* its Juju controller is selected with the `JUJU_CONTROLLER` environment variable
+* its results, including its `history.sqlite` and trace, are written to a subdirectory of
+  `--results-dir` named after the context, along with the output of the session
+
+Once all sessions are over, the durations of their tests and notebooks are merged with
+their other results in a comparative `fanout.json` report.
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import yaml
+from history import latest_run_durations
+from lightkube.config.kubeconfig import DEFAULT_KUBECONFIG
+from results import format_table, write_results
+
+log = logging.getLogger(__name__)
+
+# Environment variable marking the sessions started by the fan-out, which run a single cluster.
+FANOUT_ENV = "UATS_FANOUT_CLUSTER"
+
+
+class Cluster(NamedTuple):
+    """Cluster to run the session against."""
+
+    context: str
+    controller: Optional[str]
+    model: str
+
+    @property
+    def dirname(self) -> str:
+        """Name of the results subdirectory of the cluster, safe for any context name."""
+        return re.sub(r"[^\w.-]", "_", self.context)
+
+
+def parse_cluster(spec: str, default_model: str) -> Cluster:
+    """Parse a `CONTEXT=[CONTROLLER:]MODEL` cluster, where the model defaults to `--model`."""
+    context, _, target = spec.partition("=")
+    controller, _, model = target.rpartition(":")
+    if not context:
+        raise ValueError(f"Missing the kubeconfig context of the cluster {spec!r}")
+    return Cluster(context, controller or None, model or default_model)
+
+
+def write_kubeconfig(context: str, path: Path) -> None:
+    """Write a copy of the current kubeconfig, with the given context selected, to `path`."""
+    source = Path(os.environ.get("KUBECONFIG", DEFAULT_KUBECONFIG)).expanduser()
+    kubeconfig = yaml.safe_load(source.read_text())
+    contexts = [entry["name"] for entry in kubeconfig.get("contexts", [])]
+    if context not in contexts:
+        raise ValueError(f"Context {context} not found in {source}, expected one of {contexts}")
+    kubeconfig["current-context"] = context
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch(mode=0o600)
+    path.write_text(yaml.safe_dump(kubeconfig))
+
+
+def _run_session(cluster: Cluster, args: list[str], cwd: Path, results_dir: Path, outcome: dict):
+    """Run the pytest session of a cluster and record its exit code and duration."""
+    kubeconfig = results_dir / "kubeconfig"
+    try:
+        write_kubeconfig(cluster.context, kubeconfig)
+    except (OSError, ValueError) as error:
+        log.error(f"Unable to run the session against {cluster.context}: {error}")
+        return
+    env = os.environ | {"KUBECONFIG": str(kubeconfig), FANOUT_ENV: cluster.context}
+    if cluster.controller:
+        env["JUJU_CONTROLLER"] = cluster.controller
+
+    log_path = results_dir / "session.log"
+    log.info(f"Running the session against {cluster.context}, output in {log_path}...")
+    start = time.time()
+    with log_path.open("w") as output:
+        process = subprocess.run(
+            [sys.executable, "-m", "pytest", *args],
+            cwd=cwd,
+            env=env,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+    outcome["exit_code"] = process.returncode
+    outcome["wall_s"] = time.time() - start
+    log.info(
+        f"Session against {cluster.context} exited with {process.returncode}"
+        f" after {outcome['wall_s']:.0f}s"
+    )
+
+
+def _cluster_results(cluster: Cluster, results_dir: Path, outcome: dict) -> dict:
+    """Return the outcome, durations and other results of the session of a cluster."""
+    history = results_dir / "history.sqlite"
+    durations = latest_run_durations(history) if history.exists() else []
+    return {
+        "context": cluster.context,
+        "controller": cluster.controller,
+        "model": cluster.model,
+        **outcome,
+        "durations": {
+            f"{kind} {name}": {"duration_s": duration, "outcome": result}
+            for kind, name, duration, result in durations
+        },
+        "results": {
+            path.stem: json.loads(path.read_text()) for path in sorted(results_dir.glob("*.json"))
+        },
+    }
+
+
+def _log_comparison(clusters: list[dict]) -> None:
+    """Log the duration of each test and notebook on each cluster."""
+    names = sorted({name for cluster in clusters for name in cluster["durations"]})
+    rows = [["session", *(cluster.get("wall_s") for cluster in clusters)]]
+    for name in names:
+        row = [name]
+        for cluster in clusters:
+            duration = cluster["durations"].get(name)
+            row.append(f"{duration['duration_s']:.2f} {duration['outcome']}" if duration else "-")
+        rows.append(row)
+    log.info(
+        "Durations (s) per cluster:\n"
+        + format_table(["name", *(cluster["context"] for cluster in clusters)], rows)
+    )
+
+
+def run_fanout(config) -> int:
+    """Run the session against each cluster of `--clusters` concurrently and merge the results.
+
+    The sessions get the same arguments as this one, with their own model and results.
+    Return the highest of their exit codes.
+    """
+    clusters = [
+        parse_cluster(spec, config.getoption("--model")) for spec in config.getoption("--clusters")
+    ]
+    if len({cluster.context for cluster in clusters}) < len(clusters):
+        raise ValueError("Each kubeconfig context can only be given once in --clusters")
+
+    results_dir = Path(config.getoption("--results-dir")).resolve()
+    outcomes, threads = [], []
+    start = time.time()
+    for cluster in clusters:
+        cluster_dir = results_dir / cluster.dirname
+        args = [
+            *config.invocation_params.args,
+            "--model",
+            cluster.model,
+            "--results-dir",
+            str(cluster_dir),
+            "--results-db",
+            str(cluster_dir / "history.sqlite"),
+        ]
+        if config.getoption("--trace-file"):
+            args += ["--trace-file", str(cluster_dir / "trace.json")]
+        outcome = {"exit_code": None, "wall_s": None}
+        outcomes.append(outcome)
+        thread = threading.Thread(
+            target=_run_session,
+            args=(cluster, args, config.invocation_params.dir, cluster_dir, outcome),
+        )
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    report = {
+        "wall_s": time.time() - start,
+        "clusters": [
+            _cluster_results(cluster, results_dir / cluster.dirname, outcome)
+            for cluster, outcome in zip(clusters, outcomes)
+        ],
+    }
+    _log_comparison(report["clusters"])
+    write_results(results_dir, "fanout", report)
+
+    # A session that could not be started, e.g. for an unknown context, counts as an error.
+    return max(
+        outcome["exit_code"] if outcome["exit_code"] is not None else 1 for outcome in outcomes
+    )
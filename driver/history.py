@@ -0,0 +1,149 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Keep the durations of the tests and notebooks across runs, and detect regressions.
+
+Each session is recorded as a run in a local SQLite database, along with what it tested:
+the commit of this repository, the image of the notebook tests and the channels of the
+charms of the bundle. The duration and outcome of every test of the driver, and of every
+notebook run by the Job, are recorded against the run.
+
+A duration regressed when it exceeds the durations of the same test in previous runs by
+more than `sigma` robust standard deviations, i.e. the median absolute deviation scaled to
+be consistent with the standard deviation, and by more than `ratio` of their median. The
+latter keeps tests with very stable durations from being flagged for negligible changes.
+"""
+
+import json
+import logging
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    git_commit TEXT,
+    image TEXT,
+    channels TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS durations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    duration_s REAL NOT NULL,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS durations_by_name ON durations (kind, name);
+"""
+
+# Scale of the median absolute deviation to estimate the standard deviation of normal data.
+MAD_SCALE = 1.4826
+# Minimum number of previous durations for a test to be compared to them.
+MIN_BASELINE_SAMPLES = 3
+
+
+class ResultsStore:
+    """SQLite store of the durations of the tests and notebooks of each run."""
+
+    def __init__(self, path: Path, git_commit: Optional[str], image: Optional[str]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO runs (started_at, git_commit, image) VALUES (?, ?, ?)",
+                (time.time(), git_commit, image),
+            )
+        self.run_id = cursor.lastrowid
+        self.image = image
+
+    def set_channels(self, channels: dict) -> None:
+        """Record the channels of the charms of the bundle tested by the run."""
+        with self._db:
+            self._db.execute(
+                "UPDATE runs SET channels = ? WHERE id = ?",
+                (json.dumps(channels, sort_keys=True), self.run_id),
+            )
+
+    def record(self, kind: str, name: str, duration: float, outcome: str) -> None:
+        """Record the duration and outcome of a test or notebook of the run."""
+        with self._db:
+            self._db.execute(
+                "INSERT INTO durations VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, kind, name, duration, outcome),
+            )
+
+    def durations(self) -> list[tuple[str, str, float, str]]:
+        """Return the kind, name, duration and outcome of the tests and notebooks of the run."""
+        return self._db.execute(
+            "SELECT kind, name, duration_s, outcome FROM durations WHERE run_id = ?",
+            (self.run_id,),
+        ).fetchall()
+
+    def baseline(self, kind: str, name: str, runs: int) -> list[float]:
+        """Return the durations of a passed test or notebook in the last previous runs.
+
+        Only the runs with the same notebook tests image are considered, since it weighs on
+        the durations of the notebooks.
+        """
+        rows = self._db.execute(
+            "SELECT durations.duration_s FROM durations JOIN runs ON runs.id = durations.run_id"
+            " WHERE durations.kind = ? AND durations.name = ? AND durations.outcome = 'passed'"
+            " AND runs.id < ? AND runs.image IS ? ORDER BY runs.id DESC LIMIT ?",
+            (kind, name, self.run_id, self.image, runs),
+        )
+        return [duration for (duration,) in rows]
+
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+def compare_to_baseline(store: ResultsStore, runs: int, sigma: float, ratio: float) -> list[dict]:
+    """Compare the durations of the passed tests and notebooks of the run to their baseline.
+
+    Return a comparison for each of them with enough previous durations, flagged as
+    `regressed` when it exceeds the threshold derived from them.
+    """
+    comparisons = []
+    for kind, name, duration, outcome in store.durations():
+        if outcome != "passed":
+            continue
+        baseline = store.baseline(kind, name, runs)
+        if len(baseline) < MIN_BASELINE_SAMPLES:
+            log.info(f"Not enough previous runs of {kind} {name} to compare its duration")
+            continue
+        median = statistics.median(baseline)
+        deviation = MAD_SCALE * statistics.median(abs(value - median) for value in baseline)
+        threshold = max(median + sigma * deviation, median * (1 + ratio))
+        comparisons.append(
+            {
+                "kind": kind,
+                "name": name,
+                "duration_s": duration,
+                "baseline_runs": len(baseline),
+                "baseline_median_s": median,
+                "threshold_s": threshold,
+                "regressed": duration > threshold,
+            }
+        )
+    return comparisons
+
+
+def latest_run_durations(path: Path) -> list[tuple[str, str, float, str]]:
+    """Return the kind, name, duration and outcome of the tests and notebooks of the last run."""
+    db = sqlite3.connect(path)
+    try:
+        return db.execute(
+            "SELECT kind, name, duration_s, outcome FROM durations"
+            " WHERE run_id = (SELECT MAX(id) FROM runs)"
+        ).fetchall()
+    finally:
+        db.close()
@@ -1,10 +1,199 @@
 # Copyright 2026 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-"""Conftest for M2M identity integration tests."""
+"""Conftest for M2M identity integration tests.
 
+The fixtures below are shared by every test module under `driver/m2m/`, so that the
+functional and performance tests drive the exact same deployment path.
+"""
+
+import logging
 import sys
 from pathlib import Path
 
 # Add parent directory to path to share fixtures/utils with the main driver
 sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest  # noqa: E402
+from helpers import (  # noqa: E402
+    DOMAIN,
+    IAM_MODEL,
+    ISVC_NAME,
+    KUBEFLOW_MODEL,
+    NAMESPACE,
+    PROFILE_TEMPLATE_FILE,
+    WILDCARD_HOSTNAME,
+    authorize_contributor,
+    create_oauth_client,
+    delete_oauth_client,
+    find_gateway_for_domain,
+    gateway_service_account,
+    get_jwt_issuer_url,
+    get_service_lb_ip,
+    get_token,
+    patch_gateway_wildcard_hostname,
+    wait_for_inferenceservice_ready,
+)
+from utils import (  # noqa: E402
+    INFERENCE_SERVICE_TEMPLATE_FILE,
+    assert_namespace_active,
+    assert_profile_deleted,
+    inference_service_resource,
+    kube_client,
+    profile_resource,
+)
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def lightkube_client():
+    """Initialise a Lightkube Client."""
+    from lightkube.generic_resource import load_in_cluster_generic_resources
+
+    client = kube_client()
+    load_in_cluster_generic_resources(client)
+    return client
+
+
+@pytest.fixture(scope="module")
+def m2m_gateway(lightkube_client):
+    """Name of the istio Gateway serving the KServe (M2M) domain.
+
+    Discovered dynamically by matching the listener hostname, so the charm/app name
+    does not need to be hardcoded.
+    """
+    return find_gateway_for_domain(lightkube_client, KUBEFLOW_MODEL, DOMAIN)
+
+
+@pytest.fixture(scope="module")
+def gateway_principals(m2m_gateway):
+    """Istio principal of the M2M ingress gateway serving KServe."""
+    return [f"cluster.local/ns/{KUBEFLOW_MODEL}/sa/{gateway_service_account(m2m_gateway)}"]
+
+
+@pytest.fixture(scope="module")
+def gateway_ip(lightkube_client, m2m_gateway):
+    """LoadBalancer IP of the M2M ingress gateway."""
+    return get_service_lb_ip(
+        lightkube_client, KUBEFLOW_MODEL, gateway_service_account(m2m_gateway)
+    )
+
+
+@pytest.fixture(scope="module")
+def issuer_url():
+    """JWT issuer URL trusted by the gateway's RequestAuthentication."""
+    return get_jwt_issuer_url(KUBEFLOW_MODEL)
+
+
+@pytest.fixture(scope="module")
+def patch_gateway(lightkube_client, m2m_gateway):
+    """Patch the M2M Gateway listeners to a wildcard hostname.
+
+    Workaround for https://github.com/canonical/service-mesh/issues/102 so KServe's
+    per-service subdomain routes attach to the gateway. Remove this fixture once the
+    issue is fixed and the charm supports wildcard listeners natively.
+    """
+    patch_gateway_wildcard_hostname(
+        lightkube_client, KUBEFLOW_MODEL, m2m_gateway, WILDCARD_HOSTNAME
+    )
+    yield
+
+
+@pytest.fixture(scope="module")
+def create_profile(lightkube_client):
+    """Create the test Profile and clean it up at the end of the module."""
+    from lightkube import ApiError, codecs
+    from lightkube.types import CascadeType
+
+    log.info(f"Creating Profile {NAMESPACE}...")
+    resources = list(
+        codecs.load_all_yaml(
+            PROFILE_TEMPLATE_FILE.read_text(),
+            context={"namespace": NAMESPACE},
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 Profile, got {len(resources)}!"
+    lightkube_client.create(resources[0])
+
+    assert_namespace_active(lightkube_client, NAMESPACE)
+
+    yield NAMESPACE
+
+    log.info(f"Deleting Profile {NAMESPACE}...")
+    try:
+        lightkube_client.delete(profile_resource(), name=NAMESPACE, cascade=CascadeType.FOREGROUND)
+        assert_profile_deleted(lightkube_client, NAMESPACE, log)
+    except ApiError as error:
+        if error.status.code != 404:
+            raise
+        log.info(f"Profile {NAMESPACE} already deleted")
+
+
+@pytest.fixture(scope="module")
+def create_inference_service(lightkube_client, create_profile, patch_gateway):
+    """Create the KServe InferenceService and return its hostname."""
+    from lightkube import ApiError, codecs
+
+    log.info(f"Creating InferenceService {NAMESPACE}/{ISVC_NAME}...")
+    resources = list(
+        codecs.load_all_yaml(
+            INFERENCE_SERVICE_TEMPLATE_FILE.read_text(),
+            context={"name": ISVC_NAME, "namespace": NAMESPACE},
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 InferenceService, got {len(resources)}!"
+    lightkube_client.create(resources[0])
+
+    hostname = wait_for_inferenceservice_ready(lightkube_client, ISVC_NAME, NAMESPACE)
+
+    yield hostname
+
+    log.info(f"Deleting InferenceService {NAMESPACE}/{ISVC_NAME}...")
+    try:
+        lightkube_client.delete(inference_service_resource(), name=ISVC_NAME, namespace=NAMESPACE)
+    except ApiError as error:
+        if error.status.code != 404:
+            raise
+        log.info(f"InferenceService {NAMESPACE}/{ISVC_NAME} already deleted")
+
+
+@pytest.fixture(scope="module")
+def authorized_client(lightkube_client, create_profile, gateway_principals):
+    """Create an OAuth client and authorize it as a contributor on the Profile."""
+    client_id, client_secret = create_oauth_client(IAM_MODEL, "uat-m2m-authorized")
+    authorize_contributor(
+        lightkube_client,
+        namespace=NAMESPACE,
+        user=client_id,
+        role="edit",
+        principals=gateway_principals,
+    )
+
+    yield client_id, client_secret
+
+    delete_oauth_client(IAM_MODEL, client_id)
+
+
+@pytest.fixture(scope="module")
+def unauthorized_client():
+    """Create an OAuth client that is NOT authorized on any Profile."""
+    client_id, client_secret = create_oauth_client(IAM_MODEL, "uat-m2m-unauthorized")
+
+    yield client_id, client_secret
+
+    delete_oauth_client(IAM_MODEL, client_id)
+
+
+@pytest.fixture(scope="module")
+def authorized_token(authorized_client, issuer_url):
+    """A valid access token for the authorized OAuth client."""
+    client_id, client_secret = authorized_client
+    return get_token(client_id, client_secret, issuer_url)
+
+
+@pytest.fixture(scope="module")
+def unauthorized_token(unauthorized_client, issuer_url):
+    """A valid access token for the unauthorized OAuth client."""
+    client_id, client_secret = unauthorized_client
+    return get_token(client_id, client_secret, issuer_url)
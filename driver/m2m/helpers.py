@@ -6,54 +6,67 @@
 These helpers obtain a JWT from Hydra via the `client_credentials` grant and use it
 to reach a KServe InferenceService through the istio ingress gateway from outside the
 cluster.
+
+jubilant, requests and the OAuth2 client are only imported by the helpers using them, so
+that collecting the M2M tests, or skipping them, does not pay for their import.
 """
 
+import functools
 import json
 import logging
 import re
 import socket
 from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from retries import retrying
+from tracing import traced
+from utils import inference_service_resource, watch_until
 
-import jubilant
-import requests
-import tenacity
-import urllib3
-from lightkube import Client
-from lightkube.generic_resource import create_namespaced_resource
-from lightkube.resources.core_v1 import Service
-from lightkube.resources.rbac_authorization_v1 import RoleBinding
-from lightkube.types import PatchType
-from oauthlib.oauth2 import BackendApplicationClient
-from requests_oauthlib import OAuth2Session
+if TYPE_CHECKING:
+    import requests
+    from lightkube import Client
+    from lightkube.resources.rbac_authorization_v1 import RoleBinding
 
 log = logging.getLogger(__name__)
 
-# Disable the noisy warnings emitted when talking to the self-signed endpoints.
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# Generic Gateway API resource, used to discover and patch the ingress Gateway.
-GATEWAY_RESOURCE = create_namespaced_resource(
-    group="gateway.networking.k8s.io",
-    version="v1",
-    kind="Gateway",
-    plural="gateways",
-)
-
-# Generic KServe InferenceService resource.
-INFERENCE_SERVICE_RESOURCE = create_namespaced_resource(
-    group="serving.kserve.io",
-    version="v1beta1",
-    kind="InferenceService",
-    plural="inferenceservices",
-)
-
-# Generic Istio AuthorizationPolicy resource (mirrors github-profiles-automator).
-AUTHORIZATION_POLICY_RESOURCE = create_namespaced_resource(
-    group="security.istio.io",
-    version="v1beta1",
-    kind="AuthorizationPolicy",
-    plural="authorizationpolicies",
-)
+# Assets directory is relative to the repository root.
+ASSETS_DIR = Path(__file__).parent.parent.parent / "assets"
+PROFILE_TEMPLATE_FILE = ASSETS_DIR / "test-profile.yaml.j2"
+
+IAM_MODEL = "iam"
+KUBEFLOW_MODEL = "kubeflow"
+NAMESPACE = "test-m2m"
+ISVC_NAME = "sklearn-v2-iris"
+DOMAIN = "api.kubeflow.com"
+WILDCARD_HOSTNAME = f"*.{DOMAIN}"
+
+
+@functools.cache
+def gateway_resource():
+    """Return the generic Gateway API resource, used to discover and patch the ingress Gateway."""
+    from lightkube.generic_resource import create_namespaced_resource
+
+    return create_namespaced_resource(
+        group="gateway.networking.k8s.io",
+        version="v1",
+        kind="Gateway",
+        plural="gateways",
+    )
+
+
+@functools.cache
+def authorization_policy_resource():
+    """Return the generic Istio AuthorizationPolicy resource, as in github-profiles-automator."""
+    from lightkube.generic_resource import create_namespaced_resource
+
+    return create_namespaced_resource(
+        group="security.istio.io",
+        version="v1beta1",
+        kind="AuthorizationPolicy",
+        plural="authorizationpolicies",
+    )
 
 
 def to_rfc1123_compliant(name: str) -> str:
@@ -66,6 +79,23 @@ def to_rfc1123_compliant(name: str) -> str:
     return sanitised.strip("-")
 
 
+def _requests():
+    """Import requests, without the noisy warnings emitted by the self-signed endpoints."""
+    import requests
+    import urllib3
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return requests
+
+
+def _juju(model: str):
+    """Return a Juju CLI wrapper operating on the given model."""
+    import jubilant
+
+    return jubilant.Juju(model=model)
+
+
+@traced
 def create_oauth_client(iam_model: str, name: str) -> tuple[str, str]:
     """Create a Hydra OAuth client for the ``client_credentials`` grant.
 
@@ -76,7 +106,7 @@ def create_oauth_client(iam_model: str, name: str) -> tuple[str, str]:
     Returns:
         A ``(client_id, client_secret)`` tuple.
     """
-    task = jubilant.Juju(model=iam_model).run(
+    task = _juju(iam_model).run(
         "hydra/0",
         "create-oauth-client",
         {
@@ -92,24 +122,24 @@ def create_oauth_client(iam_model: str, name: str) -> tuple[str, str]:
     return client_id, client_secret
 
 
+@traced
 def delete_oauth_client(iam_model: str, client_id: str) -> None:
     """Best-effort deletion of a Hydra OAuth client."""
     try:
-        jubilant.Juju(model=iam_model).run(
-            "hydra/0", "delete-oauth-client", {"client-id": client_id}
-        )
+        _juju(iam_model).run("hydra/0", "delete-oauth-client", {"client-id": client_id})
         log.info(f"Deleted OAuth client {client_id}")
     except Exception as error:
         log.warning(f"Could not delete OAuth client {client_id}: {error}")
 
 
+@traced
 def get_jwt_issuer_url(kubeflow_model: str) -> str:
     """Return the JWT issuer URL trusted by the gateway's RequestAuthentication.
 
     The issuer is sourced from oauth2-proxy's ``get-extra-jwt-issuers`` action, whose
     result is a Python-style string encoding a list of dictionaries.
     """
-    task = jubilant.Juju(model=kubeflow_model).run("oauth2-proxy/0", "get-extra-jwt-issuers")
+    task = _juju(kubeflow_model).run("oauth2-proxy/0", "get-extra-jwt-issuers")
     raw = task.results["extra-jwt-issuers"]
     issuers = json.loads(raw.replace("'", '"'))
     issuer_url = issuers[0]["oidc-issuer-url"]
@@ -117,6 +147,7 @@ def get_jwt_issuer_url(kubeflow_model: str) -> str:
     return issuer_url
 
 
+@traced
 def get_token(client_id: str, client_secret: str, issuer_url: str) -> str:
     """Request a ``client_credentials`` access token from the issuer.
 
@@ -131,7 +162,10 @@ def get_token(client_id: str, client_secret: str, issuer_url: str) -> str:
     Returns:
         The access token string.
     """
-    discovery = requests.get(
+    from oauthlib.oauth2 import BackendApplicationClient
+    from requests_oauthlib import OAuth2Session
+
+    discovery = _requests().get(
         f"{issuer_url}/.well-known/openid-configuration", verify=False, timeout=30
     )
     discovery.raise_for_status()
@@ -149,8 +183,11 @@ def get_token(client_id: str, client_secret: str, issuer_url: str) -> str:
     return token["access_token"]
 
 
-def get_service_lb_ip(client: Client, namespace: str, service: str) -> str:
+@traced
+def get_service_lb_ip(client: "Client", namespace: str, service: str) -> str:
     """Return the LoadBalancer IP of a Kubernetes Service."""
+    from lightkube.resources.core_v1 import Service
+
     svc = client.get(Service, name=service, namespace=namespace)
     ingress = (svc.status.loadBalancer.ingress or []) if svc.status else []
     assert ingress, f"Service {namespace}/{service} has no LoadBalancer IP yet"
@@ -159,7 +196,8 @@ def get_service_lb_ip(client: Client, namespace: str, service: str) -> str:
     return ip
 
 
-def find_gateway_for_domain(client: Client, namespace: str, domain: str) -> str:
+@traced
+def find_gateway_for_domain(client: "Client", namespace: str, domain: str) -> str:
     """Return the name of the istio Gateway serving the given domain.
 
     The Gateway is identified by a listener whose hostname matches ``domain`` (either
@@ -174,7 +212,7 @@ def find_gateway_for_domain(client: Client, namespace: str, domain: str) -> str:
     Returns:
         The name of the matching Gateway (equal to the charm app name).
     """
-    for gateway in client.list(GATEWAY_RESOURCE, namespace=namespace):
+    for gateway in client.list(gateway_resource(), namespace=namespace):
         spec = gateway.spec or {}
         if spec.get("gatewayClassName") != "istio":
             continue
@@ -197,8 +235,9 @@ def gateway_service_account(gateway: str) -> str:
     return f"{gateway}-istio"
 
 
+@traced
 def patch_gateway_wildcard_hostname(
-    client: Client, namespace: str, gateway: str, hostname: str
+    client: "Client", namespace: str, gateway: str, hostname: str
 ) -> None:
     """Patch every listener of a Gateway to use the given (wildcard) hostname.
 
@@ -207,18 +246,24 @@ def patch_gateway_wildcard_hostname(
     which rejects KServe's per-service subdomain routes. Remove this once the issue
     is fixed and the charm supports wildcard listeners natively.
     """
-    gw = client.get(GATEWAY_RESOURCE, name=gateway, namespace=namespace)
+    from lightkube.types import PatchType
+
+    gw = client.get(gateway_resource(), name=gateway, namespace=namespace)
     listeners = (gw.spec or {}).get("listeners", [])
     patch = [
         {"op": "replace", "path": f"/spec/listeners/{index}/hostname", "value": hostname}
         for index in range(len(listeners))
     ]
     log.info(f"Patching Gateway {namespace}/{gateway} listeners to hostname {hostname}")
-    client.patch(GATEWAY_RESOURCE, gateway, patch, namespace=namespace, patch_type=PatchType.JSON)
+    client.patch(
+        gateway_resource(), gateway, patch, namespace=namespace, patch_type=PatchType.JSON
+    )
 
 
-def _contributor_rolebinding(namespace: str, user: str, role: str) -> RoleBinding:
+def _contributor_rolebinding(namespace: str, user: str, role: str) -> "RoleBinding":
     """Build the RoleBinding a contributor would get from KFAM/github-profiles-automator."""
+    from lightkube.resources.rbac_authorization_v1 import RoleBinding
+
     name = to_rfc1123_compliant(f"{user}-{role}")
     return RoleBinding.from_dict(
         {
@@ -246,7 +291,7 @@ def _contributor_authorization_policy(namespace: str, user: str, role: str, prin
     ``kubeflow-userid`` header matching the contributor (the OAuth client id).
     """
     name = to_rfc1123_compliant(f"{user}-{role}")
-    return AUTHORIZATION_POLICY_RESOURCE.from_dict(
+    return authorization_policy_resource().from_dict(
         {
             "metadata": {
                 "name": name,
@@ -277,8 +322,9 @@ def _contributor_authorization_policy(namespace: str, user: str, role: str, prin
     )
 
 
+@traced
 def authorize_contributor(
-    client: Client, namespace: str, user: str, role: str, principals: list[str]
+    client: "Client", namespace: str, user: str, role: str, principals: list[str]
 ) -> None:
     """Grant a contributor access to a Profile namespace.
 
@@ -299,18 +345,50 @@ def authorize_contributor(
     )
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=5, max=60),
-    stop=tenacity.stop_after_delay(60 * 10),
-    reraise=True,
-)
-def wait_for_inferenceservice_ready(client: Client, name: str, namespace: str) -> str:
+@traced
+def apply_contributor_authorization_policies(
+    client: "Client", namespace: str, users: list[str], role: str, principals: list[str]
+) -> None:
+    """Create the ambient AuthorizationPolicy of each given contributor.
+
+    Only the AuthorizationPolicies are created (no RoleBindings), since they are what the
+    waypoint evaluates on every request. Used to grow the number of policies attached to
+    the waypoint `Gateway` of a Profile namespace.
+    """
+    log.info(f"Applying {len(users)} contributor AuthorizationPolicies on namespace {namespace}")
+    for user in users:
+        client.apply(
+            _contributor_authorization_policy(namespace, user, role, principals),
+            field_manager="m2m-uats",
+        )
+
+
+@traced
+def delete_contributor_authorization_policies(
+    client: "Client", namespace: str, users: list[str], role: str
+) -> None:
+    """Best-effort deletion of the ambient AuthorizationPolicy of each given contributor."""
+    from lightkube import ApiError
+
+    log.info(f"Deleting {len(users)} contributor AuthorizationPolicies on namespace {namespace}")
+    for user in users:
+        name = to_rfc1123_compliant(f"{user}-{role}")
+        try:
+            client.delete(authorization_policy_resource(), name=name, namespace=namespace)
+        except ApiError as error:
+            if error.status.code != 404:
+                log.warning(f"Could not delete AuthorizationPolicy {namespace}/{name}: {error}")
+
+
+@traced
+@retrying("inference_service")
+def wait_for_inferenceservice_ready(client: "Client", name: str, namespace: str) -> str:
     """Wait for an InferenceService to become Ready and return its hostname.
 
     Returns:
         The InferenceService hostname (the URL with its scheme stripped).
     """
-    isvc = client.get(INFERENCE_SERVICE_RESOURCE, name=name, namespace=namespace)
+    isvc = client.get(inference_service_resource(), name=name, namespace=namespace)
     status = isvc.status or {}
     conditions = status.get("conditions", [])
     ready_condition = next((c for c in conditions if c.get("type") == "Ready"), {})
@@ -333,6 +411,38 @@ def wait_for_inferenceservice_ready(client: Client, name: str, namespace: str) -
     return hostname
 
 
+def _inferenceservice_hostname(isvc) -> str | None:
+    """Return the hostname of a Ready InferenceService, or None if it is not Ready."""
+    status = isvc.status or {}
+    conditions = status.get("conditions", [])
+    ready_condition = next((c for c in conditions if c.get("type") == "Ready"), {})
+    if ready_condition.get("status") != "True":
+        return None
+    return status.get("url", "").split("://", 1)[-1].split("/", 1)[0] or None
+
+
+@traced
+def watch_inferenceservice_ready(
+    client: "Client", name: str, namespace: str, timeout: float = 60 * 10
+) -> str:
+    """Watch an InferenceService until it becomes Ready and return its hostname.
+
+    Contrary to `wait_for_inferenceservice_ready`, this returns as soon as the API server
+    reports the Ready condition, so the elapsed time can be used as a measurement.
+    """
+    isvc = watch_until(
+        client,
+        inference_service_resource(),
+        lambda _, obj: _inferenceservice_hostname(obj) is not None,
+        timeout,
+        namespace=namespace,
+        fields={"metadata.name": name},
+    )
+    hostname = _inferenceservice_hostname(isvc)
+    log.info(f"InferenceService {namespace}/{name} is Ready at {hostname}")
+    return hostname
+
+
 @contextmanager
 def _pin_dns(hostname: str, ip: str):
     """Temporarily resolve ``hostname`` to ``ip`` for outgoing connections.
@@ -353,6 +463,26 @@ def _pin_dns(hostname: str, ip: str):
         socket.getaddrinfo = original_getaddrinfo
 
 
+@traced
+def send_inference_request(
+    hostname: str, gateway_ip: str, token: str | None, payload: str | bytes, model_name: str
+) -> "requests.Response":
+    """Send an inference request to the InferenceService and return the raw response.
+
+    Connects to the gateway LoadBalancer IP (via a temporary DNS override) while
+    presenting the correct TLS SNI and Host header for ``hostname``. See
+    `request_inference` for the arguments.
+    """
+    url = f"https://{hostname}/v1/models/{model_name}:predict"
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+
+    with _pin_dns(hostname, gateway_ip):
+        return _requests().post(url, data=payload, headers=headers, verify=False, timeout=60)
+
+
+@traced
 def request_inference(
     hostname: str, gateway_ip: str, token: str | None, payload: str, model_name: str
 ) -> tuple[int, str]:
@@ -371,13 +501,7 @@ def request_inference(
     Returns:
         A ``(http_status_code, response_body)`` tuple.
     """
-    url = f"https://{hostname}/v1/models/{model_name}:predict"
-    headers = {"Content-Type": "application/json"}
-    if token is not None:
-        headers["Authorization"] = f"Bearer {token}"
-
-    with _pin_dns(hostname, gateway_ip):
-        response = requests.post(url, data=payload, headers=headers, verify=False, timeout=60)
+    response = send_inference_request(hostname, gateway_ip, token, payload, model_name)
 
     log.info(f"Inference request to {hostname} returned HTTP {response.status_code}")
     return response.status_code, response.text
@@ -0,0 +1,327 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""M2M (machine-to-machine) performance tests.
+
+These tests reuse the M2M deployment path (Hydra token, ingress gateway, Profile
+AuthorizationPolicies, KServe InferenceService) to measure how request latency evolves
+under production-like conditions. They only run when both `--include-m2m-tests` and
+`--include-perf-tests` are passed, and write their measurements to `--results-dir`.
+"""
+
+import json
+import logging
+import random
+import time
+
+import pytest
+from helpers import (
+    ISVC_NAME,
+    NAMESPACE,
+    apply_contributor_authorization_policies,
+    delete_contributor_authorization_policies,
+    request_inference,
+    send_inference_request,
+    watch_inferenceservice_ready,
+)
+from results import format_table, summarize, write_results
+from utils import (
+    INFERENCE_PAYLOAD,
+    INFERENCE_SERVICE_TEMPLATE_FILE,
+    PodLifecycleRecorder,
+    inference_service_resource,
+)
+
+log = logging.getLogger(__name__)
+
+# Number of contributor AuthorizationPolicies attached to the waypoint at each step.
+POLICY_COUNTS = [1, 10, 100, 1000]
+# Requests sent per step and per request type (authorized, denied).
+POLICY_SAMPLES = 20
+# Time for the new policies to be pushed to the waypoint before measuring.
+POLICY_SETTLE_SECONDS = 15
+
+# Number of iris instances per inference request in the batch-size sweep.
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+# Requests sent per batch size.
+BATCH_SAMPLES = 5
+# Header set by the envoy proxies with the time (ms) spent upstream, i.e. in the model server.
+UPSTREAM_TIME_HEADER = "x-envoy-upstream-service-time"
+
+# InferenceService allowed to scale to zero, used to measure cold starts.
+COLD_ISVC_NAME = "sklearn-v2-iris-cold"
+# Shortest Knative autoscaling window, so that the idle InferenceService scales to zero quickly.
+COLD_ISVC_ANNOTATIONS = {"autoscaling.knative.dev/window": "6s"}
+COLD_READY_TIMEOUT_SECONDS = 60 * 10
+COLD_SCALE_TO_ZERO_TIMEOUT_SECONDS = 60 * 5
+COLD_FIRST_PREDICTION_TIMEOUT_SECONDS = 60 * 2
+# The Ready event of a pod can be watched after the request it served returned.
+COLD_POD_READY_EVENT_TIMEOUT_SECONDS = 30
+
+
+def _iris_instances(count: int, seed: int = 0) -> list[list[float]]:
+    """Generate `count` random iris feature vectors within the ranges of the dataset."""
+    rng = random.Random(seed)
+    ranges = [(4.3, 7.9), (2.0, 4.4), (1.0, 6.9), (0.1, 2.5)]
+    return [[round(rng.uniform(low, high), 1) for low, high in ranges] for _ in range(count)]
+
+
+def _timed_inference(
+    hostname: str, gateway_ip: str, token: str | None, model_name: str = ISVC_NAME
+) -> tuple[int, float]:
+    """Send an inference request and return its HTTP status code and latency in ms."""
+    start = time.perf_counter()
+    http_code, _ = request_inference(hostname, gateway_ip, token, INFERENCE_PAYLOAD, model_name)
+    return http_code, (time.perf_counter() - start) * 1000
+
+
+@pytest.mark.perf
+def test_authorization_policy_scaling(
+    lightkube_client,
+    create_inference_service,
+    authorized_token,
+    gateway_ip,
+    gateway_principals,
+    results_dir,
+):
+    """Measure request latency against the number of contributor AuthorizationPolicies.
+
+    At each step, dummy contributors are authorized on the Profile until the waypoint
+    carries the expected number of AuthorizationPolicies, on top of the one of the
+    authorized client. Then the latency of authorized (200) and token-less (403) requests
+    is sampled.
+    """
+    hostname = create_inference_service
+    contributors = [f"perf-contributor-{index}" for index in range(max(POLICY_COUNTS))]
+    steps = []
+    applied = 0
+
+    try:
+        for count in POLICY_COUNTS:
+            apply_contributor_authorization_policies(
+                lightkube_client,
+                NAMESPACE,
+                contributors[applied:count],
+                "edit",
+                gateway_principals,
+            )
+            applied = count
+            log.info(f"Waiting {POLICY_SETTLE_SECONDS}s for {count} policies to propagate...")
+            time.sleep(POLICY_SETTLE_SECONDS)
+
+            authorized, denied = [], []
+            for _ in range(POLICY_SAMPLES):
+                http_code, latency = _timed_inference(hostname, gateway_ip, authorized_token)
+                assert (
+                    http_code == 200
+                ), f"Expected HTTP 200 with {count} policies, got {http_code}"
+                authorized.append(latency)
+
+                http_code, latency = _timed_inference(hostname, gateway_ip, None)
+                assert (
+                    http_code == 403
+                ), f"Expected HTTP 403 with {count} policies, got {http_code}"
+                denied.append(latency)
+
+            steps.append(
+                {
+                    "policies": count,
+                    "authorized_ms": summarize(authorized),
+                    "denied_ms": summarize(denied),
+                }
+            )
+    finally:
+        delete_contributor_authorization_policies(
+            lightkube_client, NAMESPACE, contributors[:applied], "edit"
+        )
+
+    headers = ["policies", "200 p50", "200 p90", "200 p99", "403 p50", "403 p90", "403 p99"]
+    rows = [
+        [
+            step["policies"],
+            *(step["authorized_ms"][key] for key in ("p50", "p90", "p99")),
+            *(step["denied_ms"][key] for key in ("p50", "p90", "p99")),
+        ]
+        for step in steps
+    ]
+    log.info(
+        f"Latency (ms) versus contributor AuthorizationPolicy count:\n{format_table(headers, rows)}"
+    )
+    write_results(results_dir, "m2m-authorization-policy-scaling", {"steps": steps})
+
+
+@pytest.mark.perf
+def test_inference_batch_size_sweep(
+    create_inference_service, authorized_token, gateway_ip, results_dir
+):
+    """Measure inference cost against the number of instances per request.
+
+    For each batch size, the request is serialised on the client and sent through the
+    ingress gateway, recording the bytes on the wire, the serialisation time, the latency
+    until the response headers were received and, when the proxies report it, the time
+    spent in the model server.
+    """
+    hostname = create_inference_service
+    sweep = []
+
+    for batch_size in BATCH_SIZES:
+        instances = _iris_instances(batch_size)
+        serialization, latency, upstream = [], [], []
+        for _ in range(BATCH_SAMPLES):
+            start = time.perf_counter()
+            payload = json.dumps({"instances": instances}).encode()
+            serialization.append((time.perf_counter() - start) * 1000)
+
+            response = send_inference_request(
+                hostname, gateway_ip, authorized_token, payload, ISVC_NAME
+            )
+            assert (
+                response.status_code == 200
+            ), f"Expected HTTP 200 for batch size {batch_size}, got {response.status_code}"
+            predictions = response.json()["predictions"]
+            assert (
+                len(predictions) == batch_size
+            ), f"Expected {batch_size} predictions, got {len(predictions)}"
+
+            latency.append(response.elapsed.total_seconds() * 1000)
+            if UPSTREAM_TIME_HEADER in response.headers:
+                upstream.append(float(response.headers[UPSTREAM_TIME_HEADER]))
+
+        latency_summary = summarize(latency)
+        sweep.append(
+            {
+                "batch_size": batch_size,
+                "request_bytes": len(payload),
+                "response_bytes": len(response.content),
+                "serialization_ms": summarize(serialization),
+                "latency_ms": latency_summary,
+                "upstream_ms": summarize(upstream),
+                "instances_per_second": batch_size / (latency_summary["p50"] / 1000),
+            }
+        )
+
+    headers = ["batch", "req KB", "resp KB", "ser p50", "lat p50", "lat p90", "inst/s"]
+    rows = [
+        [
+            entry["batch_size"],
+            entry["request_bytes"] / 1024,
+            entry["response_bytes"] / 1024,
+            entry["serialization_ms"]["p50"],
+            entry["latency_ms"]["p50"],
+            entry["latency_ms"]["p90"],
+            entry["instances_per_second"],
+        ]
+        for entry in sweep
+    ]
+    log.info(f"Inference cost (ms) versus batch size:\n{format_table(headers, rows)}")
+    write_results(results_dir, "m2m-inference-batch-size-sweep", {"sweep": sweep})
+
+
+def _first_successful_prediction(hostname: str, gateway_ip: str, token: str) -> float:
+    """Send inference requests until one succeeds and return the monotonic time it did.
+
+    The InferenceService can report Ready before the route through the gateway is
+    programmed, so the first requests may fail with e.g. 404 or 503.
+    """
+    deadline = time.monotonic() + COLD_FIRST_PREDICTION_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        http_code, _ = request_inference(
+            hostname, gateway_ip, token, INFERENCE_PAYLOAD, COLD_ISVC_NAME
+        )
+        if http_code == 200:
+            return time.monotonic()
+        time.sleep(0.2)
+    raise TimeoutError(f"No successful prediction from {hostname} within the timeout")
+
+
+@pytest.mark.perf
+def test_inference_cold_start(
+    lightkube_client, create_profile, patch_gateway, authorized_token, gateway_ip, results_dir
+):
+    """Measure the InferenceService creation, first prediction and scale-from-zero latency.
+
+    A dedicated InferenceService that may scale to zero is created, while the pods of its
+    predictor and its Ready condition are followed with watches. Once it is Ready and has
+    served a first prediction, it is left idle until all its pods are gone, at which point
+    the latency of the cold request that scales it back up is measured.
+    """
+    from lightkube import ApiError, codecs
+
+    resources = list(
+        codecs.load_all_yaml(
+            INFERENCE_SERVICE_TEMPLATE_FILE.read_text(),
+            context={
+                "name": COLD_ISVC_NAME,
+                "namespace": NAMESPACE,
+                "min_replicas": 0,
+                "annotations": COLD_ISVC_ANNOTATIONS,
+            },
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 InferenceService, got {len(resources)}!"
+    labels = {"serving.kserve.io/inferenceservice": COLD_ISVC_NAME}
+    results = {}
+
+    with PodLifecycleRecorder(lightkube_client, NAMESPACE, labels) as pods:
+        try:
+            log.info(f"Creating InferenceService {NAMESPACE}/{COLD_ISVC_NAME}...")
+            created = time.monotonic()
+            lightkube_client.create(resources[0])
+
+            hostname = watch_inferenceservice_ready(
+                lightkube_client, COLD_ISVC_NAME, NAMESPACE, COLD_READY_TIMEOUT_SECONDS
+            )
+            ready = time.monotonic()
+            first_prediction = _first_successful_prediction(hostname, gateway_ip, authorized_token)
+            results["creation_to_ready_s"] = ready - created
+            results["creation_to_first_prediction_s"] = first_prediction - created
+            results["pod_ready_s"] = (
+                pods.wait_for_event(
+                    lambda event: event["ready"], COLD_POD_READY_EVENT_TIMEOUT_SECONDS
+                )["time"]
+                - created
+            )
+
+            log.info("Waiting for the idle InferenceService to scale to zero...")
+            try:
+                idle = time.monotonic()
+                pods.wait_for(lambda states: not states, COLD_SCALE_TO_ZERO_TIMEOUT_SECONDS)
+            except TimeoutError:
+                write_results(results_dir, "m2m-inference-cold-start", results)
+                pytest.skip(
+                    f"InferenceService {COLD_ISVC_NAME} did not scale to zero; is KServe"
+                    " deployed in Serverless mode?"
+                )
+            results["idle_to_zero_s"] = time.monotonic() - idle
+
+            cold_start = time.monotonic()
+            http_code, latency = _timed_inference(
+                hostname, gateway_ip, authorized_token, COLD_ISVC_NAME
+            )
+            assert http_code == 200, f"Expected HTTP 200 for the cold request, got {http_code}"
+            results["cold_request_ms"] = latency
+            results["cold_pod_ready_s"] = (
+                pods.wait_for_event(
+                    lambda event: event["ready"] and event["time"] >= cold_start,
+                    COLD_POD_READY_EVENT_TIMEOUT_SECONDS,
+                )["time"]
+                - cold_start
+            )
+            _, results["warm_request_ms"] = _timed_inference(
+                hostname, gateway_ip, authorized_token, COLD_ISVC_NAME
+            )
+        finally:
+            log.info(f"Deleting InferenceService {NAMESPACE}/{COLD_ISVC_NAME}...")
+            try:
+                lightkube_client.delete(
+                    inference_service_resource(), name=COLD_ISVC_NAME, namespace=NAMESPACE
+                )
+            except ApiError as error:
+                if error.status.code != 404:
+                    raise
+
+    log.info(
+        "Cold start measurements:\n"
+        + format_table(["measurement", "value"], [[key, value] for key, value in results.items()])
+    )
+    write_results(results_dir, "m2m-inference-cold-start", results)
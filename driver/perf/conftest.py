@@ -0,0 +1,85 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Conftest for performance tests.
+
+The fixtures below are shared by every test module under `driver/perf/`.
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+# Add parent directory to path to share fixtures/utils with the main driver
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest  # noqa: E402
+from utils import (  # noqa: E402
+    assert_namespace_active,
+    assert_poddefault_created_in_namespace,
+    assert_profile_deleted,
+    assert_service_account_exists,
+    kube_client,
+    profile_resource,
+)
+
+log = logging.getLogger(__name__)
+
+# Assets directory is relative to the repository root.
+ASSETS_DIR = Path(__file__).parent.parent.parent / "assets"
+PROFILE_TEMPLATE_FILE = ASSETS_DIR / "test-profile.yaml.j2"
+
+NAMESPACE = "test-perf"
+KFP_PODDEFAULT_NAME = "access-ml-pipeline"
+
+
+@pytest.fixture(scope="module")
+def lightkube_client():
+    """Initialise a Lightkube Client."""
+    from lightkube.generic_resource import load_in_cluster_generic_resources
+
+    client = kube_client()
+    load_in_cluster_generic_resources(client)
+    return client
+
+
+@pytest.fixture(scope="module")
+def kubeflow_namespace(request):
+    """Namespace of the Kubeflow control plane, i.e. the `--model` option."""
+    return request.config.getoption("--model")
+
+
+@pytest.fixture(scope="module")
+def create_profile(lightkube_client):
+    """Create the performance test Profile and clean it up at the end of the module.
+
+    Waits for the KFP PodDefault and the `default-editor` ServiceAccount, so that probe
+    pods can be created in the namespace right away.
+    """
+    from lightkube import ApiError, codecs
+    from lightkube.types import CascadeType
+
+    log.info(f"Creating Profile {NAMESPACE}...")
+    resources = list(
+        codecs.load_all_yaml(
+            PROFILE_TEMPLATE_FILE.read_text(),
+            context={"namespace": NAMESPACE},
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 Profile, got {len(resources)}!"
+    lightkube_client.create(resources[0])
+
+    assert_namespace_active(lightkube_client, NAMESPACE)
+    assert_poddefault_created_in_namespace(lightkube_client, KFP_PODDEFAULT_NAME, NAMESPACE)
+    assert_service_account_exists(lightkube_client, "default-editor", NAMESPACE)
+
+    yield NAMESPACE
+
+    log.info(f"Deleting Profile {NAMESPACE}...")
+    try:
+        lightkube_client.delete(profile_resource(), name=NAMESPACE, cascade=CascadeType.FOREGROUND)
+        assert_profile_deleted(lightkube_client, NAMESPACE, log)
+    except ApiError as error:
+        if error.status.code != 404:
+            raise
+        log.info(f"Profile {NAMESPACE} already deleted")
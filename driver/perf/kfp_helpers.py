@@ -0,0 +1,133 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Helpers to drive the KFP API from a probe pod inside a Profile namespace.
+
+Requests are sent with curl from a pod carrying the `access-ml-pipeline: "true"` label, so
+they are authenticated with the ServiceAccount token mounted by the KFP PodDefault, exactly
+like the notebooks do.
+"""
+
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from utils import PodShell, curl_in_pod
+
+log = logging.getLogger(__name__)
+
+ASSETS_DIR = Path(__file__).parent.parent.parent / "assets"
+PIPELINE_SPEC_FILE = ASSETS_DIR / "kfp-hello-pipeline.yaml"
+
+KFP_POD_LABELS = {"access-ml-pipeline": "true"}
+# States after which a run does not change anymore.
+TERMINAL_RUN_STATES = {"SUCCEEDED", "SKIPPED", "FAILED", "CANCELED"}
+
+
+def kfp_api_url(kubeflow_namespace: str, path: str) -> str:
+    """Return the in-cluster URL of a KFP v2beta1 API path."""
+    return f"http://ml-pipeline.{kubeflow_namespace}.svc:8888/apis/v2beta1/{path}"
+
+
+def load_pipeline_spec() -> dict:
+    """Load the minimal pipeline used to measure run submission and scheduling."""
+    import yaml
+
+    return yaml.safe_load(PIPELINE_SPEC_FILE.read_text())
+
+
+def list_experiments(shell: PodShell, kubeflow_namespace: str) -> tuple[int, float]:
+    """List the experiments of the pod's namespace and return the HTTP code and latency in ms."""
+    http_code, _, latency = curl_in_pod(
+        shell,
+        kfp_api_url(kubeflow_namespace, f"experiments?namespace={shell.namespace}"),
+        kfp_auth=True,
+    )
+    return http_code, latency
+
+
+def create_experiment(shell: PodShell, kubeflow_namespace: str, name: str) -> str:
+    """Create a KFP experiment in the pod's namespace and return its id."""
+    http_code, body, _ = curl_in_pod(
+        shell,
+        kfp_api_url(kubeflow_namespace, "experiments"),
+        data=json.dumps({"display_name": name, "namespace": shell.namespace}),
+        kfp_auth=True,
+    )
+    assert http_code == 200, f"Failed to create experiment {name} (HTTP {http_code}): {body}"
+    experiment_id = json.loads(body)["experiment_id"]
+    log.info(f"Created KFP experiment {name} ({experiment_id})")
+    return experiment_id
+
+
+def delete_experiment(shell: PodShell, kubeflow_namespace: str, experiment_id: str) -> None:
+    """Delete a KFP experiment and its runs.
+
+    KFP keeps the runs of a deleted experiment, so they are listed and deleted first.
+    """
+    run_ids, page_token = [], ""
+    while True:
+        http_code, body, _ = curl_in_pod(
+            shell,
+            kfp_api_url(
+                kubeflow_namespace,
+                f"runs?namespace={shell.namespace}&experiment_id={experiment_id}"
+                f"&page_size=100&page_token={page_token}",
+            ),
+            kfp_auth=True,
+        )
+        assert http_code == 200, f"Failed to list the runs of {experiment_id} (HTTP {http_code})"
+        response = json.loads(body)
+        run_ids += [run["run_id"] for run in response.get("runs", [])]
+        if not (page_token := response.get("next_page_token")):
+            break
+
+    log.info(f"Deleting KFP experiment {experiment_id} and its {len(run_ids)} runs...")
+    for path in [f"runs/{run_id}" for run_id in run_ids] + [f"experiments/{experiment_id}"]:
+        http_code, body, _ = curl_in_pod(
+            shell, kfp_api_url(kubeflow_namespace, path), kfp_auth=True, method="DELETE"
+        )
+        assert http_code == 200, f"Failed to delete {path} (HTTP {http_code}): {body}"
+
+
+def submit_run(
+    shell: PodShell,
+    kubeflow_namespace: str,
+    experiment_id: str,
+    name: str,
+    pipeline_spec: dict,
+) -> tuple[str, float]:
+    """Submit a run of the pipeline spec and return the run id and submission latency in ms."""
+    http_code, body, latency = curl_in_pod(
+        shell,
+        kfp_api_url(kubeflow_namespace, "runs"),
+        data=json.dumps(
+            {"display_name": name, "experiment_id": experiment_id, "pipeline_spec": pipeline_spec}
+        ),
+        kfp_auth=True,
+    )
+    assert http_code == 200, f"Failed to submit run {name} (HTTP {http_code}): {body}"
+    return json.loads(body)["run_id"], latency
+
+
+def get_run(shell: PodShell, kubeflow_namespace: str, run_id: str) -> dict:
+    """Return the KFP run with the given id."""
+    http_code, body, _ = curl_in_pod(
+        shell, kfp_api_url(kubeflow_namespace, f"runs/{run_id}"), kfp_auth=True
+    )
+    assert http_code == 200, f"Failed to get run {run_id} (HTTP {http_code}): {body}"
+    return json.loads(body)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an RFC 3339 timestamp returned by the KFP API, e.g. `2026-01-01T00:00:00Z`."""
+    return datetime.fromisoformat(value)
+
+
+def state_reached_at(run: dict, state: str) -> datetime | None:
+    """Return when the run first reached the given state, according to its state history."""
+    for entry in run.get("state_history", []):
+        if entry.get("state") == state:
+            return parse_timestamp(entry["update_time"])
+    return None
@@ -0,0 +1,212 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""KFP pipeline submission stress test.
+
+Submit bursts of small pipeline runs concurrently into the test Profile, through the same
+`access-ml-pipeline` PodDefault path as the notebooks, and measure how the ml-pipeline API
+and the Argo workflow controller keep up as the concurrency grows:
+
+* submit latency, as measured by curl in the probe pod
+* queue-to-running time, from the creation of a run to it reaching RUNNING
+* run duration, from the creation of a run to it finishing
+* completion throughput, i.e. the runs of a burst over the time until the last finished
+
+The concurrency levels are set with `--kfp-stress-ramp`, and the results are written to
+`kfp-stress.json` in `--results-dir`.
+"""
+
+import contextlib
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from kfp_helpers import (
+    KFP_POD_LABELS,
+    TERMINAL_RUN_STATES,
+    create_experiment,
+    delete_experiment,
+    get_run,
+    load_pipeline_spec,
+    parse_timestamp,
+    state_reached_at,
+    submit_run,
+)
+from results import format_table, summarize, write_results
+from utils import PodShell, assert_pod_running, create_probe_pod, delete_pod
+
+log = logging.getLogger(__name__)
+
+PROBE_POD_NAME = "kfp-stress-probe"
+
+# Time for all the runs of a burst to finish.
+BURST_TIMEOUT_SECONDS = 60 * 20
+RUN_POLL_INTERVAL_SECONDS = 5
+
+
+@pytest.fixture(scope="module")
+def ramp(request) -> list[int]:
+    """Concurrency levels of the stress test, i.e. the `--kfp-stress-ramp` option."""
+    return request.config.getoption("--kfp-stress-ramp")
+
+
+@pytest.fixture(scope="module")
+def probe_shells(lightkube_client, create_profile, ramp):
+    """Create a probe pod with access to the KFP API and open one shell per concurrent run.
+
+    The shells are handed out through a queue, so that each submission has a session of
+    its own and the runs of a burst are really submitted at the same time.
+    """
+    try:
+        create_probe_pod(lightkube_client, PROBE_POD_NAME, create_profile, KFP_POD_LABELS)
+        assert_pod_running(lightkube_client, PROBE_POD_NAME, create_profile)
+
+        with contextlib.ExitStack() as stack:
+            shells = queue.Queue()
+            for _ in range(max(ramp)):
+                shell = PodShell(lightkube_client, PROBE_POD_NAME, create_profile)
+                shells.put(stack.enter_context(shell))
+            yield shells
+    finally:
+        delete_pod(lightkube_client, PROBE_POD_NAME, create_profile)
+
+
+@pytest.fixture(scope="module")
+def stress_experiment(probe_shells, kubeflow_namespace):
+    """Create the KFP experiment the runs are submitted to, and delete it with its runs."""
+    shell = probe_shells.get()
+    try:
+        experiment_id = create_experiment(shell, kubeflow_namespace, "kfp-stress")
+    finally:
+        probe_shells.put(shell)
+
+    yield experiment_id
+
+    shell = probe_shells.get()
+    try:
+        delete_experiment(shell, kubeflow_namespace, experiment_id)
+    finally:
+        probe_shells.put(shell)
+
+
+def _submit(shells: queue.Queue, kubeflow_namespace: str, *args) -> tuple[str, float]:
+    """Submit a run with a shell taken from the pool and return its id and latency in ms."""
+    shell = shells.get()
+    try:
+        return submit_run(shell, kubeflow_namespace, *args)
+    finally:
+        shells.put(shell)
+
+
+def _wait_for_runs(shell: PodShell, kubeflow_namespace: str, run_ids: list[str]) -> list[dict]:
+    """Poll the runs until they all reached a terminal state and return them."""
+    deadline = time.monotonic() + BURST_TIMEOUT_SECONDS
+    runs = {}
+    pending = set(run_ids)
+    while pending:
+        for run_id in list(pending):
+            run = get_run(shell, kubeflow_namespace, run_id)
+            if run.get("state") in TERMINAL_RUN_STATES:
+                runs[run_id] = run
+                pending.discard(run_id)
+        if not pending:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{len(pending)} runs did not finish within the timeout")
+        log.info(f"Waiting for {len(pending)}/{len(run_ids)} runs to finish...")
+        time.sleep(RUN_POLL_INTERVAL_SECONDS)
+    return [runs[run_id] for run_id in run_ids]
+
+
+def _burst_summary(concurrency: int, submit_ms: list[float], runs: list[dict]) -> dict:
+    """Summarise the submissions and state transitions of the runs of a burst.
+
+    Terminal runs without a finish time, e.g. canceled or skipped ones, are left out of the
+    durations; when none of the runs finished, the burst is reported as incomplete, without
+    makespan nor throughput.
+    """
+    queue_to_running, duration, finished = [], [], []
+    for run in runs:
+        created = parse_timestamp(run["created_at"])
+        if running := state_reached_at(run, "RUNNING"):
+            queue_to_running.append((running - created).total_seconds())
+        if run.get("finished_at"):
+            finished.append(parse_timestamp(run["finished_at"]))
+            duration.append((finished[-1] - created).total_seconds())
+
+    makespan = None
+    if finished:
+        first_created = min(parse_timestamp(run["created_at"]) for run in runs)
+        makespan = (max(finished) - first_created).total_seconds()
+    else:
+        log.warning(f"None of the {len(runs)} runs of the burst of {concurrency} finished")
+    return {
+        "concurrency": concurrency,
+        "incomplete": not finished,
+        "submit_ms": summarize(submit_ms),
+        "queue_to_running_s": summarize(queue_to_running),
+        "run_duration_s": summarize(duration),
+        "makespan_s": makespan,
+        "runs_per_minute": len(runs) / makespan * 60 if makespan else None,
+        "states": {
+            state: sum(run["state"] == state for run in runs)
+            for state in sorted({run["state"] for run in runs})
+        },
+    }
+
+
+@pytest.mark.perf
+def test_kfp_submission_stress(
+    probe_shells, stress_experiment, kubeflow_namespace, ramp, results_dir
+):
+    """Submit bursts of concurrent pipeline runs, following the concurrency ramp.
+
+    Each burst is submitted at once, then left to finish before the next one starts, so
+    that the measurements of a level are not skewed by the runs of the previous one.
+    """
+    pipeline_spec = load_pipeline_spec()
+    bursts = []
+    for concurrency in ramp:
+        log.info(f"Submitting {concurrency} concurrent runs...")
+        names = [f"kfp-stress-{concurrency}-{index}" for index in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            submissions = list(
+                pool.map(
+                    lambda name: _submit(
+                        probe_shells, kubeflow_namespace, stress_experiment, name, pipeline_spec
+                    ),
+                    names,
+                )
+            )
+
+        run_ids = [run_id for run_id, _ in submissions]
+        shell = probe_shells.get()
+        try:
+            runs = _wait_for_runs(shell, kubeflow_namespace, run_ids)
+        finally:
+            probe_shells.put(shell)
+        bursts.append(_burst_summary(concurrency, [latency for _, latency in submissions], runs))
+
+    headers = ["runs", "submit p50", "submit p90", "queue p50", "queue p90", "runs/min"]
+    rows = [
+        [
+            burst["concurrency"],
+            burst["submit_ms"]["p50"],
+            burst["submit_ms"]["p90"],
+            burst["queue_to_running_s"].get("p50"),
+            burst["queue_to_running_s"].get("p90"),
+            burst["runs_per_minute"],
+        ]
+        for burst in bursts
+    ]
+    log.info(f"KFP submission stress (submit in ms, queue in s):\n{format_table(headers, rows)}")
+    write_results(results_dir, "kfp-stress", {"bursts": bursts})
+
+    failed = {
+        burst["concurrency"]: burst["states"]
+        for burst in bursts
+        if set(burst["states"]) != {"SUCCEEDED"}
+    }
+    assert not failed, f"Some runs did not succeed, run states per concurrency level: {failed}"
@@ -0,0 +1,251 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Service mesh performance tests.
+
+Run the same in-cluster workloads under the Istio mode the cluster is deployed with
+(`sidecar` or `ambient`, see `assets/versions-*.yaml`) and record their cost, so that
+both modes can be compared on the same hardware:
+
+* pod startup time, from creation to Ready
+* latency of listing experiments through the KFP API
+* latency of in-cluster inference requests to a KServe InferenceService
+* latency of submitting a pipeline run through the KFP API
+
+Results are written to `mesh-performance-<mode>.json` in `--results-dir`. Once the results
+of both modes are there, e.g. by running the tests against a sidecar and an ambient
+deployment with the same `--results-dir`, the overhead of each mode is written to
+`mesh-performance-comparison.json`.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+
+import pytest
+from kfp_helpers import (
+    KFP_POD_LABELS,
+    create_experiment,
+    delete_experiment,
+    list_experiments,
+    load_pipeline_spec,
+    submit_run,
+)
+from results import format_table, summarize, write_results
+from utils import (
+    INFERENCE_PAYLOAD,
+    INFERENCE_SERVICE_TEMPLATE_FILE,
+    PROBE_LABEL,
+    PodLifecycleRecorder,
+    PodShell,
+    assert_pod_running,
+    create_probe_pod,
+    curl_in_pod,
+    delete_pod,
+    inference_service_resource,
+    watch_until,
+)
+
+log = logging.getLogger(__name__)
+
+ISVC_NAME = "sklearn-v2-iris-mesh"
+PROBE_POD_NAME = "mesh-perf-probe"
+
+# Number of probe pods started to measure pod startup time.
+POD_STARTUP_SAMPLES = 3
+POD_STARTUP_TIMEOUT_SECONDS = 60 * 5
+# Number of requests sent for each request workload.
+REQUEST_SAMPLES = 50
+# Number of pipeline runs submitted.
+SUBMISSION_SAMPLES = 10
+
+MODES = ("sidecar", "ambient")
+
+
+def _namespace_istio_mode(lightkube_client, namespace: str) -> str:
+    """Return the Istio mode of the namespace, based on the labels set by the Profile."""
+    from lightkube.resources.core_v1 import Namespace
+
+    labels = lightkube_client.get(Namespace, namespace).metadata.labels or {}
+    if labels.get("istio.io/dataplane-mode") == "ambient":
+        return "ambient"
+    if labels.get("istio-injection") == "enabled":
+        return "sidecar"
+    pytest.fail(f"Namespace {namespace} is neither enrolled in ambient nor sidecar mode")
+
+
+def _measure_pod_startup(lightkube_client, namespace: str, name: str) -> float:
+    """Create a probe pod and return the time in seconds until it becomes Ready."""
+    with PodLifecycleRecorder(lightkube_client, namespace, {PROBE_LABEL: name}) as pods:
+        created = time.monotonic()
+        create_probe_pod(lightkube_client, name, namespace, KFP_POD_LABELS)
+        ready = pods.wait_for(
+            lambda states: any(ready for _, ready in states.values()),
+            POD_STARTUP_TIMEOUT_SECONDS,
+        )
+    return ready - created
+
+
+@pytest.fixture(scope="module")
+def istio_mode(lightkube_client, create_profile):
+    """Istio mode (`sidecar` or `ambient`) the Profile namespace is enrolled in."""
+    mode = _namespace_istio_mode(lightkube_client, create_profile)
+    log.info(f"Istio Mode: {mode}")
+    return mode
+
+
+@pytest.fixture(scope="module")
+def probe_shell(lightkube_client, create_profile):
+    """Create a probe pod with access to the KFP API and open a shell session in it."""
+    try:
+        create_probe_pod(lightkube_client, PROBE_POD_NAME, create_profile, KFP_POD_LABELS)
+        assert_pod_running(lightkube_client, PROBE_POD_NAME, create_profile)
+
+        with PodShell(lightkube_client, PROBE_POD_NAME, create_profile) as shell:
+            yield shell
+    finally:
+        delete_pod(lightkube_client, PROBE_POD_NAME, create_profile)
+
+
+@pytest.fixture(scope="module")
+def kfp_experiment(probe_shell, kubeflow_namespace):
+    """Create the KFP experiment the runs are submitted to, and delete it with its runs."""
+    experiment_id = create_experiment(probe_shell, kubeflow_namespace, "mesh-perf")
+    yield experiment_id
+    delete_experiment(probe_shell, kubeflow_namespace, experiment_id)
+
+
+@pytest.fixture(scope="module")
+def inference_service_url(lightkube_client, create_profile):
+    """Create an InferenceService and return its in-cluster predict URL."""
+    from lightkube import ApiError, codecs
+
+    log.info(f"Creating InferenceService {create_profile}/{ISVC_NAME}...")
+    resources = list(
+        codecs.load_all_yaml(
+            INFERENCE_SERVICE_TEMPLATE_FILE.read_text(),
+            context={"name": ISVC_NAME, "namespace": create_profile},
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 InferenceService, got {len(resources)}!"
+    lightkube_client.create(resources[0])
+
+    isvc = watch_until(
+        lightkube_client,
+        inference_service_resource(),
+        lambda _, obj: any(
+            c.get("type") == "Ready" and c.get("status") == "True"
+            for c in (obj.status or {}).get("conditions", [])
+        ),
+        timeout=60 * 10,
+        namespace=create_profile,
+        fields={"metadata.name": ISVC_NAME},
+    )
+    address = isvc.status["address"]["url"]
+
+    yield f"{address}/v1/models/{ISVC_NAME}:predict"
+
+    log.info(f"Deleting InferenceService {create_profile}/{ISVC_NAME}...")
+    try:
+        lightkube_client.delete(
+            inference_service_resource(), name=ISVC_NAME, namespace=create_profile
+        )
+    except ApiError as error:
+        if error.status.code != 404:
+            raise
+
+
+def _compare(results_dir: Path) -> dict | None:
+    """Compare the results of both Istio modes, if both are available in the results dir."""
+    paths = {mode: results_dir / f"mesh-performance-{mode}.json" for mode in MODES}
+    if not all(path.exists() for path in paths.values()):
+        return None
+
+    sidecar, ambient = (json.loads(paths[mode].read_text())["workloads"] for mode in MODES)
+    comparison = {}
+    for workload in sidecar.keys() & ambient.keys():
+        comparison[workload] = {
+            "sidecar_p50": sidecar[workload]["p50"],
+            "ambient_p50": ambient[workload]["p50"],
+            "ambient_overhead_p50": ambient[workload]["p50"] - sidecar[workload]["p50"],
+            "sidecar_p90": sidecar[workload]["p90"],
+            "ambient_p90": ambient[workload]["p90"],
+            "ambient_overhead_p90": ambient[workload]["p90"] - sidecar[workload]["p90"],
+        }
+    return comparison
+
+
+@pytest.mark.perf
+def test_mesh_performance(
+    lightkube_client,
+    create_profile,
+    kubeflow_namespace,
+    istio_mode,
+    probe_shell,
+    kfp_experiment,
+    inference_service_url,
+    results_dir,
+):
+    """Measure the cost of common in-cluster workloads under the current Istio mode."""
+    namespace = create_profile
+
+    startup = []
+    for index in range(POD_STARTUP_SAMPLES):
+        name = f"mesh-perf-startup-{index}"
+        try:
+            startup.append(_measure_pod_startup(lightkube_client, namespace, name))
+        finally:
+            delete_pod(lightkube_client, name, namespace)
+
+    kfp_list = []
+    for _ in range(REQUEST_SAMPLES):
+        http_code, latency = list_experiments(probe_shell, kubeflow_namespace)
+        assert http_code == 200, f"Expected HTTP 200 when listing experiments, got {http_code}"
+        kfp_list.append(latency)
+
+    inference = []
+    for _ in range(REQUEST_SAMPLES):
+        http_code, body, latency = curl_in_pod(
+            probe_shell, inference_service_url, data=INFERENCE_PAYLOAD
+        )
+        assert http_code == 200, f"Expected HTTP 200 for inference, got {http_code}: {body}"
+        inference.append(latency)
+
+    pipeline_spec = load_pipeline_spec()
+    submission = []
+    for index in range(SUBMISSION_SAMPLES):
+        _, latency = submit_run(
+            probe_shell,
+            kubeflow_namespace,
+            kfp_experiment,
+            f"mesh-perf-{index}",
+            pipeline_spec,
+        )
+        submission.append(latency)
+
+    workloads = {
+        "pod_startup_ms": summarize([seconds * 1000 for seconds in startup]),
+        "kfp_list_experiments_ms": summarize(kfp_list),
+        "inference_ms": summarize(inference),
+        "pipeline_submission_ms": summarize(submission),
+    }
+    rows = [[name, stats["p50"], stats["p90"], stats["max"]] for name, stats in workloads.items()]
+    log.info(
+        f"Workload cost under {istio_mode} mode:\n"
+        + format_table(["workload", "p50", "p90", "max"], rows)
+    )
+    write_results(
+        results_dir, f"mesh-performance-{istio_mode}", {"mode": istio_mode, "workloads": workloads}
+    )
+
+    if comparison := _compare(results_dir):
+        rows = [
+            [name, stats["sidecar_p50"], stats["ambient_p50"], stats["ambient_overhead_p50"]]
+            for name, stats in sorted(comparison.items())
+        ]
+        log.info(
+            "Ambient versus sidecar:\n"
+            + format_table(["workload", "sidecar p50", "ambient p50", "overhead p50"], rows)
+        )
+        write_results(results_dir, "mesh-performance-comparison", comparison)
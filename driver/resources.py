@@ -0,0 +1,266 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Sample the resource usage of the pods of a namespace while the notebook tests run.
+
+Two sources are sampled at a fixed interval:
+
+* the metrics API (`metrics.k8s.io`), for the CPU and memory usage of every pod of the
+  namespace, i.e. the test Job pod and the workloads started by the notebooks
+* the cgroup of the test container, read through the pod, for the counters the metrics API
+  does not expose: CPU throttling, and OOM kills
+
+The samples are appended to a JSONL time series as they are taken, and attributed to the
+notebooks afterwards, based on the `Running <notebook>.ipynb...` lines of the Job logs.
+"""
+
+import functools
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from results import summarize
+
+if TYPE_CHECKING:
+    from lightkube import Client
+
+log = logging.getLogger(__name__)
+
+# cgroup v2 files of the container, printed as `<key> <value>` lines.
+CGROUP_SCRIPT = (
+    "cd /sys/fs/cgroup"
+    " && cat cpu.stat memory.events"
+    " && echo memory_current $(cat memory.current)"
+    " && echo memory_peak $(cat memory.peak 2>/dev/null || cat memory.current)"
+)
+NOTEBOOK_START = re.compile(r"Running (\S+)\.ipynb\.\.\.")
+NOTEBOOK_TIMED_OUT = re.compile(r"Timed out (\S+)\.ipynb after")
+
+MIB = 1024 * 1024
+# Factors of the CPU usage suffixes of metrics-server that `parse_quantity` does not know
+CPU_SUFFIXES = {"n": 1e-9, "u": 1e-6}
+
+
+@functools.cache
+def pod_metrics_resource():
+    """Return the PodMetrics resource of the metrics API."""
+    from lightkube.generic_resource import create_namespaced_resource
+
+    return create_namespaced_resource(
+        group="metrics.k8s.io",
+        version="v1beta1",
+        kind="PodMetrics",
+        plural="pods",
+    )
+
+
+def parse_cpu(quantity: str) -> float:
+    """Return the cores of a CPU quantity, e.g. the `123456789n` nanocores of metrics-server."""
+    from lightkube.utils.quantity import parse_quantity
+
+    if quantity[-1:] in CPU_SUFFIXES:
+        return float(quantity[:-1]) * CPU_SUFFIXES[quantity[-1]]
+    return float(parse_quantity(quantity))
+
+
+def _read_cgroup(client: "Client", pod_name: str, namespace: str, container: str) -> dict:
+    """Return the cgroup v2 CPU and memory counters of a container."""
+    response = client.exec(
+        pod_name,
+        namespace=namespace,
+        container=container,
+        command=["sh", "-c", CGROUP_SCRIPT],
+        stdout=True,
+        stderr=True,
+    )
+    if response.exit_code != 0:
+        raise RuntimeError(f"Unable to read the cgroup of {pod_name}: {response.stderr}")
+    return {
+        key: int(value)
+        for key, value in (line.split() for line in response.stdout.splitlines() if line)
+    }
+
+
+class ResourceSampler:
+    """Sample the resource usage of the pods of a namespace from a background thread.
+
+    The pods of the namespace are sampled through the metrics API and, once it is running,
+    the `container` of the pods selected by `labels` also through its cgroup. A source that
+    is unavailable, e.g. a cluster without metrics-server, is logged once and skipped.
+    Each sample is appended to the JSONL file at `path`, which is emptied when the sampling
+    starts, so each run needs a path of its own. Use it as a context manager to start and
+    stop the sampling.
+    """
+
+    def __init__(
+        self,
+        client: "Client",
+        namespace: str,
+        labels: dict,
+        container: str,
+        path: Path,
+        interval: float,
+    ):
+        self._client = client
+        self._namespace = namespace
+        self._labels = labels
+        self._container = container
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_forever, daemon=True)
+        self._unavailable = set()
+        self.path = path
+        self.samples = []
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text("")
+        log.info(f"Sampling the resources of {self._namespace} every {self._interval}s...")
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        log.info(f"Wrote {len(self.samples)} resource samples to {self.path}")
+
+    def _sample_forever(self):
+        while not self._stop.is_set():
+            now = time.time()
+            samples = self._guarded("metrics", self._sample_metrics, now)
+            samples += self._guarded("cgroup", self._sample_cgroups, now)
+            if samples:
+                with self.path.open("a") as file:
+                    file.writelines(json.dumps(sample) + "\n" for sample in samples)
+                self.samples.extend(samples)
+            self._stop.wait(self._interval)
+
+    def _guarded(self, source: str, sample, now: float) -> list[dict]:
+        """Take samples from a source, logging its first error instead of raising it."""
+        if source in self._unavailable:
+            return []
+        try:
+            return sample(now)
+        except Exception as error:
+            log.warning(f"Resource sampling from {source} is unavailable: {error}")
+            self._unavailable.add(source)
+            return []
+
+    def _sample_metrics(self, now: float) -> list[dict]:
+        from lightkube.utils.quantity import parse_quantity
+
+        samples = []
+        for metrics in self._client.list(pod_metrics_resource(), namespace=self._namespace):
+            for container in metrics["containers"]:
+                samples.append(
+                    {
+                        "time": now,
+                        "source": "metrics",
+                        "pod": metrics.metadata.name,
+                        "container": container["name"],
+                        "cpu_cores": parse_cpu(container["usage"]["cpu"]),
+                        "memory_bytes": int(parse_quantity(container["usage"]["memory"])),
+                    }
+                )
+        return samples
+
+    def _sample_cgroups(self, now: float) -> list[dict]:
+        from lightkube.resources.core_v1 import Pod
+
+        samples = []
+        for pod in self._client.list(Pod, namespace=self._namespace, labels=self._labels):
+            if pod.status.phase != "Running":
+                continue
+            name = pod.metadata.name
+            counters = _read_cgroup(self._client, name, self._namespace, self._container)
+            samples.append(
+                {"time": now, "source": "cgroup", "pod": name, "container": self._container}
+                | counters
+            )
+        return samples
+
+
+def notebook_windows(lines: Iterable[str], end: float) -> dict[str, tuple[float, float]]:
+    """Return the start and end time of each notebook run by the test container.
+
+    The `lines` are the logs of the container with their timestamps (see `fetch_job_logs`).
+    A notebook starts with its `Running <notebook>.ipynb...` log line and ends when the next
+    one starts or, for the last one, at `end`.
+    """
+    starts = []
+    for line in lines:
+        timestamp, _, message = line.partition(" ")
+        if match := NOTEBOOK_START.search(message):
+            starts.append((match.group(1), datetime.fromisoformat(timestamp).timestamp()))
+
+    ends = [start for _, start in starts[1:]] + [end]
+    return {name: (start, stop) for (name, start), stop in zip(starts, ends)}
+
+
+def timed_out_notebooks(lines: Iterable[str]) -> set[str]:
+    """Return the notebooks the test container stopped as they ran out of time.
+
+    A notebook timed out when its time budget or the session deadline ran out, as logged with
+    a `Timed out <notebook>.ipynb after ...` line in the logs of the container.
+    """
+    return {match.group(1) for line in lines if (match := NOTEBOOK_TIMED_OUT.search(line))}
+
+
+def _cgroup_summary(samples: list[dict]) -> Optional[dict]:
+    """Summarise the cgroup counters of a container over consecutive samples.
+
+    The throttling counters are only reported when the CPU controller is enabled.
+    """
+    if len(samples) < 2:
+        return None
+    first, last = samples[0], samples[-1]
+
+    def _delta(key: str) -> int:
+        return last.get(key, 0) - first.get(key, 0)
+
+    periods = _delta("nr_periods")
+    return {
+        "cpu_cores": _delta("usage_usec") / 1e6 / (last["time"] - first["time"]),
+        "throttled_s": _delta("throttled_usec") / 1e6,
+        "throttled_periods_ratio": _delta("nr_throttled") / periods if periods else 0.0,
+        "memory_peak_mib": max(sample["memory_peak"] for sample in samples) / MIB,
+        "oom_kills": _delta("oom_kill"),
+    }
+
+
+def _pod_summaries(samples: list[dict]) -> dict:
+    """Summarise the CPU and memory usage of each pod, summed over its containers."""
+    usage = {}
+    for sample in samples:
+        pod = usage.setdefault(sample["pod"], {})
+        cpu, memory = pod.get(sample["time"], (0.0, 0))
+        pod[sample["time"]] = (cpu + sample["cpu_cores"], memory + sample["memory_bytes"])
+    return {
+        name: {
+            "cpu_cores": summarize([cpu for cpu, _ in pod.values()]),
+            "memory_mib": summarize([memory / MIB for _, memory in pod.values()]),
+        }
+        for name, pod in sorted(usage.items())
+    }
+
+
+def summarize_by_notebook(samples: list[dict], windows: dict[str, tuple[float, float]]) -> dict:
+    """Attribute the samples to the notebooks that were running when they were taken."""
+    summary = {}
+    for notebook, (start, end) in windows.items():
+        selected = [sample for sample in samples if start <= sample["time"] < end]
+        cgroups = {}
+        for sample in selected:
+            if sample["source"] == "cgroup":
+                cgroups.setdefault(sample["pod"], []).append(sample)
+        summary[notebook] = {
+            "duration_s": end - start,
+            "pods": _pod_summaries([s for s in selected if s["source"] == "metrics"]),
+            "cgroups": {pod: _cgroup_summary(pod_samples) for pod, pod_samples in cgroups.items()},
+        }
+    return summary
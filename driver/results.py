@@ -0,0 +1,65 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Helpers to summarise measurements and persist them as machine-readable results."""
+
+import json
+import logging
+import math
+import statistics
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of the samples using linear interpolation."""
+    if not samples:
+        return math.nan
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Return the count, mean, min, max and p50/p90/p99 of the given samples."""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples),
+        "min": min(samples),
+        "p50": percentile(samples, 50),
+        "p90": percentile(samples, 90),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def format_table(headers: list[str], rows: list[list]) -> str:
+    """Format the rows as a plain-text table, suitable for logging."""
+
+    def _cell(value) -> str:
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    cells = [[_cell(value) for value in row] for row in rows]
+    widths = [max(len(str(col)) for col in column) for column in zip(headers, *cells)]
+    lines = [
+        " | ".join(str(header).rjust(width) for header, width in zip(headers, widths)),
+        "-+-".join("-" * width for width in widths),
+    ]
+    lines.extend(
+        " | ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in cells
+    )
+    return "\n".join(lines)
+
+
+def write_results(results_dir: Path, name: str, data: dict) -> Path:
+    """Write the results as `<name>.json` in the results directory and return its path."""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    path = results_dir / f"{name}.json"
+    path.write_text(json.dumps(data, indent=2, sort_keys=True))
+    log.info(f"Results written to {path}")
+    return path
@@ -0,0 +1,182 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Retry the waiters of the driver with named policies, a session deadline and telemetry.
+
+Every waiter, i.e. a function polling the cluster until it reaches a state, is decorated
+with `retrying` and the name of one of the `PROFILES`, instead of its own tenacity settings.
+The profiles wait with full jitter: each wait is drawn uniformly between the minimum wait
+and an exponentially growing bound, so that waiters backing off together, e.g. in parallel
+tests, spread their calls to the API server instead of polling it in lockstep.
+
+All the waiters share the deadline of the session, if one is set with `set_deadline`: once
+it passed, they stop retrying, and they never sleep past it.
+
+For each waiter, the calls, attempts, time spent sleeping and Kubernetes API requests are
+counted, and `summary` returns them for the session report. The requests are counted by the
+clients of `utils.kube_client`, hooked with `count_api_calls`.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import tenacity
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryProfile:
+    """Exponential backoff with full jitter, stopping after a number of attempts or a timeout."""
+
+    min_wait: float
+    max_wait: float
+    attempts: Optional[int] = None
+    timeout: Optional[float] = None
+    multiplier: float = 2
+
+
+# With full jitter, a wait averages about half of the exponential one, so the profiles once
+# bounded by a number of attempts are bounded by the time their attempts waited instead, i.e.
+# the sum of the 2, 4, 8 then 10s waits between them.
+PROFILES = {
+    # a resource created by a controller, e.g. the namespace or service accounts of a Profile:
+    # the 274s of 30 attempts
+    "resource": RetryProfile(min_wait=1, max_wait=10, timeout=274),
+    # a resource synced to a namespace after it is created, e.g. a PodDefault: the 124s of 15
+    # attempts
+    "sync": RetryProfile(min_wait=1, max_wait=10, timeout=124),
+    # the 74s of 10 attempts
+    "deletion": RetryProfile(min_wait=1, max_wait=10, timeout=74),
+    # the 274s of 30 attempts
+    "cascade_deletion": RetryProfile(min_wait=1, max_wait=10, timeout=274),
+    # the 574s of 60 attempts
+    "pod_start": RetryProfile(min_wait=1, max_wait=10, timeout=574),
+    "job": RetryProfile(min_wait=1, max_wait=32, timeout=60 * 60),
+    "inference_service": RetryProfile(min_wait=5, max_wait=60, timeout=60 * 10),
+}
+
+_current = contextvars.ContextVar("current_waiter", default=None)
+_lock = threading.Lock()
+_stats = {}
+_deadline = None
+
+
+def set_deadline(deadline: Optional[float]) -> None:
+    """Set the time, in seconds since the epoch, after which no waiter retries anymore."""
+    global _deadline
+    _deadline = deadline
+
+
+def time_left(timeout: float) -> float:
+    """Return the least of a timeout and the time left before the session deadline, if any."""
+    if _deadline is None:
+        return timeout
+    return min(timeout, _deadline - time.time())
+
+
+def _add(stats: Optional[dict], key: str, value: float) -> None:
+    if stats is not None:
+        with _lock:
+            stats[key] += value
+
+
+def _count_api_call(*_) -> None:
+    """Count a Kubernetes API request towards the current waiter, if any."""
+    _add(_current.get(), "api_calls", 1)
+
+
+def count_api_calls(client) -> None:
+    """Count the requests of a Lightkube client towards the waiters making them.
+
+    The requests are hooked on the httpx client wrapped by the Lightkube one, which is private:
+    if it cannot be found, e.g. after a Lightkube upgrade, the requests are not counted.
+    """
+    httpx_client = getattr(getattr(client, "_client", None), "_client", None)
+    event_hooks = getattr(httpx_client, "event_hooks", None)
+    if not isinstance(event_hooks, dict):
+        log.warning("Unable to hook on the requests of the Lightkube client, not counting them")
+        return
+    event_hooks.setdefault("request", []).append(_count_api_call)
+
+
+def _sleep(seconds: float) -> None:
+    _add(_current.get(), "sleep_s", seconds)
+    time.sleep(seconds)
+
+
+def _stop_at_deadline(retry_state: tenacity.RetryCallState) -> bool:
+    return _deadline is not None and time.time() >= _deadline
+
+
+def _policy(profile: RetryProfile) -> dict:
+    """Return the tenacity wait and stop of a profile, bounded by the session deadline."""
+    jitter = tenacity.wait_random_exponential(
+        multiplier=profile.multiplier, min=profile.min_wait, max=profile.max_wait
+    )
+
+    def _wait(retry_state: tenacity.RetryCallState) -> float:
+        wait = jitter(retry_state)
+        if _deadline is not None:
+            wait = max(min(wait, _deadline - time.time()), 0)
+        return wait
+
+    stop = tenacity.stop_any(_stop_at_deadline)
+    if profile.attempts:
+        stop |= tenacity.stop_after_attempt(profile.attempts)
+    if profile.timeout:
+        stop |= tenacity.stop_after_delay(profile.timeout)
+    return {"wait": _wait, "stop": stop}
+
+
+def retrying(profile: str, **kwargs) -> Callable:
+    """Decorate a waiter to retry it with the named profile, and count its activity.
+
+    Other arguments, e.g. `retry` or `before_sleep`, are passed on to `tenacity.retry`. As
+    with `reraise=True`, the last exception is raised once the waiter stops retrying.
+    """
+    policy = _policy(PROFILES[profile])
+
+    def _decorator(func: Callable) -> Callable:
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def _attempt(*args, **kwargs):
+            _add(_current.get(), "attempts", 1)
+            return func(*args, **kwargs)
+
+        retried = tenacity.retry(sleep=_sleep, reraise=True, **policy, **kwargs)(_attempt)
+
+        @functools.wraps(func)
+        def _waiter(*args, **kwargs):
+            with _lock:
+                stats = _stats.setdefault(
+                    name,
+                    {"profile": profile, "calls": 0, "attempts": 0, "sleep_s": 0.0}
+                    | {"api_calls": 0, "gave_up": 0, "duration_s": 0.0},
+                )
+                stats["calls"] += 1
+            token, start = _current.set(stats), time.time()
+            try:
+                return retried(*args, **kwargs)
+            except Exception:
+                _add(stats, "gave_up", 1)
+                raise
+            finally:
+                _current.reset(token)
+                _add(stats, "duration_s", time.time() - start)
+
+        return _waiter
+
+    return _decorator
+
+
+def summary() -> dict:
+    """Return the counters of each waiter called during the session."""
+    with _lock:
+        return {name: dict(stats) for name, stats in sorted(_stats.items())}
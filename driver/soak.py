@@ -0,0 +1,115 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Aggregate the iterations of a soak run, i.e. of the tests repeated with `--repeat`.
+
+Each iteration of a repeated test is recorded with its outcome and duration, along with a
+snapshot of the CPU and memory usage of the watched namespaces, taken from the metrics API
+once the iteration is over. The report gives, for each test, its pass rate, the percentiles
+of its duration and the growth of the resource usage over the iterations, e.g. to spot the
+leaks that only show after hours in a long-running cluster.
+"""
+
+import logging
+import statistics
+import time
+from typing import TYPE_CHECKING, Optional
+
+from resources import MIB, parse_cpu, pod_metrics_resource
+from results import summarize
+from utils import kube_client
+
+if TYPE_CHECKING:
+    from lightkube import Client
+
+log = logging.getLogger(__name__)
+
+SOAK_PARAM = "soak_iteration"
+
+
+def namespace_usage(client: "Client", namespace: str) -> dict:
+    """Return the CPU (cores) and memory (MiB) used by all the pods of a namespace."""
+    from lightkube.utils.quantity import parse_quantity
+
+    cpu, memory = 0.0, 0
+    for metrics in client.list(pod_metrics_resource(), namespace=namespace):
+        for container in metrics["containers"]:
+            cpu += parse_cpu(container["usage"]["cpu"])
+            memory += int(parse_quantity(container["usage"]["memory"]))
+    return {"cpu_cores": cpu, "memory_mib": memory / MIB}
+
+
+def _growth(values: list[float]) -> Optional[dict]:
+    """Return the growth of the values over the iterations, overall and per iteration."""
+    if len(values) < 2:
+        return None
+    slope, _ = statistics.linear_regression(range(len(values)), values)
+    return {"first": values[0], "last": values[-1], "per_iteration": slope}
+
+
+class SoakReport:
+    """Record the iterations of the repeated tests and the resource usage after each of them.
+
+    Resource snapshots are taken through the metrics API; if it is unavailable, e.g. without
+    metrics-server, the iterations are still recorded, without them.
+    """
+
+    def __init__(self, namespaces: list[str]):
+        self._namespaces = namespaces
+        self._client = None
+        self._metrics_available = True
+        self.started = time.time()
+        self.iterations = {}
+
+    def _snapshot(self) -> dict:
+        if not self._metrics_available:
+            return {}
+        try:
+            self._client = self._client or kube_client()
+            return {
+                namespace: namespace_usage(self._client, namespace)
+                for namespace in self._namespaces
+            }
+        except Exception as error:
+            log.warning(f"Unable to take a resource snapshot from the metrics API: {error}")
+            self._metrics_available = False
+            return {}
+
+    def record(self, test: str, iteration: int, outcome: str, duration: float) -> None:
+        """Record an iteration of a test, with a snapshot of the current resource usage."""
+        self.iterations.setdefault(test, []).append(
+            {
+                "iteration": iteration,
+                "elapsed_s": time.time() - self.started,
+                "outcome": outcome,
+                "duration_s": duration,
+                "resources": self._snapshot() if outcome != "skipped" else {},
+            }
+        )
+
+    def summary(self) -> dict:
+        """Return the pass rate, duration percentiles and resource growth of each test."""
+        tests = {}
+        for test, iterations in self.iterations.items():
+            run = [it for it in iterations if it["outcome"] != "skipped"]
+            growth = {
+                namespace: {
+                    key: _growth([it["resources"][namespace][key] for it in run])
+                    for key in ("cpu_cores", "memory_mib")
+                }
+                for namespace in self._namespaces
+                if run and all(namespace in it["resources"] for it in run)
+            }
+            tests[test] = {
+                "iterations": len(run),
+                "pass_rate": (
+                    sum(it["outcome"] == "passed" for it in run) / len(run) if run else None
+                ),
+                "duration_s": summarize([it["duration_s"] for it in run]),
+                "resource_growth": growth,
+            }
+        return {
+            "duration_s": time.time() - self.started,
+            "tests": tests,
+            "iterations": self.iterations,
+        }
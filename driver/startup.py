@@ -0,0 +1,157 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Measure how quickly a driver session starts when it does not need a cluster.
+
+Two sessions are timed, each in a fresh interpreter and several times, with the `LOCAL`
+environment variable unset:
+
+* `collect`: collecting all the driver tests with `--collect-only`
+* `skipped`: running the ambient, M2M and performance suites, skipped without their
+  `--include-*` flags
+
+Each session is then run once more with `python -X importtime`, to check that none of the
+`LAZY_MODULES`, only imported by the fixtures and helpers using them, was imported and to
+list the slowest imports. The results are logged and written to `startup.json`.
+
+Run it from the root of the repository with `tox -e driver-startup`.
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from results import format_table, write_results
+
+log = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# Modules the sessions above must not import, since no test is run.
+LAZY_MODULES = (
+    "jubilant",
+    "requests",
+    "requests_oauthlib",
+    "oauthlib",
+    "lightkube",
+    "httpx",
+    "yaml",
+    "sqlite3",
+)
+
+SESSIONS = {
+    "collect": ["driver", "--collect-only", "-q"],
+    "skipped": ["driver/ambient", "driver/m2m", "driver/perf", "-q"],
+}
+
+
+def _run_session(args: list[str], results_dir: str, importtime: bool = False) -> tuple:
+    """Run a pytest session in a fresh interpreter, and return its duration and stderr."""
+    options = ["-X", "importtime"] if importtime else []
+    # the conftest imports are only written to stderr when it is not captured
+    args = [*args, "-s"] if importtime else args
+    env = {name: value for name, value in os.environ.items() if name != "LOCAL"}
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *options, "-m", "pytest", *args, "--bundle=", "-p", "no:cacheprovider"]
+        + ["--results-dir", results_dir],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    duration = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError(f"pytest {' '.join(args)} failed:\n{process.stdout}{process.stderr}")
+    return duration, process.stderr
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, float]]:
+    """Return the name, depth and cumulative seconds of each import of `-X importtime`."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("| imported package"):
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative) / 1e6))
+    return imports
+
+
+def measure(name: str, args: list[str], runs: int, results_dir: str) -> dict:
+    """Time a session and check which modules it imported."""
+    durations = [_run_session(args, results_dir)[0] for _ in range(runs)]
+    _, stderr = _run_session(args, results_dir, importtime=True)
+    imports = parse_importtime(stderr)
+    top_level = sorted(
+        (entry for entry in imports if entry[1] == 0), key=lambda entry: entry[2], reverse=True
+    )
+    lazy = sorted(
+        {
+            module
+            for module in LAZY_MODULES
+            for imported, _, _ in imports
+            if imported == module or imported.startswith(f"{module}.")
+        }
+    )
+    return {
+        "session": name,
+        "args": args,
+        "runs": runs,
+        "median_s": statistics.median(durations),
+        "min_s": min(durations),
+        "max_s": max(durations),
+        "slowest_imports_s": {module: cumulative for module, _, cumulative in top_level[:10]},
+        "lazy_modules_imported": lazy,
+    }
+
+
+def main(argv: list[str] = None) -> int:
+    """Measure the sessions and return 1 if one imported a lazy module or exceeded the budget."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of timed runs per session")
+    parser.add_argument("--results-dir", default="results", help="Where to write startup.json")
+    parser.add_argument(
+        "--budget", type=float, help="Fail when the median start of a session exceeds it, in s"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with tempfile.TemporaryDirectory() as session_results_dir:
+        results = [
+            measure(name, session_args, args.runs, session_results_dir)
+            for name, session_args in SESSIONS.items()
+        ]
+
+    log.info(
+        "Start of the driver sessions (s):\n"
+        + format_table(
+            ["session", "median", "min", "max", "lazy modules imported"],
+            [
+                [r["session"], r["median_s"], r["min_s"], r["max_s"]]
+                + [", ".join(r["lazy_modules_imported"]) or "-"]
+                for r in results
+            ],
+        )
+    )
+    for result in results:
+        slowest = ", ".join(f"{m} {s:.3f}" for m, s in result["slowest_imports_s"].items())
+        log.info(f"Slowest imports of the {result['session']} session (s): {slowest}")
+    write_results(Path(args.results_dir), "startup", {"sessions": results})
+
+    failed = [r["session"] for r in results if r["lazy_modules_imported"]]
+    if args.budget:
+        failed += [r["session"] for r in results if r["median_s"] > args.budget]
+    if failed:
+        log.error(f"Sessions importing lazy modules or over budget: {sorted(set(failed))}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,24 +11,28 @@ import time
 from functools import reduce
 from pathlib import Path
 
-import jubilant
 import pytest
-import requests
-import yaml
-from lightkube import ApiError, Client, codecs
-from lightkube.generic_resource import (
-    create_global_resource,
-    create_namespaced_resource,
-    load_in_cluster_generic_resources,
+import retries
+import tracing
+from resources import (
+    ResourceSampler,
+    notebook_windows,
+    summarize_by_notebook,
+    timed_out_notebooks,
 )
-from lightkube.types import CascadeType
+from results import format_table, write_results
+from soak import SOAK_PARAM
 from utils import (
     assert_namespace_active,
     assert_poddefault_created_in_namespace,
     assert_profile_deleted,
     context_from,
     create_poddefault,
+    delete_job,
     fetch_job_logs,
+    kube_client,
+    poddefault_resource,
+    profile_resource,
     wait_for_job,
 )
 
@@ -40,35 +44,20 @@ JOB_TEMPLATE_FILE = ASSETS_DIR / "test-job.yaml.j2"
 PROFILE_TEMPLATE_FILE = ASSETS_DIR / "test-profile.yaml.j2"
 RUNTIMECLASS_TEMPLATE_FILE = ASSETS_DIR / "runtimeclass.yaml.j2"
 
-TESTS_LOCAL_RUN = eval(os.environ.get("LOCAL"))
 TESTS_LOCAL_DIR = os.path.abspath(Path("tests"))
 TESTS_IMAGE = "charmedkubeflow/jupyter-scipy:1.10.0-fafb9e8"
 
 NAMESPACE = "test-kubeflow"
-PROFILE_RESOURCE = create_global_resource(
-    group="kubeflow.org",
-    version="v1",
-    kind="profile",
-    plural="profiles",
-)
-RUNTIMECLASS_RESOURCE = create_global_resource(
-    group="node.k8s.io",
-    version="v1",
-    kind="runtimeclass",
-    plural="runtimeclasses",
-)
 
 JOB_NAME = "test-kubeflow"
+# The benchmark notebooks run in a Job of their own, with its own deadline, after the UATs.
+BENCHMARK_JOB_NAME = "test-kubeflow-benchmark"
 JOB_RUNTIMECLASS_NAME = "uats"
 
 PYTEST_CMD_BASE = "python3 -m pytest"
+# Time left by the notebook tests to start the Job pod and to collect the logs of the Job
+JOB_DEADLINE_MARGIN_S = 5 * 60
 
-PODDEFAULT_RESOURCE = create_namespaced_resource(
-    group="kubeflow.org",
-    version="v1alpha1",
-    kind="poddefault",
-    plural="poddefaults",
-)
 PODDEFAULT_WITH_PROXY_PATH = Path("tests") / "proxy-poddefault.yaml.j2"
 PODDEFAULT_WITH_TOLERATION_PATH = Path("assets") / "gpu-toleration-poddefault.yaml.j2"
 PODDEFAULT_WITH_SECURITY_POLICY_PATH = Path("tests") / "security-policy-poddefault.yaml.j2"
@@ -79,6 +68,8 @@ KFP_PODDEFAULT_NAME = "access-ml-pipeline"
 @pytest.fixture(scope="module")
 def juju(request: pytest.FixtureRequest):
     """Create a temporary or use an existing Juju model for running tests."""
+    import jubilant
+
     keep_models = bool(request.config.getoption("--keep-models"))
     juju_model = request.config.getoption("--model")
 
@@ -99,6 +90,9 @@ def juju(request: pytest.FixtureRequest):
 
 @pytest.fixture(scope="module")
 def charm_list(request):
+    import requests
+    import yaml
+
     url = request.config.getoption("--bundle")
 
     if not url:
@@ -129,6 +123,15 @@ def charm_list(request):
     }
 
 
+@pytest.fixture(scope="module")
+def tests_local_run():
+    """Retrieve from the `LOCAL` environment variable whether the tests run from this checkout."""
+    local = os.environ.get("LOCAL")
+    if local is None:
+        pytest.fail("LOCAL is not set, run the tests with tox or set it to True or False")
+    return local.strip().lower() in ("true", "1")
+
+
 @pytest.fixture(scope="module")
 def tests_image(request):
     return request.config.getoption("--test-image")
@@ -164,6 +167,18 @@ def include_kubeflow_trainer_tests(request):
     return True if request.config.getoption("--include-kubeflow-trainer-tests") else False
 
 
+@pytest.fixture(scope="module")
+def include_perf_tests(request):
+    """Retrieve the `--include-perf-tests` flag from Pytest invocation."""
+    return True if request.config.getoption("--include-perf-tests") else False
+
+
+@pytest.fixture(scope="module")
+def resource_sample_interval(request):
+    """Retrieve the `--resource-sample-interval` option from Pytest invocation."""
+    return request.config.getoption("--resource-sample-interval")
+
+
 @pytest.fixture(scope="module")
 def tests_checked_out_commit(request):
     """Retrieve active git commit."""
@@ -172,7 +187,9 @@ def tests_checked_out_commit(request):
 
 
 @pytest.fixture(scope="module")
-def pytest_cmd(pytest_filter, include_gpu_tests, include_kubeflow_trainer_tests):
+def pytest_cmd(
+    pytest_filter, include_gpu_tests, include_kubeflow_trainer_tests, include_perf_tests
+):
     """Format the Pytest command."""
     cmd = PYTEST_CMD_BASE
     if pytest_filter:
@@ -181,13 +198,24 @@ def pytest_cmd(pytest_filter, include_gpu_tests, include_kubeflow_trainer_tests)
         cmd += " --include-gpu-tests"
     if include_kubeflow_trainer_tests:
         cmd += " --include-kubeflow-trainer-tests"
+    if include_perf_tests:
+        # the filter applies to both Jobs, and may only select notebooks of one of them
+        cmd += " --allow-no-notebooks"
     return cmd
 
 
+@pytest.fixture(scope="module")
+def benchmark_pytest_cmd(pytest_cmd):
+    """Format the Pytest command of the benchmark notebooks."""
+    return f"{pytest_cmd} --benchmark-tests-only"
+
+
 @pytest.fixture(scope="module")
 def lightkube_client():
     """Initialise Lightkube Client."""
-    lightkube_client = Client(trust_env=False)
+    from lightkube.generic_resource import load_in_cluster_generic_resources
+
+    lightkube_client = kube_client()
     load_in_cluster_generic_resources(lightkube_client)
     return lightkube_client
 
@@ -195,6 +223,9 @@ def lightkube_client():
 @pytest.fixture(scope="module")
 def create_profile(lightkube_client):
     """Create Profile and handle cleanup at the end of the module tests."""
+    from lightkube import codecs
+    from lightkube.types import CascadeType
+
     log.info(f"Creating Profile {NAMESPACE}...")
     resources = list(
         codecs.load_all_yaml(
@@ -209,7 +240,7 @@ def create_profile(lightkube_client):
 
     # delete the Profile at the end of the module tests
     log.info(f"Deleting Profile {NAMESPACE}...")
-    lightkube_client.delete(PROFILE_RESOURCE, name=NAMESPACE, cascade=CascadeType.FOREGROUND)
+    lightkube_client.delete(profile_resource(), name=NAMESPACE, cascade=CascadeType.FOREGROUND)
     assert_profile_deleted(lightkube_client, NAMESPACE, log)
 
 
@@ -264,6 +295,70 @@ def istio_mode(include_ambient):
     return "sidecar"
 
 
+def _resources_name(request, job_name: str) -> str:
+    """Return the name of the resource usage results of a Job.
+
+    In soak runs, each iteration writes results of its own, suffixed with its iteration.
+    """
+    if SOAK_PARAM in request.fixturenames:
+        return f"{job_name}-resources-soak-{request.getfixturevalue(SOAK_PARAM)}"
+    return f"{job_name}-resources"
+
+
+def _job_resource_sampler(lightkube_client, job_name: str, interval: float, path: Path):
+    """Return a sampler of the test namespace resources while the Job runs, if enabled."""
+    if not interval:
+        return contextlib.nullcontext()
+    return ResourceSampler(
+        lightkube_client,
+        NAMESPACE,
+        labels={"job-name": job_name},
+        container=job_name,
+        path=path,
+        interval=interval,
+    )
+
+
+def _notebook_windows(lines: list[str]) -> dict[str, tuple[float, float]]:
+    """Return the start and end time of each notebook run by the Job, based on its logs."""
+    try:
+        return notebook_windows(lines, time.time())
+    except ValueError as error:
+        log.warning(f"Unable to find when the notebooks ran from the Job logs: {error!r}")
+        return {}
+
+
+def _write_resource_summary(
+    job_name: str, samples: list[dict], windows: dict, results_dir: Path, name: str
+):
+    """Attribute the resource samples to the notebooks and write them as the `name` results."""
+    summary = summarize_by_notebook(samples, windows)
+    rows = []
+    for notebook, usage in summary.items():
+        cgroup = next((c for c in usage["cgroups"].values() if c), {})
+        rows.append(
+            [
+                notebook,
+                usage["duration_s"],
+                cgroup.get("cpu_cores"),
+                cgroup.get("throttled_s"),
+                cgroup.get("memory_peak_mib"),
+            ]
+        )
+    log.info(
+        f"Resource usage of the {job_name} container per notebook:\n"
+        + format_table(["notebook", "duration s", "cpu", "throttled s", "memory peak MiB"], rows)
+    )
+    write_results(results_dir, name, summary)
+
+
+def _collect_notebook_spans(lines: list[str]):
+    """Add the spans logged by the notebook tests to the trace of the session."""
+    spans = tracing.spans_from_log(lines)
+    log.info(f"Collected {len(spans)} spans from the notebook tests")
+    tracing.add_spans(spans)
+
+
 @pytest.mark.abort_on_fail
 @pytest.mark.dependency()
 def test_bundle_correctness(juju, charm_list):
@@ -278,6 +373,8 @@ def test_bundle_correctness(juju, charm_list):
     if not charm_list:
         pytest.skip("charm_list empty. Cannot test bundle correctness")
 
+    import jubilant
+
     status = juju.status()
 
     # Check that the version is the one expected by this set of tests
@@ -304,9 +401,11 @@ def test_create_profile(lightkube_client, create_profile):
     This test relies on the create_profile fixture, which handles the Profile creation and
     is responsible for cleaning up at the end.
     """
+    from lightkube import ApiError
+
     try:
         profile_created = lightkube_client.get(
-            PROFILE_RESOURCE,
+            profile_resource(),
             name=NAMESPACE,
         )
     except ApiError as e:
@@ -330,77 +429,163 @@ def test_create_profile(lightkube_client, create_profile):
     time.sleep(sleep_time_seconds)
 
     # Get PodDefaults in the test namespace
-    created_poddefaults_list = lightkube_client.list(PODDEFAULT_RESOURCE, namespace=NAMESPACE)
+    created_poddefaults_list = lightkube_client.list(poddefault_resource(), namespace=NAMESPACE)
     created_poddefaults_names = [pd.metadata.name for pd in created_poddefaults_list]
 
     # Print the names of PodDefaults in the test namespace
     log.info(f"PodDefaults in {NAMESPACE} namespace are {created_poddefaults_names}.")
 
 
-@pytest.mark.dependency(depends=["test_create_profile"])
-def test_kubeflow_workloads(
+def _create_job(lightkube_client, job_name: str, pytest_cmd: str, context: dict):
+    """Create a Job running the notebook tests with `pytest_cmd`, within the time left."""
+    from lightkube import codecs
+
+    # Stop the notebooks before the wait for the Job, or the session, runs out of time
+    deadline = retries.time_left(retries.PROFILES["job"].timeout) - JOB_DEADLINE_MARGIN_S
+    pytest_cmd += f" --session-deadline {max(deadline, 1):.0f}"
+    log.info(f"Starting Kubernetes Job {NAMESPACE}/{job_name} to run notebook tests...")
+    resources = list(
+        codecs.load_all_yaml(
+            JOB_TEMPLATE_FILE.read_text(),
+            context=context | {"job_name": job_name, "pytest_cmd": pytest_cmd},
+        )
+    )
+    assert len(resources) == 1, f"Expected 1 Job, got {len(resources)}!"
+    lightkube_client.create(resources[0], namespace=NAMESPACE)
+
+
+def _record_job_results(
+    lines: list[str],
+    job_name: str,
+    job_succeeded: bool,
+    samples: list[dict] | None,
+    results_dir: Path,
+    resources_name: str,
+    results_store,
+):
+    """Record the duration and outcome of the notebooks run by a Job, and their resources.
+
+    They are found in the logs of the Job, fetched once with their timestamps. The durations
+    are only recorded when the results store is enabled.
+    """
+    windows = _notebook_windows(lines)
+    if results_store is not None:
+        timed_out = timed_out_notebooks(lines)
+        # The outcome of each notebook is only known when they all passed, or one timed out
+        outcome = "passed" if job_succeeded else "unknown"
+        for notebook, (start, end) in windows.items():
+            notebook_outcome = "timed out" if notebook in timed_out else outcome
+            results_store.record("notebook", notebook, end - start, notebook_outcome)
+    if samples is not None:
+        _write_resource_summary(job_name, samples, windows, results_dir, resources_name)
+    if tracing.enabled():
+        _collect_notebook_spans(lines)
+
+
+@pytest.fixture(scope="function")
+def run_notebook_job(
     juju,
     k8s_default_runtimeclass_handler,
     lightkube_client,
-    pytest_cmd,
     tests_checked_out_commit,
     tests_image,
+    tests_local_run,
     request,
     create_poddefault_on_proxy,
     create_poddefault_on_toleration,
     create_poddefault_on_security_policy,
     istio_mode: str,
+    resource_sample_interval,
+    results_dir,
+    results_store,
+    charm_list,
 ):
-    """Run a K8s Job to execute the notebook tests."""
-    if TESTS_LOCAL_RUN:
-        log.info("Creating the RuntimeClass for exemption from Pod Security Standards...")
-        resources = list(
-            codecs.load_all_yaml(
-                RUNTIMECLASS_TEMPLATE_FILE.read_text(),
-                context={
-                    "runtimeclass_handler": k8s_default_runtimeclass_handler,
-                    "runtimeclass_name": JOB_RUNTIMECLASS_NAME,
-                },
+    """Return a function running notebook tests in a K8s Job and collecting their results."""
+    from lightkube import codecs
+    from lightkube.resources.node_v1 import RuntimeClass
+
+    context = {
+        "tests_local_run": tests_local_run,
+        "tests_local_dir": TESTS_LOCAL_DIR,
+        "tests_image": tests_image,
+        "tests_remote_commit": tests_checked_out_commit,
+        "proxy": True if request.config.getoption("proxy") else False,
+        "security_policy": request.config.getoption("security_policy") != "privileged",
+        "kubeflow_namespace": juju.model,
+        "user_namespace": NAMESPACE,
+        "istio_mode": istio_mode,
+        "traceparent": tracing.traceparent(),
+    }
+
+    def _run(job_name: str, pytest_cmd: str):
+        if tests_local_run:
+            log.info("Creating the RuntimeClass for exemption from Pod Security Standards...")
+            resources = list(
+                codecs.load_all_yaml(
+                    RUNTIMECLASS_TEMPLATE_FILE.read_text(),
+                    context={
+                        "runtimeclass_handler": k8s_default_runtimeclass_handler,
+                        "runtimeclass_name": JOB_RUNTIMECLASS_NAME,
+                    },
+                )
             )
-        )
-        assert len(resources) == 1, f"Expected 1 RuntimeClass, got {len(resources)}!"
-        lightkube_client.create(resources[0])
+            assert len(resources) == 1, f"Expected 1 RuntimeClass, got {len(resources)}!"
+            lightkube_client.create(resources[0])
 
-    log.info(f"Starting Kubernetes Job {NAMESPACE}/{JOB_NAME} to run notebook tests...")
-    log.info(f"Istio Mode: {istio_mode}")
-    resources = list(
-        codecs.load_all_yaml(
-            JOB_TEMPLATE_FILE.read_text(),
-            context={
-                "job_name": JOB_NAME,
-                "tests_local_run": TESTS_LOCAL_RUN,
-                "tests_local_dir": TESTS_LOCAL_DIR,
-                "tests_image": tests_image,
-                "tests_remote_commit": tests_checked_out_commit,
-                "pytest_cmd": pytest_cmd,
-                "proxy": True if request.config.getoption("proxy") else False,
-                "security_policy": request.config.getoption("security_policy") != "privileged",
-                "kubeflow_namespace": juju.model,
-                "user_namespace": NAMESPACE,
-                "istio_mode": istio_mode,
-            },
+        log.info(f"Istio Mode: {istio_mode}")
+        _create_job(lightkube_client, job_name, pytest_cmd, context)
+
+        if results_store is not None:
+            results_store.set_channels(charm_list)
+        resources_name = _resources_name(request, job_name)
+        sampler = _job_resource_sampler(
+            lightkube_client,
+            job_name,
+            resource_sample_interval,
+            results_dir / f"{resources_name}.jsonl",
         )
-    )
+        job_succeeded = False
+        try:
+            with sampler:
+                job_succeeded = wait_for_job(lightkube_client, job_name, NAMESPACE)
+        except ValueError:
+            pytest.fail(
+                f"Something went wrong while running Job {NAMESPACE}/{job_name}. Please inspect"
+                " the attached logs for more info..."
+            )
+        finally:
+            log.info("Fetching Job logs...")
+            lines = fetch_job_logs(lightkube_client, job_name, NAMESPACE, tests_local_run)
+            samples = sampler.samples if resource_sample_interval else None
+            _record_job_results(
+                lines,
+                job_name,
+                job_succeeded,
+                samples,
+                results_dir,
+                resources_name,
+                results_store,
+            )
 
-    assert len(resources) == 1, f"Expected 1 Job, got {len(resources)}!"
-    lightkube_client.create(resources[0], namespace=NAMESPACE)
+            # In soak runs, the Job is created again by the next iteration
+            if SOAK_PARAM in request.fixturenames:
+                delete_job(lightkube_client, job_name, NAMESPACE)
 
-    try:
-        wait_for_job(lightkube_client, JOB_NAME, NAMESPACE)
-    except ValueError:
-        pytest.fail(
-            f"Something went wrong while running Job {NAMESPACE}/{JOB_NAME}. Please inspect the"
-            " attached logs for more info..."
-        )
-    finally:
-        log.info("Fetching Job logs...")
-        fetch_job_logs(JOB_NAME, NAMESPACE, TESTS_LOCAL_RUN)
+            if tests_local_run:
+                log.info("Deleting the RuntimeClass for the Job...")
+                lightkube_client.delete(RuntimeClass, name=JOB_RUNTIMECLASS_NAME)
+
+    return _run
 
-        if TESTS_LOCAL_RUN:
-            log.info("Deleting the RuntimeClass for the Job...")
-            lightkube_client.delete(RUNTIMECLASS_RESOURCE, name=JOB_RUNTIMECLASS_NAME)
+
+@pytest.mark.dependency(depends=["test_create_profile"])
+def test_kubeflow_workloads(run_notebook_job, pytest_cmd):
+    """Run a K8s Job to execute the notebook tests."""
+    run_notebook_job(JOB_NAME, pytest_cmd)
+
+
+@pytest.mark.perf
+@pytest.mark.dependency(depends=["test_create_profile"])
+def test_kubeflow_benchmarks(run_notebook_job, benchmark_pytest_cmd):
+    """Run a K8s Job to execute the benchmark notebooks, after the notebook tests."""
+    run_notebook_job(BENCHMARK_JOB_NAME, benchmark_pytest_cmd)
@@ -0,0 +1,275 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Record the Kubernetes Events and pod transitions of a session, and attribute its time.
+
+`TimelineRecorder` watches the Events and pods of a set of namespaces and appends them, as
+they are observed, to a compact JSON-lines timeline. `render_timeline` reads it back and
+attributes wall-clock time to the phases that usually explain a slow run:
+
+* scheduling: from the creation of a pod until it is scheduled on a node
+* image_pull: from a `Pulling` event of a pod until the matching `Pulled` event
+* webhook: from the first creation rejected by an admission webhook, as reported by the
+  `FailedCreate` events of a controller, until its next `SuccessfulCreate`
+* reconcile: from the first to the last Event emitted for a resource other than a pod,
+  e.g. a Profile, a Job or an InferenceService, as an approximation of the time its
+  controllers took to reconcile it
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from utils import BackgroundWatch
+
+if TYPE_CHECKING:
+    from lightkube import Client
+    from lightkube.resources.core_v1 import Event, Pod
+
+log = logging.getLogger(__name__)
+
+# Event messages are truncated to keep the timeline compact.
+MESSAGE_LENGTH = 200
+CATEGORIES = ("scheduling", "image_pull", "webhook", "reconcile")
+
+
+def _isoformat(timestamp) -> str | None:
+    return timestamp.isoformat() if timestamp else None
+
+
+def _event_entry(event: "Event") -> dict:
+    """Return the timeline entry of an Event."""
+    involved = event.involvedObject
+    source = event.reportingComponent or (event.source.component if event.source else None)
+    return {
+        "type": "event",
+        "namespace": event.metadata.namespace,
+        "time": _isoformat(
+            event.lastTimestamp or event.eventTime or event.metadata.creationTimestamp
+        ),
+        "first_time": _isoformat(event.firstTimestamp),
+        "count": event.count,
+        "event_type": event.type,
+        "reason": event.reason,
+        "kind": involved.kind,
+        "name": involved.name,
+        "source": source,
+        "message": (event.message or "")[:MESSAGE_LENGTH],
+    }
+
+
+def _pod_entry(event_type: str, pod: "Pod") -> dict:
+    """Return the timeline entry of a pod, with the transition time of its conditions."""
+    conditions = (pod.status.conditions if pod.status else None) or []
+    return {
+        "type": "pod",
+        "namespace": pod.metadata.namespace,
+        "name": pod.metadata.name,
+        "created": _isoformat(pod.metadata.creationTimestamp),
+        "phase": "Deleted" if event_type == "DELETED" else (pod.status and pod.status.phase),
+        "conditions": {
+            condition.type: [condition.status, _isoformat(condition.lastTransitionTime)]
+            for condition in conditions
+        },
+    }
+
+
+class TimelineRecorder:
+    """Record the Events and pod transitions of namespaces to a JSON-lines file.
+
+    Each namespace is followed by two `BackgroundWatch`es, one for Events and one for pods.
+    A pod is only recorded when its phase or the status of one of its conditions changed,
+    and every entry carries the time `t` (seconds since the epoch) it was observed. The
+    watches also list the Events and pods that existed before, which the renderer ignores.
+    Use it as a context manager to start and stop the watches. A watch that fails, e.g. as
+    the Events of a namespace are forbidden, is logged and recorded as an `error` entry.
+    """
+
+    def __init__(self, client: "Client", namespaces: list[str], path: Path):
+        self._client = client
+        self._namespaces = namespaces
+        self._lock = threading.Lock()
+        self._pods = {}
+        self._watches = []
+        self.path = path
+
+    def __enter__(self):
+        from lightkube.resources.core_v1 import Event, Pod
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text("")
+        log.info(f"Recording the event timeline of {', '.join(self._namespaces)}...")
+        self._append({"type": "start", "namespaces": self._namespaces})
+        for namespace in self._namespaces:
+            for res, on_event in ((Event, self._record_event), (Pod, self._record_pod)):
+                watch = BackgroundWatch(
+                    self._client,
+                    res,
+                    on_event,
+                    on_error=partial(self._record_error, res, namespace),
+                    namespace=namespace,
+                )
+                self._watches.append(watch.start())
+        return self
+
+    def __exit__(self, *exc_info):
+        for watch in self._watches:
+            watch.stop(wait=False)
+        for watch in self._watches:
+            watch.stop()
+        log.info(f"Event timeline written to {self.path}")
+
+    def _append(self, entry: dict):
+        with self._lock:
+            with self.path.open("a") as file:
+                file.write(json.dumps({"t": time.time()} | entry, separators=(",", ":")) + "\n")
+
+    def _record_error(self, res, namespace: str, error: Exception):
+        log.warning(f"The timeline of {namespace} is missing its {res.__name__}s from now on")
+        self._append(
+            {"type": "error", "namespace": namespace, "kind": res.__name__, "error": repr(error)}
+        )
+
+    def _record_event(self, event_type: str, event: "Event") -> bool:
+        self._append(_event_entry(event))
+        return False
+
+    def _record_pod(self, event_type: str, pod: "Pod") -> bool:
+        entry = _pod_entry(event_type, pod)
+        state = (entry["phase"], {k: v[0] for k, v in entry["conditions"].items()})
+        key = (entry["namespace"], entry["name"])
+        if self._pods.get(key) != state:
+            self._pods[key] = state
+            self._append(entry)
+        return False
+
+
+def _epoch(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def _seconds_between(start: str | None, end: str | None) -> float | None:
+    if not (start and end):
+        return None
+    return _epoch(end) - _epoch(start)
+
+
+def _scheduling(pods: dict) -> list[dict]:
+    """Return the time from creation to scheduling of each pod, from its last state."""
+    spans = []
+    for (namespace, name), entry in pods.items():
+        scheduled = entry["conditions"].get("PodScheduled", [None, None])
+        if scheduled[0] == "True":
+            seconds = _seconds_between(entry["created"], scheduled[1])
+            spans.append({"namespace": namespace, "object": f"Pod/{name}", "seconds": seconds})
+    return spans
+
+
+def _image_pulls(events: list[dict]) -> list[dict]:
+    """Pair the `Pulling` and `Pulled` events of each pod, in order."""
+    spans, pulling = [], {}
+    for event in events:
+        key = (event["namespace"], event["name"])
+        if event["kind"] != "Pod":
+            continue
+        if event["reason"] == "Pulling":
+            pulling.setdefault(key, []).append(event["time"])
+        elif event["reason"] == "Pulled" and pulling.get(key):
+            seconds = _seconds_between(pulling[key].pop(0), event["time"])
+            spans.append({"namespace": key[0], "object": f"Pod/{key[1]}", "seconds": seconds})
+    return spans
+
+
+def _webhooks(events: list[dict]) -> list[dict]:
+    """Return the time controllers spent retrying creations rejected by admission webhooks."""
+    spans, rejected = [], {}
+    for event in events:
+        key = (event["namespace"], f"{event['kind']}/{event['name']}")
+        if event["reason"] == "FailedCreate" and "webhook" in event["message"]:
+            rejected.setdefault(key, event["first_time"] or event["time"])
+        elif event["reason"] == "SuccessfulCreate" and key in rejected:
+            seconds = _seconds_between(rejected.pop(key), event["time"])
+            spans.append({"namespace": key[0], "object": key[1], "seconds": seconds})
+    return spans
+
+
+def _reconciles(events: list[dict]) -> list[dict]:
+    """Return the span of the Events of each resource other than a pod."""
+    bounds = {}
+    for event in events:
+        if event["kind"] == "Pod":
+            continue
+        key = (event["namespace"], f"{event['kind']}/{event['name']}")
+        first = event["first_time"] or event["time"]
+        if key in bounds:
+            first = min(bounds[key][0], first, key=_epoch)
+        bounds[key] = (first, event["time"])
+    return [
+        {"namespace": namespace, "object": obj, "seconds": _seconds_between(*span)}
+        for (namespace, obj), span in bounds.items()
+    ]
+
+
+def render_timeline(path: Path, top: int = 5) -> dict:
+    """Attribute the time of a recorded timeline to scheduling, pulls, webhooks and reconciles.
+
+    For each category, return the total time, the number of spans and the `top` slowest
+    of them. The spans of a category may overlap, so the totals can exceed the session.
+    The watches that failed while recording are also listed, as the timeline lacks the rest
+    of their events.
+    """
+    entries = [json.loads(line) for line in path.read_text().splitlines() if line]
+    start = next(entry["t"] for entry in entries if entry["type"] == "start")
+    events = sorted(
+        (
+            entry
+            for entry in entries
+            if entry["type"] == "event" and entry["time"] and _epoch(entry["time"]) >= start
+        ),
+        key=lambda entry: _epoch(entry["time"]),
+    )
+    for event in events:
+        # Events repeated since before the session only count from its start
+        if event["first_time"] and _epoch(event["first_time"]) < start:
+            event["first_time"] = None
+    pods = {
+        (entry["namespace"], entry["name"]): entry
+        for entry in entries
+        if entry["type"] == "pod"
+        and entry["phase"] != "Deleted"
+        and entry["created"]
+        and _epoch(entry["created"]) >= start
+    }
+
+    spans = {
+        "scheduling": _scheduling(pods),
+        "image_pull": _image_pulls(events),
+        "webhook": _webhooks(events),
+        "reconcile": _reconciles(events),
+    }
+    report = {
+        "session_s": max(entry["t"] for entry in entries) - start,
+        "events": len(events),
+        "pods": len(pods),
+        "warnings": sum(event["event_type"] == "Warning" for event in events),
+        # the watches that failed, after which the timeline is incomplete
+        "failed_watches": [
+            f"{entry['namespace']}/{entry['kind']}"
+            for entry in entries
+            if entry["type"] == "error"
+        ],
+    }
+    for category in CATEGORIES:
+        measured = [span for span in spans[category] if span["seconds"] is not None]
+        measured.sort(key=lambda span: span["seconds"], reverse=True)
+        report[category] = {
+            "total_s": sum(span["seconds"] for span in measured),
+            "count": len(measured),
+            "slowest": measured[:top],
+        }
+    return report
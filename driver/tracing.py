@@ -0,0 +1,231 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Trace the driver session as OpenTelemetry spans, exported to a local OTLP/JSON file.
+
+Spans are kept in memory and written at the end of the session in the OTLP/JSON encoding
+(`resourceSpans` > `scopeSpans` > `spans`), which OpenTelemetry tooling, e.g. the collector
+`otlpjsonfile` receiver or Jaeger, can load without a collector running during the tests.
+
+Tracing is disabled until `enable` is called, and `span` and `traced` are no-ops until
+then. The current span is tracked per thread of execution with a context variable, and a
+span started without one, e.g. in a worker thread, is a child of the session span.
+
+The trace context is propagated to the notebook tests Job with a W3C `traceparent`
+(see `traceparent`), and the spans of the notebooks are read back from the Job logs,
+where they are logged on a line of their own after `SPAN_LOG_PREFIX`. The notebook tests
+cannot import this module, as the Job only mounts `tests/` in local runs, and encode their
+spans with a copy of its constants (see `NotebookTracer` in `tests/utils.py`).
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+SERVICE_NAME = "charmed-kubeflow-uats"
+SCOPE_NAME = "driver"
+SPAN_LOG_PREFIX = "OTLP span: "
+
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+_current = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_spans = []
+_session = None
+_enabled = False
+
+
+def _attribute_value(value) -> dict:
+    """Return the OTLP/JSON `AnyValue` of an attribute."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """Span of the trace, converted to OTLP/JSON once it ends."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.status = {"code": STATUS_CODE_OK}
+        self.start = time.time_ns()
+
+    def set_attribute(self, key: str, value) -> None:
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        """Mark the span as failed."""
+        self.status = {"code": STATUS_CODE_ERROR, "message": message}
+
+    def end(self) -> None:
+        """End the span and record it for export."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": [
+                {"key": key, "value": _attribute_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": self.status,
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        add_spans([span])
+
+
+def enable(session_name: str, **attributes) -> None:
+    """Enable tracing and start the session span, which is the root of the trace."""
+    global _enabled, _session
+    _enabled = True
+    _session = Span(session_name, secrets.token_hex(16), None, attributes)
+
+
+def enabled() -> bool:
+    """Return whether tracing is enabled."""
+    return _enabled
+
+
+def current_span() -> Optional[Span]:
+    """Return the current span, or `None` if tracing is disabled."""
+    if not _enabled:
+        return None
+    return _current.get() or _session
+
+
+def _start_span(name: str, attributes: dict) -> Span:
+    parent = _current.get() or _session
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Run the block in a span, a child of the current one, and yield it.
+
+    The span is marked as failed if the block raises an exception. When tracing is disabled,
+    `None` is yielded instead.
+    """
+    if not _enabled:
+        yield None
+        return
+
+    current = _start_span(name, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as error:
+        current.set_error(f"{type(error).__name__}: {error}")
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(func: Callable) -> Callable:
+    """Decorate a function to run each of its calls in a span named after it.
+
+    Generator functions, e.g. fixtures, are traced until they are exhausted. As they are
+    suspended in between, their span does not become the current one.
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    if inspect.isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def _traced_generator(*args, **kwargs):
+            if not _enabled:
+                return (yield from func(*args, **kwargs))
+            current = _start_span(name, {})
+            try:
+                return (yield from func(*args, **kwargs))
+            except Exception as error:
+                current.set_error(f"{type(error).__name__}: {error}")
+                raise
+            finally:
+                current.end()
+
+        return _traced_generator
+
+    @functools.wraps(func)
+    def _traced(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+
+    return _traced
+
+
+def traceparent() -> Optional[str]:
+    """Return the W3C `traceparent` of the current span, or `None` if tracing is disabled."""
+    if not (current := current_span()):
+        return None
+    return f"00-{current.trace_id}-{current.span_id}-01"
+
+
+def add_spans(spans: Iterable[dict]) -> None:
+    """Record finished spans, already in the OTLP/JSON encoding, for export."""
+    with _lock:
+        _spans.extend(spans)
+
+
+def spans_from_log(lines: Iterable[str]) -> list[dict]:
+    """Return the spans logged after `SPAN_LOG_PREFIX` in the given log lines."""
+    spans = []
+    for line in lines:
+        _, prefix, payload = line.partition(SPAN_LOG_PREFIX)
+        if prefix:
+            try:
+                spans.append(json.loads(payload))
+            except json.JSONDecodeError:
+                log.warning(f"Ignoring malformed span in the logs: {payload[:100]}")
+    return spans
+
+
+def export(path: Path) -> None:
+    """End the session span and write all the spans of the trace to an OTLP/JSON file."""
+    global _enabled
+    if not _enabled:
+        return
+    _session.end()
+    _enabled = False
+
+    with _lock:
+        spans = list(_spans)
+    trace = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": _attribute_value(SERVICE_NAME)}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": spans}],
+            }
+        ]
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(trace))
+    log.info(f"Trace {_session.trace_id} with {len(spans)} spans written to {path}")
@@ -1,46 +1,145 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import contextlib
+import functools
+import json
 import logging
-import subprocess
-from typing import Dict
+import math
+import os
+import queue
+import re
+import shlex
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Optional
 
 import tenacity
-from lightkube import ApiError, Client, codecs
-from lightkube.generic_resource import create_global_resource, create_namespaced_resource
-from lightkube.resources.batch_v1 import Job
-from lightkube.resources.core_v1 import Namespace, Pod, ServiceAccount
-
-PROFILE_RESOURCE = create_global_resource(
-    group="kubeflow.org",
-    version="v1",
-    kind="profile",
-    plural="profiles",
-)
+from retries import count_api_calls, retrying
+from tracing import traced
+
+if TYPE_CHECKING:
+    from lightkube import Client
 
 log = logging.getLogger(__name__)
 
-PODDEFAULT_RESOURCE = create_namespaced_resource(
-    group="kubeflow.org",
-    version="v1alpha1",
-    kind="poddefault",
-    plural="poddefaults",
-)
 
+@functools.cache
+def profile_resource():
+    """Return the generic resource of the Kubeflow Profiles.
+
+    Like the other generic resources, it is created on first use, so that importing this
+    module, e.g. to collect the tests, does not import lightkube.
+    """
+    from lightkube.generic_resource import create_global_resource
+
+    return create_global_resource(
+        group="kubeflow.org",
+        version="v1",
+        kind="profile",
+        plural="profiles",
+    )
+
+
+@functools.cache
+def poddefault_resource():
+    """Return the generic resource of the Kubeflow PodDefaults."""
+    from lightkube.generic_resource import create_namespaced_resource
+
+    return create_namespaced_resource(
+        group="kubeflow.org",
+        version="v1alpha1",
+        kind="poddefault",
+        plural="poddefaults",
+    )
+
+
+@functools.cache
+def inference_service_resource():
+    """Return the generic resource of the KServe InferenceServices."""
+    from lightkube.generic_resource import create_namespaced_resource
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=10),
-    stop=tenacity.stop_after_attempt(30),
-    reraise=True,
+    return create_namespaced_resource(
+        group="serving.kserve.io",
+        version="v1beta1",
+        kind="InferenceService",
+        plural="inferenceservices",
+    )
+
+
+# KServe InferenceService serving the sklearn v2 iris model, and a prediction request body for it
+INFERENCE_SERVICE_TEMPLATE_FILE = (
+    Path(__file__).parent.parent / "assets" / "kserve-inference-service.yaml.j2"
 )
+INFERENCE_PAYLOAD = '{"instances": [[6.8, 2.8, 4.8, 1.4], [6.0, 3.4, 4.5, 1.6]]}'
+
+PROBE_IMAGE = "curlimages/curl:latest"
+PROBE_LABEL = "uats-probe"
+
+# Background watches are closed by the API server after this, and reconnected unless stopped,
+# which bounds how long stopping one takes.
+WATCH_SERVER_TIMEOUT_S = 5
+
+
+def kube_client() -> "Client":
+    """Return a Lightkube Client for the cluster of the kubeconfig in `KUBECONFIG`.
+
+    The kubeconfig defaults to `~/.kube/config`. The proxy environment variables are ignored,
+    and the requests are counted in the retry telemetry (see `retries`).
+    """
+    from lightkube import Client, KubeConfig
+
+    client = Client(KubeConfig.from_env(), trust_env=False)
+    count_api_calls(client)
+    return client
+
+
+def write_local_kubeconfig(url: str, path: Path) -> Path:
+    """Write a kubeconfig for a local stand-in of the API server, served over HTTP at `url`."""
+    import yaml
+
+    kubeconfig = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "stand-in", "cluster": {"server": url}}],
+        "users": [{"name": "stand-in", "user": {"token": "stand-in"}}],
+        "contexts": [{"name": "stand-in", "context": {"cluster": "stand-in", "user": "stand-in"}}],
+        "current-context": "stand-in",
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump(kubeconfig))
+    return path
+
+
+@contextlib.contextmanager
+def environment(**variables: str):
+    """Set environment variables for the duration of the block, and restore them after."""
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@traced
+@retrying("resource")
 def assert_namespace_active(
-    client: Client,
+    client: "Client",
     namespace: str,
 ):
     """Test that the provided namespace is Active.
 
     Retries multiple times to allow for the K8s namespace to be created and reach Active status.
     """
+    from lightkube.resources.core_v1 import Namespace
+
     # raises a 404 ApiError if the namespace doesn't exist
     ns = client.get(Namespace, namespace)
     phase = ns.status.phase
@@ -49,13 +148,10 @@ def assert_namespace_active(
     assert phase == "Active", f"Waited too long for namespace {namespace}!"
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=10),
-    stop=tenacity.stop_after_attempt(15),
-    reraise=True,
-)
+@traced
+@retrying("sync")
 def assert_poddefault_created_in_namespace(
-    client: Client,
+    client: "Client",
     name: str,
     namespace: str,
 ):
@@ -63,21 +159,20 @@ def assert_poddefault_created_in_namespace(
 
     Retries multiple times to allow for the PodDefault to be synced to the namespace.
     """
+    from lightkube import ApiError
+
     pod_default = None
     try:
-        pod_default = client.get(PODDEFAULT_RESOURCE, name, namespace=namespace)
+        pod_default = client.get(poddefault_resource(), name, namespace=namespace)
     except ApiError:
         log.info(f"Waiting for PodDefault {name} to be created in namespace {namespace}..")
     assert pod_default is not None, f"Waited too long for PodDefault {name} to be created."
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=10),
-    stop=tenacity.stop_after_attempt(30),
-    reraise=True,
-)
+@traced
+@retrying("resource")
 def assert_service_account_exists(
-    client: Client,
+    client: "Client",
     name: str,
     namespace: str,
 ):
@@ -85,6 +180,9 @@ def assert_service_account_exists(
 
     Retries to allow for the service account to be created by the profile controller.
     """
+    from lightkube import ApiError
+    from lightkube.resources.core_v1 import ServiceAccount
+
     service_account = None
     try:
         service_account = client.get(ServiceAccount, name, namespace=namespace)
@@ -100,21 +198,21 @@ def _log_before_sleep(retry_state):
     log.info(f"Retrying in {int(delay)} seconds (attempts: {next_attempt})")
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=32),
+@traced
+@retrying(
+    "job",
     retry=tenacity.retry_if_not_result(lambda result: result),
-    stop=tenacity.stop_after_delay(60 * 60),
     before_sleep=_log_before_sleep,
-    reraise=True,
 )
 def wait_for_job(
-    client: Client,
+    client: "Client",
     job_name: str,
     namespace: str,
 ):
     """Wait for a Kubernetes Job to complete.
 
-    Keep retrying (up to a maximum of 3600 seconds) while the Job is active or just not yet ready,
+    Keep retrying (up to a maximum of 3600 seconds, as per the `job` retry profile, or until the
+    deadline of the session) while the Job is active or just not yet ready,
     and stop once it becomes successful. This is implemented using the built-in
     `retry_if_not_result` tenacity function, along with `wait_for_job` returning False or True,
     respectively.
@@ -122,6 +220,8 @@ def wait_for_job(
     If the Job fails or lands in an unexpected state, this function will raise a ValueError and
     fail immediately.
     """
+    from lightkube.resources.batch_v1 import Job
+
     # raises a 404 ApiError if the Job doesn't exist
     job = client.get(Job, name=job_name, namespace=namespace)
     if job.status.succeeded:
@@ -139,31 +239,48 @@ def wait_for_job(
         raise ValueError(f"Unknown status {job.status} for Job {namespace}/{job_name}!")
 
 
-def fetch_job_logs(job_name, namespace, tests_local_run):
-    """Fetch the logs produced by a Kubernetes Job."""
+@traced
+def fetch_job_logs(client: "Client", job_name, namespace, tests_local_run) -> list[str]:
+    """Fetch the logs produced by a Kubernetes Job, print them and return them.
+
+    The logs are those of its first pod, with its main container named after the Job. The
+    lines of the main container are returned with their timestamps, e.g.
+    `2026-01-01T00:00:00.000000000Z Running kfp.ipynb...`, for the parsers of the logs.
+    """
+    from lightkube.resources.core_v1 import Pod
+
+    pods = client.list(Pod, namespace=namespace, labels={"job-name": job_name})
+    if (pod := next(iter(pods), None)) is None:
+        log.warning(f"No pod found for Job {namespace}/{job_name}, no logs to fetch")
+        return []
+
     if not tests_local_run:
         print("##### git-sync initContainer logs #####")
-        command = ["kubectl", "logs", "-n", namespace, f"job/{job_name}", "-c", "git-sync"]
-        subprocess.check_call(command)
+        for line in client.log(pod.metadata.name, namespace=namespace, container="git-sync"):
+            print(line, end="")
 
     print("##### test-kubeflow container logs #####")
-    command = ["kubectl", "logs", "-n", namespace, f"job/{job_name}"]
-    subprocess.check_call(command)
+    lines = []
+    for line in client.log(
+        pod.metadata.name, namespace=namespace, container=job_name, timestamps=True
+    ):
+        print(line.partition(" ")[2], end="")
+        lines.append(line)
+    return lines
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=10),
-    stop=tenacity.stop_after_attempt(10),
-    reraise=True,
-)
+@traced
+@retrying("deletion")
 def assert_profile_deleted(client, profile_name, logger: logging.Logger):
     """Assert that the Profile is deleted.
 
     Retries multiple times to allow for the Profile to be deleted.
     """
+    from lightkube import ApiError
+
     deleted = False
     try:
-        client.get(PROFILE_RESOURCE, profile_name)
+        client.get(profile_resource(), profile_name)
     except ApiError as error:
         if error.status.code != 404:
             logger.info(f"Unable to get Profile {profile_name} (status: {error.status.code})")
@@ -176,6 +293,38 @@ def assert_profile_deleted(client, profile_name, logger: logging.Logger):
     assert deleted, f"Waited too long for Profile {profile_name} to be deleted!"
 
 
+@traced
+@retrying("cascade_deletion")
+def assert_job_deleted(client: "Client", job_name: str, namespace: str):
+    """Assert that the Job is deleted.
+
+    Retries multiple times to allow for the Job and its pods to be deleted.
+    """
+    from lightkube import ApiError
+    from lightkube.resources.batch_v1 import Job
+
+    try:
+        client.get(Job, name=job_name, namespace=namespace)
+    except ApiError as error:
+        if error.status.code != 404:
+            raise
+        return
+
+    log.info(f"Waiting for Job {namespace}/{job_name} to be deleted..")
+    raise AssertionError(f"Waited too long for Job {namespace}/{job_name} to be deleted!")
+
+
+@traced
+def delete_job(client: "Client", job_name: str, namespace: str):
+    """Delete a Job along with its pods, and wait for it to be gone."""
+    from lightkube.resources.batch_v1 import Job
+    from lightkube.types import CascadeType
+
+    log.info(f"Deleting Job {namespace}/{job_name}...")
+    client.delete(Job, name=job_name, namespace=namespace, cascade=CascadeType.FOREGROUND)
+    assert_job_deleted(client, job_name, namespace)
+
+
 def context_from(argument: str, request) -> Dict[str, str]:
     """Return a dictionary with key-value entries from the CLI argument."""
     context = {}
@@ -185,6 +334,7 @@ def context_from(argument: str, request) -> Dict[str, str]:
     return context
 
 
+@traced
 def create_poddefault(
     poddefault_path: str, poddefault_context: Dict[str, str], namespace: str, lightkube_client
 ):
@@ -193,34 +343,33 @@ def create_poddefault(
     Apply the PodDefault from the path after rendering it with the passed context.
     Once execution is complete, delete the created poddefault.
     """
-    poddefault_resource = codecs.load_all_yaml(
+    from lightkube import codecs
+
+    poddefaults = codecs.load_all_yaml(
         poddefault_path.read_text(),
         poddefault_context,
     )
-    poddefault_name = poddefault_resource[0].metadata.name
+    poddefault_name = poddefaults[0].metadata.name
     log.info(f"Adding {poddefault_name} PodDefault...")
-    # Using the first item of the list of poddefault_resource. It is a one item list.
-    lightkube_client.create(poddefault_resource[0], namespace=namespace)
+    # Using the first item of the list of poddefaults. It is a one item list.
+    lightkube_client.create(poddefaults[0], namespace=namespace)
 
     yield
 
     # delete the PodDefault at the end of the module tests
-    poddefault_resource = codecs.load_all_yaml(
+    poddefaults = codecs.load_all_yaml(
         poddefault_path.read_text(),
         poddefault_context,
     )
-    poddefault_name = poddefault_resource[0].metadata.name
+    poddefault_name = poddefaults[0].metadata.name
     log.info(f"Deleting {poddefault_name} PodDefault...")
-    lightkube_client.delete(PODDEFAULT_RESOURCE, name=poddefault_name, namespace=namespace)
+    lightkube_client.delete(poddefault_resource(), name=poddefault_name, namespace=namespace)
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=10),
-    stop=tenacity.stop_after_attempt(60),
-    reraise=True,
-)
+@traced
+@retrying("pod_start")
 def assert_pod_running(
-    client: Client,
+    client: "Client",
     pod_name: str,
     namespace: str,
 ):
@@ -228,6 +377,9 @@ def assert_pod_running(
 
     Retries multiple times to allow for the Pod to start running.
     """
+    from lightkube import ApiError
+    from lightkube.resources.core_v1 import Pod
+
     try:
         pod = client.get(Pod, pod_name, namespace=namespace)
         phase = pod.status.phase
@@ -252,23 +404,456 @@ def assert_pod_running(
     raise AssertionError(f"Pod {namespace}/{pod_name} is not running yet")
 
 
-def exec_in_pod(pod_name: str, namespace: str, command: list) -> tuple[str, str, int]:
-    """Execute a command in a pod and return stdout, stderr, and return code."""
-    kubectl_cmd = [
-        "kubectl",
-        "exec",
-        "-n",
-        namespace,
-        pod_name,
-        "--",
-    ] + command
+@traced
+def exec_in_pod(
+    client: "Client", pod_name: str, namespace: str, command: list
+) -> tuple[str, str, int]:
+    """Execute a command in a pod and return stdout, stderr, and return code.
 
+    The command runs over the Kubernetes exec websocket API, reusing the credentials of the
+    lightkube client, so neither a `kubectl` process nor binary is needed.
+    """
     log.info(f"Executing command in pod {namespace}/{pod_name}: {' '.join(command)}")
 
-    result = subprocess.run(
-        kubectl_cmd,
-        capture_output=True,
-        text=True,
+    response = client.exec(
+        pod_name, namespace=namespace, command=command, stdout=True, stderr=True
+    )
+
+    return response.stdout, response.stderr, response.exit_code
+
+
+class PodShell:
+    """Long-lived `sh` session in a pod, to run many commands over a single exec connection.
+
+    Executing a command through the exec API has a fixed cost (a websocket upgrade, plus the
+    kubelet and container runtime setting up the exec), which dominates cheap probe commands
+    such as a `curl` request. A `PodShell` pays it once: it keeps `sh` running and feeds the
+    commands to its stdin, delimiting their output with a random marker.
+
+    lightkube only exposes exec as one-shot commands, so the session opens its own websocket,
+    with an HTTP client built from the configuration of the lightkube client, and speaks the
+    exec protocol of Kubernetes: each message is prefixed with its channel.
+
+    Requires the `v5.channel.k8s.io` exec subprotocol (Kubernetes >= 1.30) to write to stdin.
+    Commands are serialised, so the session can be shared between threads. Use it as a
+    context manager to open and close the session.
+    """
+
+    SUBPROTOCOLS = ["v5.channel.k8s.io", "v4.channel.k8s.io"]
+    STDIN_CHANNEL, STDOUT_CHANNEL, STDERR_CHANNEL, ERROR_CHANNEL = 0, 1, 2, 3
+    # Message closing stdin, only supported by the v5 subprotocol
+    CLOSE_STDIN = bytes((255, STDIN_CHANNEL))
+
+    def __init__(self, client: "Client", pod_name: str, namespace: str, timeout: float = 300):
+        self.pod_name = pod_name
+        self.namespace = namespace
+        self._client = client
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._stack = contextlib.ExitStack()
+        self._ws = None
+
+    def __enter__(self):
+        import httpx
+        from httpx_ws import connect_ws
+        from lightkube.config.client_adapter import Client, ConnectionParams
+
+        log.info(f"Opening shell session in pod {self.namespace}/{self.pod_name}")
+        params = ConnectionParams(trust_env=False, timeout=httpx.Timeout(10, read=None))
+        try:
+            http_client = self._stack.enter_context(Client(self._client.config, params))
+            self._ws = self._stack.enter_context(
+                connect_ws(
+                    f"/api/v1/namespaces/{self.namespace}/pods/{self.pod_name}/exec",
+                    http_client,
+                    subprotocols=self.SUBPROTOCOLS,
+                    params={"command": "sh", "stdin": True, "stdout": True, "stderr": True},
+                )
+            )
+            if self._ws.subprotocol != self.SUBPROTOCOLS[0]:
+                raise RuntimeError(
+                    f"Writing to the stdin of {self.namespace}/{self.pod_name} requires the"
+                    f" {self.SUBPROTOCOLS[0]} exec subprotocol (Kubernetes >= 1.30), the API"
+                    f" server negotiated {self._ws.subprotocol}"
+                )
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        log.info(f"Closing shell session in pod {self.namespace}/{self.pod_name}")
+        try:
+            self._ws.send_bytes(self.CLOSE_STDIN)
+        finally:
+            self._stack.close()
+
+    def run(self, script: str) -> tuple[str, str, int]:
+        """Run a shell script in the session and return stdout, stderr, and return code.
+
+        The script runs in a subshell, so that e.g. `exit` or `cd` do not affect the session.
+        If it times out, the session is out of sync and should no longer be used.
+        """
+        from lightkube import ApiError
+
+        marker = uuid.uuid4().hex
+        wrapped = (
+            f"( {script}\n)\n"
+            f"printf '\\n%s:%d\\n' {marker} $?\n"
+            f"printf '\\n%s\\n' {marker} >&2\n"
+        )
+        stdout_end = re.compile(rb"\n" + marker.encode() + rb":(-?\d+)\n$")
+        stderr_end = b"\n" + marker.encode() + b"\n"
+        stdout, stderr = b"", b""
+
+        with self._lock:
+            self._ws.send_bytes(bytes((self.STDIN_CHANNEL,)) + wrapped.encode())
+            deadline = time.monotonic() + self._timeout
+            while not (stdout_end.search(stdout) and stderr.endswith(stderr_end)):
+                try:
+                    message = self._ws.receive_bytes(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise TimeoutError(f"Timed out after {self._timeout}s running: {script}")
+                channel, payload = message[0], message[1:]
+                if channel == self.STDOUT_CHANNEL:
+                    stdout += payload
+                elif channel == self.STDERR_CHANNEL:
+                    stderr += payload
+                elif channel == self.ERROR_CHANNEL:
+                    raise ApiError(status=json.loads(payload))
+
+        match = stdout_end.search(stdout)
+        out = stdout[: match.start()].decode(errors="replace")
+        err = stderr[: -len(stderr_end)].decode(errors="replace")
+        return out, err, int(match.group(1))
+
+
+@traced
+def create_probe_pod(
+    client: "Client", name: str, namespace: str, labels: Optional[Dict[str, str]] = None
+) -> None:
+    """Create a long-running curl pod to execute probe commands from.
+
+    The pod runs as the `default-editor` ServiceAccount of the Profile and carries the
+    `uats-probe: <name>` label, plus the given ones, e.g. to select PodDefaults.
+    """
+    from lightkube.models.core_v1 import Container, PodSpec
+    from lightkube.models.meta_v1 import ObjectMeta
+    from lightkube.resources.core_v1 import Pod
+
+    log.info(f"Creating probe pod {namespace}/{name}...")
+    pod = Pod(
+        metadata=ObjectMeta(
+            name=name,
+            namespace=namespace,
+            labels={PROBE_LABEL: name, **(labels or {})},
+        ),
+        spec=PodSpec(
+            serviceAccountName="default-editor",
+            restartPolicy="Never",
+            containers=[
+                Container(
+                    name="curl",
+                    image=PROBE_IMAGE,
+                    command=["sleep", "infinity"],
+                )
+            ],
+        ),
     )
+    client.create(pod, namespace=namespace)
+
+
+@traced
+def delete_pod(client: "Client", name: str, namespace: str) -> None:
+    """Delete a pod, ignoring it if it was already deleted."""
+    from lightkube import ApiError
+    from lightkube.resources.core_v1 import Pod
 
-    return result.stdout, result.stderr, result.returncode
+    log.info(f"Deleting pod {namespace}/{name}...")
+    try:
+        client.delete(Pod, name=name, namespace=namespace)
+    except ApiError as e:
+        if e.status.code != 404:
+            raise
+        log.info(f"Pod {namespace}/{name} already deleted")
+
+
+@traced
+def curl_in_pod(
+    shell: PodShell,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    data: Optional[str] = None,
+    kfp_auth: bool = False,
+    method: Optional[str] = None,
+) -> tuple[Optional[int], str, Optional[float]]:
+    """Send an HTTP request with curl from inside a pod.
+
+    Args:
+        shell: The shell session of the pod, which must have `curl` available.
+        url: The URL to request.
+        headers: Extra request headers.
+        data: The request body; if set, the request is a POST with a JSON content type.
+        kfp_auth: Whether to authenticate with the KFP ServiceAccount token, mounted in the
+            pod by the `access-ml-pipeline` PodDefault.
+        method: The request method, e.g. `DELETE`, instead of curl's GET or POST.
+
+    Returns:
+        A `(http_code, body, time_total_ms)` tuple, where the time is measured by curl
+        itself and so excludes the overhead of sending the command to the pod. The code
+        and time are None if they could not be parsed.
+    """
+    args = ["curl", "-s", "-w", "\\nHTTP_CODE:%{http_code} TIME_TOTAL:%{time_total}"]
+    for key, value in (headers or {}).items():
+        args += ["-H", f"{key}: {value}"]
+    if data is not None:
+        args += ["-H", "Content-Type: application/json", "--data-binary", data]
+    if method is not None:
+        args += ["-X", method]
+    script = shlex.join(args + [url])
+    if kfp_auth:
+        script += ' -H "Authorization: Bearer $(cat $KF_PIPELINES_SA_TOKEN_PATH)"'
+
+    stdout, stderr, _ = shell.run(script)
+    if stderr:
+        log.info(f"curl stderr:\n{stderr}")
+
+    body, _, trailer = stdout.rpartition("\nHTTP_CODE:")
+    http_code = time_total = None
+    try:
+        code, _, total = trailer.partition(" TIME_TOTAL:")
+        http_code, time_total = int(code), float(total) * 1000
+    except ValueError:
+        log.error(f"Could not parse curl output: {stdout}")
+    return http_code, body, time_total
+
+
+class BackgroundWatch:
+    """Watch resources from a daemon thread, on a client of its own, until it is stopped.
+
+    `on_event(event_type, obj)` is called for each event, and ends the watch when it returns
+    True. The API server closes the watch after `server_timeout` seconds and it is then
+    reconnected, unless the watch was stopped in the meantime: closing its client fails the
+    reconnection, which ends the thread. An error of the watch is logged, stored in `error`
+    and passed to `on_error`, if given.
+    """
+
+    def __init__(
+        self,
+        client: "Client",
+        res,
+        on_event: Callable,
+        on_error: Optional[Callable] = None,
+        server_timeout: int = WATCH_SERVER_TIMEOUT_S,
+        **options,
+    ):
+        from lightkube import Client
+
+        self._client = Client(client.config, trust_env=False)
+        count_api_calls(self._client)
+        self._res = res
+        self._on_event = on_event
+        self._on_error = on_error
+        self._server_timeout = server_timeout
+        self._options = options
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self.error = None
+
+    def start(self) -> "BackgroundWatch":
+        """Start the watch thread."""
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop the watch and close its client, waiting for its thread to end if `wait`."""
+        self._stopped.set()
+        self._client.close()
+        if wait:
+            self._thread.join(timeout=self._server_timeout + 5)
+            if self._thread.is_alive():
+                log.warning(f"The watch of {self._res.__name__} resources did not stop")
+
+    def _handle_error(self, error, count):
+        from lightkube.types import OnErrorAction, OnErrorResult
+
+        return OnErrorResult(OnErrorAction.STOP if self._stopped.is_set() else OnErrorAction.RAISE)
+
+    def _watch(self):
+        try:
+            for event_type, obj in self._client.watch(
+                self._res,
+                server_timeout=self._server_timeout,
+                on_error=self._handle_error,
+                **self._options,
+            ):
+                if self._stopped.is_set() or self._on_event(event_type, obj):
+                    return
+        except Exception as error:
+            if self._stopped.is_set():
+                return
+            log.warning(f"The watch of {self._res.__name__} resources failed: {error!r}")
+            self.error = error
+            if self._on_error:
+                self._on_error(error)
+        finally:
+            self._client.close()
+
+
+@traced
+def watch_until(
+    client: "Client",
+    res,
+    condition: Callable,
+    timeout: float,
+    namespace: Optional[str] = None,
+    labels: Optional[dict] = None,
+    fields: Optional[dict] = None,
+):
+    """Watch resources until `condition(event_type, obj)` holds and return the matching object.
+
+    Unlike polling, this reacts to the change as soon as the API server emits it. The watch
+    runs in a daemon thread so that the timeout is honoured even if no events are received.
+    The watch is a `BackgroundWatch`, which ends at the latest when the API server closes
+    it, after about `timeout` seconds, rather than on the next event, which may never come.
+
+    Raises:
+        TimeoutError: if no event satisfies the condition within `timeout` seconds.
+    """
+    matched = queue.Queue()
+
+    def _on_event(event_type, obj) -> bool:
+        if condition(event_type, obj):
+            matched.put(obj)
+            return True
+        return False
+
+    watch = BackgroundWatch(
+        client,
+        res,
+        _on_event,
+        on_error=matched.put,
+        server_timeout=math.ceil(timeout),
+        namespace=namespace,
+        labels=labels,
+        fields=fields,
+    ).start()
+    try:
+        result = matched.get(timeout=timeout)
+    except queue.Empty:
+        raise TimeoutError(f"Timed out after {timeout}s watching {res.__name__} resources")
+    finally:
+        watch.stop(wait=False)
+
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+class PodLifecycleRecorder:
+    """Record the lifecycle of the pods matching a label selector from a background watch.
+
+    Every change of a pod's phase or readiness is stored in `events` as a dictionary with
+    the monotonic time it was observed, which allows measuring e.g. startup time or
+    scale-down without polling. Use it as a context manager to start and stop the watch,
+    which is a `BackgroundWatch`: if it fails, the waits and the exit re-raise its error.
+    """
+
+    def __init__(self, client: "Client", namespace: str, labels: dict):
+        from lightkube.resources.core_v1 import Pod
+
+        self._namespace = namespace
+        self._labels = labels
+        self._states = {}
+        self._changed = threading.Condition()
+        self._watch = BackgroundWatch(
+            client,
+            Pod,
+            self._record,
+            on_error=self._notify,
+            namespace=namespace,
+            labels=labels,
+        )
+        self.events = []
+
+    def __enter__(self):
+        self._watch.start()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self._watch.stop()
+        if exc_type is None:
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._watch.error:
+            raise RuntimeError(
+                f"The watch of pods {self._labels} in {self._namespace} failed"
+            ) from self._watch.error
+
+    def _notify(self, error):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _record(self, event_type, pod) -> bool:
+        name = pod.metadata.name
+        if event_type == "DELETED":
+            state = ("Deleted", False)
+        else:
+            conditions = (pod.status.conditions if pod.status else None) or []
+            ready = any(c.type == "Ready" and c.status == "True" for c in conditions)
+            state = (pod.status.phase if pod.status else None, ready)
+
+        with self._changed:
+            if self._states.get(name) == state:
+                return False
+            if event_type == "DELETED":
+                self._states.pop(name, None)
+            else:
+                self._states[name] = state
+            self.events.append(
+                {"time": time.monotonic(), "pod": name, "phase": state[0], "ready": state[1]}
+            )
+            log.info(f"Pod {self._namespace}/{name}: phase={state[0]}, ready={state[1]}")
+            self._changed.notify_all()
+        return False
+
+    def pod_count(self) -> int:
+        """Return the number of pods currently known to exist."""
+        with self._changed:
+            return len(self._states)
+
+    def wait_for(self, predicate: Callable[[dict], bool], timeout: float) -> float:
+        """Wait until `predicate(pod_states)` holds and return the monotonic time it did.
+
+        `pod_states` maps each existing pod name to a `(phase, ready)` tuple.
+
+        Raises:
+            TimeoutError: if the predicate does not hold within `timeout` seconds.
+            RuntimeError: if the watch failed.
+        """
+        with self._changed:
+            held = self._changed.wait_for(
+                lambda: self._watch.error or predicate(self._states), timeout=timeout
+            )
+            self._raise_error()
+            if not held:
+                raise TimeoutError(f"Timed out after {timeout}s waiting for pods {self._labels}")
+            return time.monotonic()
+
+    def wait_for_event(self, predicate: Callable[[dict], bool], timeout: float) -> dict:
+        """Wait until an event satisfying `predicate(event)` is recorded and return it.
+
+        Raises:
+            TimeoutError: if no such event is recorded within `timeout` seconds.
+            RuntimeError: if the watch failed.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._watch.error or any(map(predicate, self.events)), timeout=timeout
+            )
+            self._raise_error()
+            event = next(filter(predicate, self.events), None)
+            if event is None:
+                raise TimeoutError(f"Timed out after {timeout}s waiting for pods {self._labels}")
+            return event
@@ -3,6 +3,7 @@
 
 import os
 
+import pytest
 from _pytest.config.argparsing import Parser
 
 
@@ -12,6 +13,15 @@ def pytest_addoption(parser: Parser):
       in the executed tests.
     * Add an `--include-kubeflow-trainer-tests` flag to include the tests for Kubeflow Trainer V2
       in the executed tests.
+    * Add an `--include-benchmark-tests` flag to include the benchmark notebooks, i.e. those
+      whose name ends with `-benchmark`, in the executed tests, and a `--benchmark-tests-only`
+      flag to only execute those.
+    * Add an `--allow-no-notebooks` flag to pass a session in which no notebook is selected.
+    * Add `--max-output-bytes` and `--max-cell-output-bytes` options to cap the outputs kept in
+      the executed notebooks, all outputs being streamed to `<notebook name>-outputs.jsonl`.
+    * Add `--notebook-timeout`, `--cell-timeout` and `--notebook-budgets` options to set the
+      time budgets of the notebooks and of their cells, and a `--session-deadline` option to
+      stop running notebooks once the session took that long.
     """
     parser.addoption(
         "--include-gpu-tests",
@@ -25,6 +35,61 @@ def pytest_addoption(parser: Parser):
         help="Defines whether to include the tests for Kubeflow Trainer V2 in the executed tests."
         "By default, it is set to False.",
     )
+    parser.addoption(
+        "--include-benchmark-tests",
+        action="store_true",
+        help="Defines whether to include the benchmark notebooks in the executed tests."
+        "By default, it is set to False.",
+    )
+    parser.addoption(
+        "--benchmark-tests-only",
+        action="store_true",
+        help="Defines whether to only execute the benchmark notebooks. By default, it is set to"
+        " False.",
+    )
+    parser.addoption(
+        "--allow-no-notebooks",
+        action="store_true",
+        help="Defines whether a session in which no notebook is selected, e.g. by `-k`, passes."
+        " By default, it is set to False.",
+    )
+    parser.addoption(
+        "--max-output-bytes",
+        type=int,
+        default=256 * 1024,
+        help="Size, in bytes, above which an output is truncated in the executed notebook."
+        " By default, it is set to 256 KiB.",
+    )
+    parser.addoption(
+        "--max-cell-output-bytes",
+        type=int,
+        default=1024 * 1024,
+        help="Size, in bytes, of the outputs kept for a cell in the executed notebook, the next"
+        " ones being left out. By default, it is set to 1 MiB.",
+    )
+    parser.addoption(
+        "--notebook-timeout",
+        type=float,
+        help="Time budget, in seconds, of a notebook without its own in its metadata or in the"
+        " `--notebook-budgets` manifest. By default, notebooks only share the session deadline.",
+    )
+    parser.addoption(
+        "--cell-timeout",
+        type=float,
+        help="Time budget, in seconds, of a cell of a notebook without its own in its metadata or"
+        " in the `--notebook-budgets` manifest. By default, cells only share the notebook budget.",
+    )
+    parser.addoption(
+        "--notebook-budgets",
+        help="Provide the JSON manifest of the time budgets of the notebooks. By default, there"
+        " is none.",
+    )
+    parser.addoption(
+        "--session-deadline",
+        type=float,
+        help="Time, in seconds since the start of the session, after which running notebooks are"
+        " stopped and no other notebook is started. By default, there is no deadline.",
+    )
 
 
 def pytest_configure(config):
@@ -32,3 +97,19 @@ def pytest_configure(config):
     os.environ["include_kubeflow_trainer_tests"] = str(
         config.getoption("--include-kubeflow-trainer-tests")
     )
+    os.environ["include_benchmark_tests"] = str(config.getoption("--include-benchmark-tests"))
+    os.environ["benchmark_tests_only"] = str(config.getoption("--benchmark-tests-only"))
+    os.environ["max_output_bytes"] = str(config.getoption("--max-output-bytes"))
+    os.environ["max_cell_output_bytes"] = str(config.getoption("--max-cell-output-bytes"))
+    os.environ["notebook_timeout"] = str(config.getoption("--notebook-timeout") or "")
+    os.environ["cell_timeout"] = str(config.getoption("--cell-timeout") or "")
+    budgets = config.getoption("--notebook-budgets")
+    os.environ["notebook_budgets"] = os.path.abspath(budgets) if budgets else ""
+    os.environ["session_deadline"] = str(config.getoption("--session-deadline") or "")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and session.config.getoption(
+        "--allow-no-notebooks"
+    ):
+        session.exitstatus = pytest.ExitCode.OK
@@ -6,12 +6,17 @@ import os
 
 import nbformat
 import pytest
-from nbclient.exceptions import CellExecutionError
-from nbconvert.preprocessors import ExecutePreprocessor
+from nbclient.exceptions import CellExecutionError, CellTimeoutError
 from utils import (
+    NotebookScheduler,
+    NotebookTracer,
+    StreamingExecutePreprocessor,
     discover_notebooks,
     format_error_message,
     install_python_requirements,
+    load_budgets,
+    log_benchmark_results,
+    outputs_file,
     save_notebook,
 )
 
@@ -22,16 +27,42 @@ EXAMPLES_DIR = {
 }
 INCLUDE_GPU_TESTS = os.getenv("include_gpu_tests").lower() == "true"
 INCLUDE_KUBEFLOW_TRAINER_TESTS = os.getenv("include_kubeflow_trainer_tests").lower() == "true"
+INCLUDE_BENCHMARK_TESTS = os.getenv("include_benchmark_tests").lower() == "true"
+BENCHMARK_TESTS_ONLY = os.getenv("benchmark_tests_only").lower() == "true"
+MAX_OUTPUT_BYTES = int(os.getenv("max_output_bytes"))
+MAX_CELL_OUTPUT_BYTES = int(os.getenv("max_cell_output_bytes"))
+NOTEBOOK_TIMEOUT = float(os.getenv("notebook_timeout") or 0) or None
+CELL_TIMEOUT = float(os.getenv("cell_timeout") or 0) or None
+SESSION_DEADLINE = float(os.getenv("session_deadline") or 0) or None
+# Benchmark notebooks live next to the UAT of the component they benchmark.
+BENCHMARK_SUFFIX = "-benchmark"
 
 NOTEBOOKS = discover_notebooks(EXAMPLES_DIR["cpu"])
 if INCLUDE_GPU_TESTS:
     NOTEBOOKS.update(discover_notebooks(EXAMPLES_DIR["gpu"]))
 if INCLUDE_KUBEFLOW_TRAINER_TESTS:
     NOTEBOOKS.update(discover_notebooks(EXAMPLES_DIR["kubeflow-trainer"]))
+if BENCHMARK_TESTS_ONLY:
+    NOTEBOOKS = {name: path for name, path in NOTEBOOKS.items() if name.endswith(BENCHMARK_SUFFIX)}
+elif not INCLUDE_BENCHMARK_TESTS:
+    NOTEBOOKS = {
+        name: path for name, path in NOTEBOOKS.items() if not name.endswith(BENCHMARK_SUFFIX)
+    }
 
 log = logging.getLogger(__name__)
 
 
+@pytest.fixture(scope="session")
+def scheduler():
+    """Schedule the notebooks within their time budgets and the session deadline."""
+    return NotebookScheduler(
+        NOTEBOOK_TIMEOUT,
+        CELL_TIMEOUT,
+        SESSION_DEADLINE,
+        load_budgets(os.getenv("notebook_budgets")),
+    )
+
+
 @pytest.mark.ipynb
 @pytest.mark.parametrize(
     # notebook - ipynb file to execute
@@ -39,15 +70,28 @@ log = logging.getLogger(__name__)
     NOTEBOOKS.values(),
     ids=NOTEBOOKS.keys(),
 )
-def test_notebook(test_notebook):
+def test_notebook(test_notebook, scheduler):
     """Test Notebook Generic Wrapper."""
     os.chdir(os.path.dirname(test_notebook))
 
     with open(test_notebook) as nb:
         notebook = nbformat.read(nb, as_version=nbformat.NO_CONVERT)
 
-    ep = ExecutePreprocessor(
-        timeout=-1, kernel_name="python3", on_notebook_start=install_python_requirements
+    notebook_name = os.path.splitext(os.path.basename(test_notebook))[0]
+    if not (budget := scheduler.start(notebook_name, notebook)):
+        pytest.skip("Session deadline reached before running the notebook")
+
+    # Trace context of the driver session, if it is traced
+    tracer = NotebookTracer(os.getenv("TRACEPARENT"), os.path.basename(test_notebook))
+    # Outputs are streamed to a sidecar file, and only capped in the executed notebook
+    ep = StreamingExecutePreprocessor(
+        timeout_func=budget.timeout_func,
+        kernel_name="python3",
+        on_notebook_start=install_python_requirements,
+        outputs_path=outputs_file(test_notebook),
+        max_output_bytes=MAX_OUTPUT_BYTES,
+        max_cell_output_bytes=MAX_CELL_OUTPUT_BYTES,
+        **tracer.hooks(),
     )
     ep.skip_cells_with_tag = "pytest-skip"
 
@@ -66,19 +110,30 @@ def test_notebook(test_notebook):
         )
     try:
         log.info(f"Running {os.path.basename(test_notebook)}...")
-        output_notebook, _ = ep.preprocess(notebook, {"metadata": {"path": "./"}})
+        with tracer.notebook():
+            ep.preprocess(notebook, {"metadata": {"path": "./"}})
     except CellExecutionError as e:
         # handle underlying error
         pytest.fail(f"Notebook execution failed with {e.ename}: {e.evalue}")
+    except CellTimeoutError as e:
+        # the kernel of the notebook is shut down, record it as timed out and move on
+        budget.log_timed_out()
+        pytest.fail(f"Notebook execution timed out: {e}")
     finally:
         try:
-            # persist the notebook output to the original file for debugging purposes
-            save_notebook(output_notebook, test_notebook)
+            # persist the notebook, executed in place, to the original file for debugging purposes
+            save_notebook(notebook, test_notebook)
         except PermissionError as e:
             # If in case the notebook cannot be saved in-place, log the error and continue
             log.error(f"Permission error while saving notebook: {str(e)}")
+        log_benchmark_results(test_notebook)
+
+    fail_on_raised_exceptions(notebook)
+
 
-    for cell in output_notebook.cells:
+def fail_on_raised_exceptions(notebook):
+    """Fail if a cell tagged `raises-exception` raised one."""
+    for cell in notebook.cells:
         metadata = cell.get("metadata", dict)
         if "raises-exception" in metadata.get("tags", []):
             for cell_output in cell.outputs:
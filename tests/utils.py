@@ -1,11 +1,37 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import contextlib
+import json
+import logging
+import math
 import os
+import secrets
 import subprocess
-from typing import Dict
+import time
+from typing import Dict, Optional
 
 import nbformat
+from nbconvert.preprocessors import ExecutePreprocessor
+from traitlets import Integer, Unicode
+
+log = logging.getLogger(__name__)
+
+# Prefix of the log lines carrying spans, which the driver collects from the Job logs. In local
+# runs, the Job only mounts this directory, so it cannot import `driver/tracing.py`: these
+# constants and `NotebookTracer` mirror its OTLP/JSON encoding, see `unit/test_tracing.py`.
+SPAN_LOG_PREFIX = "OTLP span: "
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+# Key of the notebook and cell metadata holding their time budgets, e.g. `{"timeout": 600}`.
+BUDGET_METADATA_KEY = "uats"
+# Prefix of the log line of a notebook stopped once its time budget ran out, for the driver.
+TIMED_OUT_LOG_PREFIX = "Timed out "
+
+# Output types always kept whole in the executed notebook, since failures are reported from them.
+UNCAPPED_OUTPUT_TYPES = ("error",)
 
 
 def install_python_requirements(requirements_file: str = "requirements.txt", *args, **kwargs):
@@ -43,6 +69,318 @@ def discover_notebooks(directory) -> Dict[str, str]:
 
 
 def save_notebook(notebook, file_path):
-    """Save notebook to a file."""
+    """Save notebook to a file, compactly.
+
+    Unlike `nbformat.write`, the notebook is neither copied nor indented.
+    """
     with open(file_path, "w", encoding="utf-8") as nb_file:
-        nbformat.write(notebook, nb_file)
+        json.dump(notebook, nb_file, ensure_ascii=False, separators=(",", ":"))
+
+
+def outputs_file(notebook_path: str) -> str:
+    """Return the path of the sidecar file the outputs of a notebook are streamed to.
+
+    The outputs are written as JSON lines to `<notebook name>-outputs.jsonl`, in the directory of
+    the notebook.
+    """
+    return f"{os.path.splitext(notebook_path)[0]}-outputs.jsonl"
+
+
+def truncate_output(output, max_bytes: int, note: str):
+    """Return a copy of a stream or data output, cut down to `max_bytes` characters.
+
+    Streams keep the start of their text and data outputs that of their plain text
+    representation only, followed by the given note.
+    """
+    if output.output_type == "stream":
+        return nbformat.from_dict({**output, "text": output.text[:max_bytes] + note})
+    text = output.get("data", {}).get("text/plain", "")
+    return nbformat.from_dict(
+        {**output, "data": {"text/plain": text[:max_bytes] + note}, "metadata": {}}
+    )
+
+
+def benchmark_results_file(notebook_path: str) -> str:
+    """Return the path of the results file of a benchmark notebook.
+
+    Benchmark notebooks write their measurements as JSON to `<notebook name>-results.json`,
+    in the directory of the notebook.
+    """
+    return f"{os.path.splitext(notebook_path)[0]}-results.json"
+
+
+def log_benchmark_results(notebook_path: str):
+    """Log the results written by a benchmark notebook, if any, so that they reach the logs."""
+    results_file = benchmark_results_file(notebook_path)
+    if not os.path.exists(results_file):
+        return
+    with open(results_file, encoding="utf-8") as results:
+        data = json.load(results)
+    log.info(
+        f"Benchmark results of {os.path.basename(notebook_path)}:\n{json.dumps(data, indent=2)}"
+    )
+
+
+class NotebookTracer:
+    """Log OpenTelemetry spans for the execution of a notebook and of each of its cells.
+
+    The spans are children of the W3C `traceparent` passed by the driver, usually through the
+    `TRACEPARENT` environment variable, so that they join the trace of the driver session.
+    They are logged in the OTLP/JSON encoding after `SPAN_LOG_PREFIX`, for the driver to
+    collect them from the Job logs. Without a `traceparent`, nothing is logged.
+    """
+
+    def __init__(self, traceparent: Optional[str], notebook_name: str):
+        self.enabled = bool(traceparent)
+        if self.enabled:
+            _, self.trace_id, self.parent_id, _ = traceparent.split("-")
+        self.notebook_name = notebook_name
+        self.span_id = secrets.token_hex(8)
+        self._cell_start = None
+
+    def _log_span(self, name, span_id, parent_id, start, status, attributes):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_id,
+            "name": name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in attributes.items()
+            ],
+            "status": status,
+        }
+        log.info(SPAN_LOG_PREFIX + json.dumps(span))
+
+    @contextlib.contextmanager
+    def notebook(self):
+        """Log a span for the block executing the notebook."""
+        if not self.enabled:
+            yield
+            return
+        start = time.time_ns()
+        status = {"code": STATUS_CODE_OK}
+        try:
+            yield
+        except BaseException as error:
+            status = {"code": STATUS_CODE_ERROR, "message": f"{type(error).__name__}: {error}"}
+            raise
+        finally:
+            self._log_span(
+                f"notebook {self.notebook_name}",
+                self.span_id,
+                self.parent_id,
+                start,
+                status,
+                {"notebook.name": self.notebook_name},
+            )
+
+    def on_cell_execute(self, cell, cell_index, **kwargs):
+        """Start the span of a cell, as an `on_cell_execute` hook of nbclient."""
+        self._cell_start = time.time_ns()
+
+    def on_cell_executed(self, cell, cell_index, execute_reply, **kwargs):
+        """Log the span of a cell, as an `on_cell_executed` hook of nbclient."""
+        reply_status = execute_reply["content"]["status"] if execute_reply else "unknown"
+        code = STATUS_CODE_OK if reply_status == "ok" else STATUS_CODE_ERROR
+        self._log_span(
+            f"cell {cell_index}",
+            secrets.token_hex(8),
+            self.span_id,
+            self._cell_start,
+            {"code": code},
+            {
+                "notebook.name": self.notebook_name,
+                "cell.index": cell_index,
+                "cell.tags": ",".join(cell.get("metadata", {}).get("tags", [])),
+                "cell.status": reply_status,
+            },
+        )
+
+    def hooks(self) -> dict:
+        """Return the nbclient hooks logging the spans of the cells, if enabled."""
+        if not self.enabled:
+            return {}
+        return {
+            "on_cell_execute": self.on_cell_execute,
+            "on_cell_executed": self.on_cell_executed,
+        }
+
+
+class StreamingExecutePreprocessor(ExecutePreprocessor):
+    """Execute a notebook, streaming the outputs of its cells to an append-only sidecar file.
+
+    Each output is appended as a JSON line to `outputs_path` as soon as the kernel sends it, so
+    that the full outputs are kept on disk while only a bounded part of them is kept in memory,
+    in the executed notebook:
+
+    * an output larger than `max_output_bytes` is truncated, see `truncate_output`
+    * once the outputs kept for a cell would exceed `max_cell_output_bytes`, its next outputs
+      are left out, and counted in a note added to the cell
+
+    Errors are always kept whole, since the failures of the notebook are reported from them.
+    """
+
+    outputs_path = Unicode(help="Path of the sidecar file the outputs are streamed to.").tag(
+        config=True
+    )
+    max_output_bytes = Integer(
+        256 * 1024, help="Size above which an output is truncated in the executed notebook."
+    ).tag(config=True)
+    max_cell_output_bytes = Integer(
+        1024 * 1024, help="Size of the outputs kept for a cell in the executed notebook."
+    ).tag(config=True)
+
+    def preprocess(self, nb, resources=None, km=None):
+        """Execute the notebook, streaming its outputs to the sidecar file."""
+        self._cells = {}
+        try:
+            sidecar = open(self.outputs_path, "w", encoding="utf-8", buffering=1)
+        except OSError as error:
+            # Keep running the notebook, its outputs are still capped
+            log.error(f"Unable to stream the notebook outputs to {self.outputs_path}: {error}")
+            sidecar = contextlib.nullcontext()
+        with sidecar as self._sidecar:
+            return super().preprocess(nb, resources, km)
+
+    def _stream(self, cell_index: int, output) -> int:
+        """Append an output of a cell to the sidecar file and return its size."""
+        # The output is only serialized once, possibly large
+        serialized = json.dumps(output, ensure_ascii=False)
+        if self._sidecar:
+            self._sidecar.write(
+                f'{{"cell": {cell_index}, "time": {time.time()}, "output": {serialized}}}\n'
+            )
+        return len(serialized)
+
+    def output(self, outs, msg, display_id, cell_index):
+        """Stream an output of a cell, and keep it whole, truncated or not at all in the cell."""
+        if self.clear_before_next_output or not outs:
+            # The outputs of the cell are starting over
+            self._cells.pop(cell_index, None)
+        out = super().output(outs, msg, display_id, cell_index)
+        # Outputs handled by an output hook, e.g. of a widget, are not added to the cell
+        if out is None:
+            return None
+        size = self._stream(cell_index, out)
+        if out.output_type in UNCAPPED_OUTPUT_TYPES:
+            return out
+
+        cell = self._cells.setdefault(cell_index, {"kept": 0, "left_out": 0, "note": None})
+        sidecar_name = os.path.basename(self.outputs_path)
+        if size > self.max_output_bytes:
+            note = f"\n[Output truncated, see {sidecar_name} for the full output]\n"
+            outs[-1] = out = truncate_output(out, self.max_output_bytes, note)
+            size = self.max_output_bytes
+        # Outputs with a display id can be updated later on, by their index in the cell
+        if display_id or (
+            not cell["left_out"] and cell["kept"] + size <= self.max_cell_output_bytes
+        ):
+            cell["kept"] += size
+            return out
+
+        outs.pop()
+        cell["left_out"] += 1
+        if cell["note"] is None:
+            cell["note"] = nbformat.v4.new_output("stream", name="stdout", text="")
+            outs.append(cell["note"])
+        cell["note"].text = (
+            f"[{cell['left_out']} more outputs left out, see {sidecar_name} for all the outputs]\n"
+        )
+        return None
+
+
+def load_budgets(manifest_path: Optional[str]) -> Dict[str, dict]:
+    """Return the time budgets of the notebooks declared in a JSON manifest, if it exists.
+
+    The manifest maps the names of the notebooks to their budgets, e.g.
+    `{"katib-benchmark": {"timeout": 3600, "cell_timeout": 1200}}`.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as manifest:
+        return json.load(manifest)
+
+
+class NotebookBudget:
+    """Time budget of a notebook run, and of each of its cells."""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: Optional[float],
+        cell_timeout: Optional[float],
+        session_deadline: Optional[float],
+    ):
+        self.name = name
+        self.start = time.time()
+        self.cell_timeout = cell_timeout
+        # The notebook stops at the end of its budget or of the session, whichever comes first
+        ends = [
+            (self.start + timeout if timeout else None, "its budget"),
+            (session_deadline, "the session deadline"),
+        ]
+        self.deadline, self.reason = min(
+            ((end, reason) for end, reason in ends if end), default=(None, None)
+        )
+
+    def timeout_func(self, cell) -> Optional[int]:
+        """Return the timeout of a cell, as the `timeout_func` of nbclient.
+
+        A cell has the timeout of its own metadata, else the cell budget of the notebook, and at
+        most the time left to the notebook. Without any, it runs for as long as it takes.
+        """
+        budget = cell.get("metadata", {}).get(BUDGET_METADATA_KEY, {}).get("timeout")
+        timeouts = [budget or self.cell_timeout]
+        if self.deadline:
+            timeouts.append(self.deadline - time.time())
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        # nbclient waits without a timeout when it is 0, give the cell a last second instead
+        return max(math.ceil(min(timeouts)), 1) if timeouts else None
+
+    def log_timed_out(self):
+        """Log that the notebook ran out of time, for the driver to record it as timed out."""
+        now = time.time()
+        # A cell stopped within a second of the end of the notebook was stopped by the latter
+        reason = self.reason if self.deadline and now >= self.deadline - 1 else "its cell budget"
+        log.error(
+            f"{TIMED_OUT_LOG_PREFIX}{self.name}.ipynb after {now - self.start:.0f}s,"
+            f" reaching {reason}"
+        )
+
+
+class NotebookScheduler:
+    """Schedule the notebooks of the session within their time budgets and the session deadline.
+
+    The budgets of a notebook, in seconds, are its `timeout` and the `cell_timeout` of each of
+    its cells. They are read from the `uats` metadata of the notebook, else from its entry in
+    the manifest, else from the defaults. A cell can also have its own `timeout` in its `uats`
+    metadata. Each cell is stopped, along with the kernel of its notebook, once its budget, that
+    of its notebook or the session deadline runs out, so that the next notebooks still get
+    their time. Once the session deadline passed, no notebook is started anymore.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float],
+        cell_timeout: Optional[float],
+        session_deadline: Optional[float],
+        manifest: Dict[str, dict],
+    ):
+        self.defaults = {"timeout": timeout, "cell_timeout": cell_timeout}
+        self.deadline = time.time() + session_deadline if session_deadline else None
+        self.manifest = manifest
+
+    def start(self, name: str, notebook) -> Optional[NotebookBudget]:
+        """Return the budget of a notebook starting now, or None if the session is over."""
+        if self.deadline and time.time() >= self.deadline:
+            return None
+        budgets = {
+            **self.defaults,
+            **self.manifest.get(name, {}),
+            **notebook.metadata.get(BUDGET_METADATA_KEY, {}),
+        }
+        return NotebookBudget(name, budgets["timeout"], budgets["cell_timeout"], self.deadline)
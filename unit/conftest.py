@@ -0,0 +1,10 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Conftest for the unit tests of the driver, which run without a cluster."""
+
+import sys
+from pathlib import Path
+
+# The driver modules import each other by name, as when run from the driver directory
+sys.path.insert(0, str(Path(__file__).parent.parent / "driver"))
@@ -0,0 +1,53 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import stat
+
+from cassette import REDACTED, REDACTED_B64, Cassette, _redact
+
+
+def test_redact_secrets_of_responses_and_watch_events():
+    secret = {
+        "kind": "Secret",
+        "metadata": {
+            "name": "hydra",
+            "annotations": {"kubectl.kubernetes.io/last-applied-configuration": "{...}"},
+        },
+        "data": {"client-secret": "c2VjcmV0"},
+    }
+    listed = {"kind": "SecretList", "items": [{"metadata": {"name": "a"}, "data": {"k": "dg=="}}]}
+    event = {"type": "ADDED", "object": secret}
+
+    assert json.loads(_redact(json.dumps(secret)))["data"] == {"client-secret": REDACTED_B64}
+    assert json.loads(_redact(json.dumps(event)))["object"]["metadata"]["annotations"] == {
+        "kubectl.kubernetes.io/last-applied-configuration": REDACTED
+    }
+    assert json.loads(_redact(json.dumps(listed)))["items"][0]["data"] == {"k": REDACTED_B64}
+
+
+def test_redact_secret_fields_only():
+    pod = json.dumps({"kind": "Pod", "spec": {"automountServiceAccountToken": True}})
+    status = json.dumps({"status": {"token": "eyJ", "expirationTimestamp": None}})
+
+    assert _redact(pod) == pod
+    assert json.loads(_redact(status)) == {
+        "status": {"token": REDACTED, "expirationTimestamp": None}
+    }
+    assert _redact("client-id: abc\nclient-secret: s3cr3t\n") == (
+        f"client-id: abc\nclient-secret: {REDACTED}\n"
+    )
+    assert (
+        _redact('{"password": "p", "token": null') == f'{{"password": "{REDACTED}", "token": null'
+    )
+
+
+def test_cassette_is_only_readable_by_its_user(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    path.write_text("old")
+    path.chmod(0o644)
+
+    Cassette(path).truncate()
+
+    assert path.read_text() == ""
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
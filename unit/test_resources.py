@@ -0,0 +1,91 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from datetime import datetime, timezone
+
+import pytest
+from resources import (
+    MIB,
+    notebook_windows,
+    parse_cpu,
+    summarize_by_notebook,
+    timed_out_notebooks,
+)
+
+
+@pytest.mark.parametrize(
+    "quantity, cores",
+    [
+        ("123456789n", 0.123456789),
+        ("250000u", 0.25),
+        ("500m", 0.5),
+        ("2", 2.0),
+        ("0", 0.0),
+    ],
+)
+def test_parse_cpu(quantity, cores):
+    assert parse_cpu(quantity) == pytest.approx(cores)
+
+
+def _metrics(time, pod, container, cpu_cores, memory_mib):
+    return {
+        "time": time,
+        "source": "metrics",
+        "pod": pod,
+        "container": container,
+        "cpu_cores": cpu_cores,
+        "memory_bytes": memory_mib * MIB,
+    }
+
+
+def _cgroup(time, usage_usec, memory_peak_mib):
+    return {
+        "time": time,
+        "source": "cgroup",
+        "pod": "job",
+        "container": "job",
+        "usage_usec": usage_usec,
+        "memory_peak": memory_peak_mib * MIB,
+    }
+
+
+def test_summarize_by_notebook():
+    samples = [
+        # the containers of a pod are summed at each sample time
+        _metrics(0, "job", "job", 0.5, 100),
+        _metrics(0, "job", "istio-proxy", 0.1, 50),
+        _metrics(5, "job", "job", 1.5, 300),
+        _cgroup(0, 0, 100),
+        _cgroup(5, 5_000_000, 300),
+        # taken while the second notebook ran
+        _metrics(10, "job", "job", 2.0, 400),
+    ]
+    windows = {"first": (0, 10), "second": (10, 20), "third": (20, 30)}
+
+    summary = summarize_by_notebook(samples, windows)
+
+    first = summary["first"]
+    assert first["duration_s"] == 10
+    assert first["pods"]["job"]["cpu_cores"]["count"] == 2
+    assert first["pods"]["job"]["cpu_cores"]["min"] == pytest.approx(0.6)
+    assert first["pods"]["job"]["memory_mib"]["max"] == pytest.approx(300)
+    assert first["cgroups"]["job"]["cpu_cores"] == pytest.approx(1.0)
+    assert first["cgroups"]["job"]["memory_peak_mib"] == pytest.approx(300)
+    assert summary["second"]["pods"]["job"]["cpu_cores"]["max"] == pytest.approx(2.0)
+    assert summary["second"]["cgroups"] == {}
+    assert summary["third"]["pods"] == {}
+
+
+def test_notebook_windows_and_timed_out_notebooks():
+    lines = [
+        "2026-01-01T00:00:00Z INFO Running kfp.ipynb...\n",
+        "2026-01-01T00:01:00Z INFO Running katib.ipynb...\n",
+        "2026-01-01T00:02:00Z ERROR Timed out katib.ipynb after 60s\n",
+    ]
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    assert notebook_windows(lines, start + 150) == {
+        "kfp": (start, start + 60),
+        "katib": (start + 60, start + 150),
+    }
+    assert timed_out_notebooks(lines) == {"katib"}
@@ -0,0 +1,22 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import pytest
+from soak import namespace_usage
+
+
+class _MetricsClient:
+    """Client listing the pod metrics of a namespace, as reported by metrics-server."""
+
+    def list(self, resource, namespace):
+        return [
+            {"containers": [{"name": "main", "usage": {"cpu": "250000000n", "memory": "100Mi"}}]},
+            {"containers": [{"name": "main", "usage": {"cpu": "500m", "memory": "28Mi"}}]},
+        ]
+
+
+def test_namespace_usage():
+    usage = namespace_usage(_MetricsClient(), "kubeflow")
+
+    assert usage["cpu_cores"] == pytest.approx(0.75)
+    assert usage["memory_mib"] == pytest.approx(128)
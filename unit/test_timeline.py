@@ -0,0 +1,34 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import threading
+import time
+
+from fake_cluster import FakeCluster
+from timeline import TimelineRecorder, render_timeline
+from utils import kube_client
+
+
+def _watch_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name.endswith("(_watch)")]
+
+
+def test_timeline_recorder_ends_its_watches_on_exit(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        with TimelineRecorder(kube_client(), ["kubeflow"], tmp_path / "timeline.jsonl"):
+            assert len(_watch_threads()) == 2
+
+        assert not _watch_threads()
+
+
+def test_timeline_recorder_records_its_failed_watches(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        client = kube_client()
+
+    path = tmp_path / "timeline.jsonl"
+    with TimelineRecorder(client, ["kubeflow"], path):
+        deadline = time.monotonic() + 10
+        while path.read_text().count('"type":"error"') < 2 and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    assert sorted(render_timeline(path)["failed_watches"]) == ["kubeflow/Event", "kubeflow/Pod"]
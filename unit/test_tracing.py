@@ -0,0 +1,36 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import ast
+from pathlib import Path
+
+import pytest
+import tracing
+
+NOTEBOOK_UTILS = Path(__file__).parent.parent / "tests" / "utils.py"
+
+
+def _constants(path: Path) -> dict:
+    """Return the constants assigned a literal at the top level of a module."""
+    constants = {}
+    for node in ast.parse(path.read_text()).body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                constants[target.id] = node.value.value
+    return constants
+
+
+@pytest.mark.parametrize(
+    "name", ["SPAN_LOG_PREFIX", "SPAN_KIND_INTERNAL", "STATUS_CODE_OK", "STATUS_CODE_ERROR"]
+)
+def test_notebook_spans_share_the_constants_of_the_driver(name):
+    assert _constants(NOTEBOOK_UTILS)[name] == getattr(tracing, name)
+
+
+def test_spans_from_log_reads_timestamped_lines():
+    lines = [
+        "2026-01-01T00:00:00.000000000Z Running kfp.ipynb...\n",
+        '2026-01-01T00:00:01.000000000Z INFO OTLP span: {"name": "cell 0"}\n',
+    ]
+
+    assert tracing.spans_from_log(lines) == [{"name": "cell 0"}]
@@ -0,0 +1,68 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import threading
+import time
+
+import pytest
+from fake_cluster import FakeCluster
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.core_v1 import Namespace
+from utils import PodLifecycleRecorder, kube_client, watch_until
+
+
+def _watch_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name.endswith("(_watch)")]
+
+
+def _wait_for_no_watch_thread(timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while _watch_threads() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not _watch_threads()
+
+
+def test_watch_until_ends_its_watch_on_timeout(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        with pytest.raises(TimeoutError):
+            watch_until(kube_client(), Namespace, lambda event_type, obj: False, 1)
+
+        _wait_for_no_watch_thread()
+
+
+def test_watch_until_receives_the_changes_after_the_watch_started(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        client = kube_client()
+        creation = threading.Timer(
+            0.5, client.create, [Namespace(metadata=ObjectMeta(name="created-later"))]
+        )
+        creation.start()
+        try:
+            namespace = watch_until(
+                client,
+                Namespace,
+                lambda event_type, obj: event_type == "ADDED"
+                and obj.metadata.name == "created-later",
+                10,
+            )
+        finally:
+            creation.join()
+
+        assert namespace.metadata.name == "created-later"
+
+
+def test_pod_lifecycle_recorder_ends_its_watch_on_exit(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        with PodLifecycleRecorder(kube_client(), "kubeflow", {"app": "test"}) as pods:
+            assert pods.pod_count() == 0
+
+        assert not _watch_threads()
+
+
+def test_pod_lifecycle_recorder_raises_the_error_of_its_watch(tmp_path):
+    with FakeCluster(workdir=tmp_path):
+        client = kube_client()
+
+    with pytest.raises(RuntimeError, match="watch of pods"):
+        with PodLifecycleRecorder(client, "kubeflow", {"app": "test"}) as pods:
+            pods.wait_for(lambda states: False, 10)